@@ -0,0 +1,183 @@
+import threading
+
+import numpy as np
+
+SUMMARY_COLUMNS = ['AIR_TEMP', 'TRACK_TEMP', 'HUMIDITY', 'PRESSURE', 'WIND_SPEED', 'WIND_DIRECTION']
+
+
+class _AggregateState:
+    """One published version of the running aggregates (never mutated)"""
+
+    def __init__(self, length, version, prefix_sum, prefix_sq, prefix_count, prefix_rain,
+                 minimum, maximum):
+        self.length = length
+        self.version = version
+        # Prefix arrays have length + 1 rows; row i aggregates readings [0, i)
+        self.prefix_sum = prefix_sum
+        self.prefix_sq = prefix_sq
+        self.prefix_count = prefix_count
+        self.prefix_rain = prefix_rain
+        self.minimum = minimum
+        self.maximum = maximum
+        self.summary = None
+
+
+class WeatherAggregator:
+    """
+    Running count/sum/sum-of-squares/min/max per weather column plus rain
+    counts, kept as prefix sums so any suffix window is O(1) to aggregate.
+    Register on_change with WeatherDataStore.add_listener; each appended
+    reading costs O(1) and the full summary is cached per dataset version.
+    """
+
+    def __init__(self, columns=SUMMARY_COLUMNS):
+        self.columns = list(columns)
+        self._lock = threading.Lock()
+        self._capacity = 0
+        self._buffers = None
+        self._state = self._empty_state()
+
+    def _empty_state(self):
+        k = len(self.columns)
+        zeros = np.zeros((1, k))
+        return _AggregateState(0, 0, zeros, zeros, zeros, np.zeros(1),
+                               np.full(k, np.nan), np.full(k, np.nan))
+
+    def on_change(self, snapshot, first_new_row, reloaded):
+        """WeatherDataStore listener: fold the new rows into the aggregates"""
+        with self._lock:
+            state = self._empty_state() if reloaded else self._state
+            start = state.length if not reloaded else 0
+            if start != first_new_row and not reloaded:
+                # Missed an update; rebuild rather than double count
+                state, start = self._empty_state(), 0
+            self._state = self._extend(state, snapshot, start)
+
+    def _extend(self, state, snapshot, start):
+        length = len(snapshot)
+        values = np.column_stack([np.asarray(snapshot[name][start:length], dtype=np.float64)
+                                  for name in self.columns]) if length > start else \
+            np.empty((0, len(self.columns)))
+        present = ~np.isnan(values)
+        clean = np.where(present, values, 0.0)
+        rain = np.asarray(snapshot['RAIN'][start:length], dtype=np.float64)
+
+        if start == 0 or self._buffers is None or length + 1 > self._capacity:
+            # Grow into new buffers so published states keep their arrays intact
+            self._capacity = max(2 * (length + 1), 1024)
+            k = len(self.columns)
+            buffers = {name: np.zeros((self._capacity, k)) for name in ('sum', 'sq', 'count')}
+            buffers['rain'] = np.zeros(self._capacity)
+            buffers['sum'][:start + 1] = state.prefix_sum[:start + 1]
+            buffers['sq'][:start + 1] = state.prefix_sq[:start + 1]
+            buffers['count'][:start + 1] = state.prefix_count[:start + 1]
+            buffers['rain'][:start + 1] = state.prefix_rain[:start + 1]
+            self._buffers = buffers
+        buffers = self._buffers
+
+        buffers['sum'][start + 1:length + 1] = state.prefix_sum[start] + np.cumsum(clean, axis=0)
+        buffers['sq'][start + 1:length + 1] = state.prefix_sq[start] + np.cumsum(clean * clean, axis=0)
+        buffers['count'][start + 1:length + 1] = state.prefix_count[start] + np.cumsum(present, axis=0)
+        buffers['rain'][start + 1:length + 1] = state.prefix_rain[start] + np.cumsum(rain)
+
+        with np.errstate(invalid='ignore'):
+            minimum = np.fmin(state.minimum, np.nanmin(values, axis=0)) if len(values) else state.minimum
+            maximum = np.fmax(state.maximum, np.nanmax(values, axis=0)) if len(values) else state.maximum
+
+        return _AggregateState(length, snapshot.version,
+                               buffers['sum'][:length + 1], buffers['sq'][:length + 1],
+                               buffers['count'][:length + 1], buffers['rain'][:length + 1],
+                               minimum, maximum)
+
+    @property
+    def version(self):
+        return self._state.version
+
+    def etag(self, window=None):
+        """Entity tag for a summary (window is part of the key)"""
+        state = self._state
+        suffix = '' if window is None else f'-{window}'
+        return f'v{state.version}-{state.length}{suffix}'
+
+    def summary(self):
+        """Whole-dataset summary, computed once per dataset version"""
+        state = self._state
+        if state.summary is None:
+            state.summary = self._build_summary(state, 0, state.length, state.minimum, state.maximum)
+        return state.summary
+
+    def window_summary(self, snapshot, last=None, seconds=None):
+        """
+        Summary of the most recent readings only: the last `last` readings
+        and/or those within `seconds` of the newest reading. Sums come from
+        the prefix arrays; only min/max look at the rows inside the window.
+        """
+        state = self._state
+        end = min(state.length, len(snapshot))
+        start = 0
+        if last is not None:
+            if int(last) < 1:
+                raise ValueError('last must be at least 1')
+            start = max(start, end - int(last))
+        if seconds is not None and end > 0:
+            times = snapshot['TIME_UTC_SECONDS'][:end]
+            start = max(start, int(np.searchsorted(times, times[-1] - float(seconds), side='left')))
+
+        if end > start:
+            window = np.column_stack([np.asarray(snapshot[name][start:end], dtype=np.float64)
+                                      for name in self.columns])
+            with np.errstate(invalid='ignore'):
+                minimum, maximum = np.nanmin(window, axis=0), np.nanmax(window, axis=0)
+        else:
+            minimum = maximum = np.full(len(self.columns), np.nan)
+        summary = self._build_summary(state, start, end, minimum, maximum)
+        if end > start:
+            summary['window'] = {
+                'start_time_seconds': int(snapshot['TIME_UTC_SECONDS'][start]),
+                'end_time_seconds': int(snapshot['TIME_UTC_SECONDS'][end - 1])
+            }
+        return summary
+
+    def _build_summary(self, state, start, end, minimum, maximum):
+        count = state.prefix_count[end] - state.prefix_count[start]
+        total = state.prefix_sum[end] - state.prefix_sum[start]
+        total_sq = state.prefix_sq[end] - state.prefix_sq[start]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+            variance = np.maximum(total_sq / count - mean * mean, 0.0)
+        rain_events = int(round(state.prefix_rain[end] - state.prefix_rain[start]))
+        readings = end - start
+        column = {name: j for j, name in enumerate(self.columns)}
+
+        def value(array, name):
+            result = float(array[column[name]])
+            return None if np.isnan(result) else result
+
+        return {
+            'total_readings': readings,
+            'rain_events': rain_events,
+            'rain_percentage': float(rain_events / readings * 100) if readings else 0.0,
+            'avg_temperature': {
+                'air': value(mean, 'AIR_TEMP'),
+                'track': value(mean, 'TRACK_TEMP')
+            },
+            'avg_humidity': value(mean, 'HUMIDITY'),
+            'avg_pressure': value(mean, 'PRESSURE'),
+            'avg_wind_speed': value(mean, 'WIND_SPEED'),
+            'temperature_range': {
+                'air_min': value(minimum, 'AIR_TEMP'),
+                'air_max': value(maximum, 'AIR_TEMP'),
+                'track_min': value(minimum, 'TRACK_TEMP'),
+                'track_max': value(maximum, 'TRACK_TEMP')
+            },
+            'columns': {
+                name: {
+                    'count': int(count[j]),
+                    'mean': value(mean, name),
+                    'std': value(np.sqrt(variance), name),
+                    'min': value(minimum, name),
+                    'max': value(maximum, name)
+                }
+                for name, j in column.items()
+            }
+        }
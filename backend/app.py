@@ -1,619 +1,942 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
 from model import RainPredictionModel
+from dataset_store import WeatherDataStore
+from analytics import WeatherAggregator
+from history import build_history, history_columns, parse_cursor, to_json_list, columns_to_rows
+from stream import ReadingBroadcaster
+from strategy import get_strategy_recommendation, cached_pitstop_strategy, strategy_cache_info, parse_seed
+from simulator import simulate_strategy, DEFAULT_SCENARIOS, MAX_STOPS
+from planner import PitPlanner
+from prediction_cache import PredictionCache, parse_precision
+from probability_grid import load_or_build
+from feature_store import SessionFeatureStore, dataset_trends
+from model_pool import ModelPool, UnknownCircuit
+from reloader import ModelReloader, ReloadRejected
+from weather_client import CachedWeatherClient, parse_openweather
+import registry
+import metrics
+import contextvars
+import hmac
+import math
 import os
+import traceback
 from datetime import datetime
-import requests
 from typing import Optional
 
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with response encoding charged to the 'serialize' phase"""
+    
+    def dumps(self, obj, **kwargs):
+        with metrics.phase('serialize'):
+            return super().dumps(obj, **kwargs)
+
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 CORS(app)
 
+# Forest evaluator: 'sklearn', 'flat' (flattened NumPy trees) or 'auto'
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'auto')
+
 # Initialize model
-rain_model = RainPredictionModel()
+rain_model = RainPredictionModel(backend=INFERENCE_BACKEND)
 
 # Load or train model on startup
 MODEL_PATH = 'model_data'
 DATA_PATH = os.path.join('..', 'data', 'raindata.csv')
 
+# Parsed once per process; endpoints read snapshots that track appends to the CSV
+weather_store = WeatherDataStore(DATA_PATH)
+# Running aggregates updated as rows are appended; serves /api/analytics/summary
+weather_aggregator = WeatherAggregator()
+weather_store.add_listener(weather_aggregator.on_change)
+
+# /api/predict answers cached on inputs rounded to PREDICT_CACHE_PRECISION steps
+# (e.g. 'HUMIDITY=0.5,PRESSURE=1'); emptied when a new model artifact is loaded
+prediction_cache = PredictionCache(
+    rain_model,
+    precision=parse_precision(os.getenv('PREDICT_CACHE_PRECISION')),
+    max_size=int(os.getenv('PREDICT_CACHE_SIZE', 4096)),
+    ttl=float(os.getenv('PREDICT_CACHE_TTL', 300))
+)
+
+# Rolling/change features per /api/predict session_id, for models trained
+# with the full feature set (train.py --features full)
+feature_store = SessionFeatureStore(
+    max_sessions=int(os.getenv('FEATURE_SESSIONS', 1024)),
+    ttl=float(os.getenv('FEATURE_SESSION_TTL', 3600))
+)
+
+# Optimal pit schedules; value tables are cached per race and reused across laps
+pit_planner = PitPlanner()
+
 # Weather API Configuration for Circuit of the Americas (Austin, Texas)
 WEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY', 'YOUR_API_KEY_HERE')
 COTA_LAT = 30.1328
 COTA_LON = -97.6411
 COTA_LOCATION = 'Circuit of the Americas, Austin, Texas'
-USE_LIVE_WEATHER = False
+USE_LIVE_WEATHER = os.getenv('USE_LIVE_WEATHER', 'false').lower() == 'true'
+OPENWEATHER_BASE_URL = os.getenv('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org')
+WEATHER_CACHE_TTL = float(os.getenv('WEATHER_CACHE_TTL', 60))
+
+# One pooled, cached upstream fetch per process shared by every request
+weather_client = CachedWeatherClient(
+    f"{OPENWEATHER_BASE_URL}/data/2.5/weather",
+    params={
+        'lat': COTA_LAT,
+        'lon': COTA_LON,
+        'appid': WEATHER_API_KEY,
+        'units': 'metric'
+    },
+    parse=lambda data: parse_openweather(data, COTA_LOCATION),
+    ttl=WEATHER_CACHE_TTL,
+    refresh_interval=WEATHER_CACHE_TTL * 0.8
+)
 
-# FORCE RETRAIN TO FIX PREDICTIONS
+# Load the published artifact read-only; training only happens (once, under
+# the registry lock) when nothing has been published yet. Retrain with train.py.
 try:
-    print("=" * 60)
-    print("🔄 RETRAINING MODEL WITH LATEST DATA...")
-    print("=" * 60)
-    rain_model.train(DATA_PATH)
-    rain_model.save_model(MODEL_PATH)
-    print("=" * 60)
-    print("✓ Model trained and ready!")
-    print("=" * 60)
+    manifest = registry.ensure_model(rain_model, DATA_PATH, MODEL_PATH)
+    rain_model.prepare_inference()
+    print(f"✓ Model {manifest['version']} loaded and ready! (backend: {INFERENCE_BACKEND})")
 except Exception as e:
     print(f"⚠ Model initialization error: {e}")
-    import traceback
     traceback.print_exc()
 
+# Interpolated rain probabilities for /api/predict/approx; stored with (and
+# rebuilt by publishing) each artifact, built here only for older artifacts
+probability_grid = None
+try:
+    probability_grid = load_or_build(rain_model, registry.artifact_dir(MODEL_PATH, rain_model.version),
+                                     registry.grid_cache_dir(MODEL_PATH, rain_model.version), DATA_PATH)
+    print(f"✓ Probability grid loaded (max error {probability_grid.meta['max_error']})")
+except Exception as e:
+    print(f"⚠ Probability grid unavailable: {e}")
+
+# Models of other circuits for /api/predict?circuit=<id>, loaded from
+# model_data/circuits/<id> on first use (train.py --circuit <id>) and
+# evicted least recently used beyond MODEL_POOL_BUDGET_MB of artifacts
+model_pool = ModelPool(
+    MODEL_PATH,
+    rain_model,
+    prediction_cache,
+    backend=INFERENCE_BACKEND,
+    budget_bytes=int(float(os.getenv('MODEL_POOL_BUDGET_MB', 512)) * 2 ** 20),
+    make_cache=lambda model: PredictionCache(model, prediction_cache.precision,
+                                             prediction_cache.max_size, prediction_cache.ttl),
+    default_grid=probability_grid,
+    data_path=DATA_PATH
+)
+# The names above are the startup objects: requests read the serving model,
+# its cache and grid from model_pool.default, which a reload replaces
+
+# Swaps in newly published artifacts (train.py) without a restart: a watcher
+# thread checks LATEST every MODEL_RELOAD_INTERVAL seconds (0 turns it off),
+# and POST /api/admin/reload does the same on demand. A new model is checked
+# before it serves: on the last HOLDOUT_ROWS rows of HOLDOUT_PATH when set (data
+# neither model was trained on), otherwise on the test split of DATA_PATH
+# recorded in its manifest. A model that cannot be checked is rejected.
+HOLDOUT_PATH = os.getenv('HOLDOUT_PATH') or None
+model_reloader = ModelReloader(
+    model_pool,
+    HOLDOUT_PATH,
+    data_path=DATA_PATH,
+    holdout_rows=int(os.getenv('HOLDOUT_ROWS', 1000)),
+    max_accuracy_drop=float(os.getenv('RELOAD_MAX_ACCURACY_DROP', 0.05)),
+    interval=float(os.getenv('MODEL_RELOAD_INTERVAL', 30))
+)
+# /api/admin/* is disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+# Version of the model that answered the current request (X-Model-Version)
+served_model_version = contextvars.ContextVar('served_model_version', default=None)
+
+try:
+    weather_store.refresh()
+    print(f"✓ Weather dataset loaded: {len(weather_store.snapshot())} readings")
+except Exception as e:
+    print(f"⚠ Weather dataset load error: {e}")
+
 def fetch_live_weather_cota() -> Optional[dict]:
-    """Fetch live weather from Circuit of the Americas (Austin, Texas)"""
-    try:
-        if not USE_LIVE_WEATHER or WEATHER_API_KEY == 'YOUR_API_KEY_HERE':
-            return None
-        
-        url = f"https://api.openweathermap.org/data/2.5/weather"
-        params = {
-            'lat': COTA_LAT,
-            'lon': COTA_LON,
-            'appid': WEATHER_API_KEY,
-            'units': 'metric'
-        }
-        
-        response = requests.get(url, params=params, timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            weather = {
-                'air_temp': float(data['main']['temp']),
-                'track_temp': float(data['main']['temp']) + 12.0,
-                'humidity': float(data['main']['humidity']),
-                'pressure': float(data['main']['pressure']),
-                'wind_speed': float(data['wind']['speed']) * 3.6,
-                'wind_direction': float(data['wind'].get('deg', 0)),
-                'rain': 1 if 'rain' in data else 0,
-                'weather_description': data['weather'][0]['description'],
-                'location': COTA_LOCATION,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            print(f"✓ Live weather fetched from COTA: {weather['air_temp']}°C, {weather['humidity']}% humidity")
-            return weather
-        else:
-            print(f"⚠ Weather API error: {response.status_code}")
-            return None
-            
-    except Exception as e:
-        print(f"⚠ Error fetching live weather: {e}")
+    """Fetch live weather from Circuit of the Americas (Austin, Texas), cached"""
+    if not USE_LIVE_WEATHER or WEATHER_API_KEY == 'YOUR_API_KEY_HERE':
         return None
+    return weather_client.get()
 
-def calculate_confidence(rain_prob, humidity=None, wind_speed=None):
-    """Calculate true confidence based on weather variance and track stability"""
-    confidence_value = 0.85  # Base confidence
-    
-    # Reduce confidence for moderate rain probabilities (uncertain conditions)
-    if 0.3 < rain_prob < 0.7:
-        confidence_value -= 0.20
-    
-    # Reduce confidence for high humidity variance
-    if humidity and (humidity > 85 or humidity < 30):
-        confidence_value -= 0.10
-    
-    # Reduce confidence for high wind (variable conditions)
-    if wind_speed and wind_speed > 25:
-        confidence_value -= 0.15
-    
-    confidence_value = max(0.3, min(0.95, confidence_value))
-    
-    if confidence_value >= 0.80:
-        return 'very high', confidence_value
-    elif confidence_value >= 0.65:
-        return 'high', confidence_value
-    elif confidence_value >= 0.50:
-        return 'medium', confidence_value
-    else:
-        return 'low', confidence_value
+@app.before_request
+def start_request_timer():
+    model_reloader.start()
+    served_model_version.set(None)
+    g.metrics_token = metrics.start_request(request.url_rule.rule if request.url_rule else 'unmatched',
+                                            request.method)
+    if request.is_json:
+        # Parsed (and cached for the view) here so parsing is timed on its own
+        with metrics.phase('parse'):
+            request.get_json(silent=True)
 
-def detect_rain_spike(rain_prob, current_lap):
-    """Detect if there's an upcoming rain spike"""
-    spike_lap = None
-    spike_detected = False
-    
-    # Simulate rain spike detection based on probability jump
-    # In a real system, this would analyze weather forecast trends
-    if 0.45 < rain_prob < 0.65:
-        # Moderate probability suggests spike may occur soon
-        spike_lap = current_lap + np.random.randint(3, 8)
-        spike_detected = True
-    elif rain_prob > 0.75:
-        # High probability suggests spike is imminent or happening
-        spike_lap = current_lap + 1
-        spike_detected = True
-    
-    return {
-        'detected': spike_detected,
-        'spike_lap': spike_lap
-    }
+@app.after_request
+def finish_request_timer(response):
+    response.headers['X-Model-Version'] = response_model_version()
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        metrics.finish_request(token, response.status_code)
+    return response
 
-def estimate_lap_time(tire_compound, rain_prob, track_condition='dry'):
-    """Estimate expected lap time after pitstop"""
-    # Base lap times for each compound (in seconds)
-    base_lap_times = {
-        'soft': 85.0,
-        'medium': 86.5,
-        'hard': 88.0,
-        'intermediate': 90.0,
-        'wet': 95.0
-    }
-    
-    base_time = base_lap_times.get(tire_compound.split()[0].lower(), 86.0)
-    
-    # Adjust for conditions
-    if track_condition == 'wet' and tire_compound.lower() in ['soft', 'medium', 'hard']:
-        base_time += 8.0  # Dry tires on wet track are much slower
-    elif track_condition == 'damp':
-        if tire_compound.lower() == 'intermediate':
-            base_time -= 1.5  # Intermediates excel on damp track
-        elif tire_compound.lower() in ['soft', 'medium', 'hard']:
-            base_time += 3.0  # Dry tires on damp track
-    
-    # Add variance based on rain probability
-    if rain_prob > 0.6:
-        base_time += np.random.uniform(0.5, 2.0)
-    
-    return round(base_time, 1)
+def response_model_version():
+    """The model that answered this request, else the one serving the default circuit"""
+    return served_model_version.get() or model_pool.default.model.version or ''
+
+def server_error(e):
+    """500 response for an unexpected error; the traceback goes to the log, not the client"""
+    route = request.url_rule.rule if request.url_rule else request.path
+    metrics.request_errors.inc(route)
+    print(f"ERROR in {request.path}: {traceback.format_exc()}")
+    return jsonify({'error': str(e), 'success': False}), 500
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    return jsonify(health_payload())
+
+def health_payload():
+    serving = model_pool.default
+    return {
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'model_loaded': rain_model.model is not None,
+        'model_loaded': serving.model.model is not None,
+        'model_version': serving.model.version,
+        'inference_backend': serving.model.backend,
         'live_weather_enabled': USE_LIVE_WEATHER,
-        'location': COTA_LOCATION if USE_LIVE_WEATHER else 'Dataset only'
-    })
+        'location': COTA_LOCATION if USE_LIVE_WEATHER else 'Dataset only',
+        'weather_cache': weather_client.cache_info() if USE_LIVE_WEATHER else None,
+        'strategy_cache': strategy_cache_info(),
+        'prediction_cache': serving.cache.info(),
+        'feature_sessions': feature_store.info(),
+        'model_pool': model_pool.info(),
+        'model_reload': model_reloader.info(),
+        'trend_features': serving.model.uses_trend_features,
+        'probability_grid': serving.grid.info() if serving.grid else None
+    }
 
 @app.route('/', methods=['GET'])
 def home():
     """Root endpoint - service info"""
-    return jsonify({
+    return jsonify(home_payload())
+
+def home_payload():
+    return {
         'service': 'Rain Pit Strategy AI - Backend',
         'status': 'running',
         'version': '1.0.0',
         'endpoints': {
             'health': '/api/health',
-            'predict': '/api/predict (POST)',
+            'predict': '/api/predict (POST, ?circuit=<id>)',
+            'predict_batch': '/api/predict/batch (POST)',
+            'predict_approx': '/api/predict/approx',
             'current_weather': '/api/weather/current',
             'weather_history': '/api/weather/history',
             'pitstop_strategy': '/api/strategy/pitstop (POST)',
-            'analytics': '/api/analytics/summary'
+            'pitstop_strategy_batch': '/api/strategy/pitstop/batch (POST)',
+            'simulate_strategy': '/api/strategy/simulate (POST)',
+            'optimal_strategy': '/api/strategy/optimal (POST)',
+            'analytics': '/api/analytics/summary',
+            'stream': '/api/stream (SSE)',
+            'metrics': '/api/metrics',
+            'admin_reload': '/api/admin/reload (POST, X-Admin-Token)'
         },
         'documentation': 'Send POST requests to /api/predict or /api/strategy/pitstop',
         'timestamp': datetime.now().isoformat()
-    })
+    }
 
-@app.route('/api/predict', methods=['POST'])
-def predict_rain():
-    """Predict rain probability based on weather data"""
-    try:
-        data = request.get_json()
-        
-        required_fields = ['air_temp', 'track_temp', 'humidity', 'pressure', 'wind_speed', 'wind_direction']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-        
-        weather_data = {
-            'AIR_TEMP': float(data['air_temp']),
-            'TRACK_TEMP': float(data['track_temp']),
-            'HUMIDITY': float(data['humidity']),
-            'PRESSURE': float(data['pressure']),
-            'WIND_SPEED': float(data['wind_speed']),
-            'WIND_DIRECTION': float(data['wind_direction'])
-        }
-        
-        result = rain_model.predict(weather_data)
-        rain_prob = result['rain_probability']
-        strategy = get_strategy_recommendation(rain_prob, weather_data)
-        
-        return jsonify({
-            'success': True,
-            'prediction': result,
-            'strategy': strategy,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-    except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"ERROR in /api/predict: {error_trace}")
-        return jsonify({'error': str(e), 'success': False, 'trace': error_trace}), 500
+class RequestError(Exception):
+    """Invalid client input; reported as a 4xx JSON error"""
+    
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
 
-@app.route('/api/weather/current', methods=['GET'])
-def get_current_weather():
-    """Get latest weather data"""
-    try:
-        live_weather = fetch_live_weather_cota()
-        
-        if live_weather:
-            return jsonify({
-                'success': True,
-                'source': 'live',
-                'location': COTA_LOCATION,
-                'data': {
-                    'timestamp': live_weather['timestamp'],
-                    'air_temp': live_weather['air_temp'],
-                    'track_temp': live_weather['track_temp'],
-                    'humidity': live_weather['humidity'],
-                    'pressure': live_weather['pressure'],
-                    'wind_speed': live_weather['wind_speed'],
-                    'wind_direction': live_weather['wind_direction'],
-                    'rain': live_weather['rain'],
-                    'weather_description': live_weather.get('weather_description', '')
-                }
-            })
-        else:
-            df = pd.read_csv(DATA_PATH, sep=';')
-            latest = df.iloc[-1].to_dict()
-            
-            return jsonify({
-                'success': True,
-                'source': 'dataset',
-                'location': 'Historical data',
-                'data': {
-                    'timestamp': latest['TIME_UTC_STR'],
-                    'air_temp': float(latest['AIR_TEMP']),
-                    'track_temp': float(latest['TRACK_TEMP']),
-                    'humidity': float(latest['HUMIDITY']),
-                    'pressure': float(latest['PRESSURE']),
-                    'wind_speed': float(latest['WIND_SPEED']),
-                    'wind_direction': float(latest['WIND_DIRECTION']),
-                    'rain': int(latest['RAIN']),
-                    'weather_description': ''
-                }
-            })
-    except Exception as e:
-        return jsonify({'error': str(e), 'success': False}), 500
+# Request field -> model column for prediction payloads
+PREDICT_FIELDS = {
+    'air_temp': 'AIR_TEMP',
+    'track_temp': 'TRACK_TEMP',
+    'humidity': 'HUMIDITY',
+    'pressure': 'PRESSURE',
+    'wind_speed': 'WIND_SPEED',
+    'wind_direction': 'WIND_DIRECTION'
+}
+MAX_BATCH_SIZE = 100000
+MAX_GRID_SIZE = 40
 
-@app.route('/api/weather/history', methods=['GET'])
-def get_weather_history():
-    """Get historical weather data"""
-    try:
-        limit = int(request.args.get('limit', 50))
-        df = pd.read_csv(DATA_PATH, sep=';')
-        history = df.tail(limit)
-        
-        data = []
-        for _, row in history.iterrows():
-            data.append({
-                'timestamp': row['TIME_UTC_STR'],
-                'time_seconds': int(row['TIME_UTC_SECONDS']),
-                'air_temp': float(row['AIR_TEMP']),
-                'track_temp': float(row['TRACK_TEMP']),
-                'humidity': float(row['HUMIDITY']),
-                'pressure': float(row['PRESSURE']),
-                'wind_speed': float(row['WIND_SPEED']),
-                'wind_direction': float(row['WIND_DIRECTION']),
-                'rain': int(row['RAIN'])
-            })
-        
-        return jsonify({
-            'success': True,
-            'data': data,
-            'total_records': len(df)
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e), 'success': False}), 500
+# Payload builders shared by the Flask routes below and the ASGI app (asgi.py)
 
-@app.route('/api/strategy/pitstop', methods=['POST'])
-def pitstop_strategy():
-    """Calculate pit stop strategy with enhanced features"""
+def circuit_model(circuit):
+    """Pooled model (and its prediction cache) for ?circuit=; 404 for an unknown circuit"""
     try:
-        data = request.get_json()
-        
-        rain_prob = float(data.get('rain_probability', 0))
-        current_lap = int(data.get('current_lap', 1))
-        total_laps = int(data.get('total_laps', 50))
-        current_tire = data.get('current_tire', 'soft')
-        
-        # Get weather data if available
-        weather_data = data.get('weather_data', {})
-        humidity = weather_data.get('humidity')
-        wind_speed = weather_data.get('wind_speed')
-        
-        strategy = calculate_pitstop_strategy(
-            rain_prob, current_lap, total_laps, current_tire, humidity, wind_speed
-        )
-        
-        return jsonify({
-            'success': True,
-            'strategy': strategy
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e), 'success': False}), 500
+        pooled = model_pool.get(circuit or None)
+    except UnknownCircuit as e:
+        raise RequestError(str(e), 404)
+    served_model_version.set(pooled.model.version)
+    return pooled
+
+def predict_payload(data, circuit=None):
+    """Rain prediction + strategy for one reading, from the circuit's model"""
+    pooled = circuit_model(circuit)
+    for field in PREDICT_FIELDS:
+        if field not in data:
+            raise RequestError(f'Missing required field: {field}')
+    
+    weather_data = {column: float(data[field]) for field, column in PREDICT_FIELDS.items()}
+    
+    session = None
+    if data.get('session_id') is not None:
+        # Consecutive readings of one car/client: trend features from its window
+        trends, readings = feature_store.update(str(data['session_id']), weather_data)
+        session = {'id': str(data['session_id']), 'readings': readings, 'features': trends}
+    
+    if session is not None and pooled.model.uses_trend_features:
+        # The cache is keyed on the reading alone
+        result = pooled.model.predict({**weather_data, **session['features']})
+    else:
+        result = pooled.cache.predict(weather_data)
+    rain_prob = result['rain_probability']
+    with metrics.phase('strategy'):
+        strategy = get_strategy_recommendation(rain_prob, weather_data)
+    
+    payload = {
+        'success': True,
+        'prediction': result,
+        'strategy': strategy,
+        'model_version': pooled.model.version,
+        'timestamp': datetime.now().isoformat()
+    }
+    if session is not None:
+        payload['session'] = session
+    if circuit:
+        payload['circuit'] = pooled.circuit
+    return payload
 
-def get_strategy_recommendation(rain_prob, weather_data):
-    """Generate strategy recommendation"""
+def predict_batch_payload(data, circuit=None):
+    """Predictions for a readings array or a columnar payload, in input order"""
+    if isinstance(data, list):
+        data = {'readings': data}
     
-    if rain_prob > 0.7:
-        risk_level = 'HIGH'
-        recommendation = 'Prepare for wet conditions immediately'
-        tire_choice = 'Intermediate or Full Wet'
-        action = 'urgent'
-    elif rain_prob > 0.4:
-        risk_level = 'MEDIUM'
-        recommendation = 'Monitor conditions closely, prepare wet tires'
-        tire_choice = 'Keep Intermediate ready'
-        action = 'caution'
+    columnar = 'columns' in data
+    if columnar:
+        columns = data['columns']
+        for field in PREDICT_FIELDS:
+            if field not in columns:
+                raise RequestError(f'Missing required field: {field}')
+        lengths = {len(columns[field]) for field in PREDICT_FIELDS}
+        if len(lengths) != 1:
+            raise RequestError('All columns must have the same length')
+        count = lengths.pop()
+        records = {column: columns[field] for field, column in PREDICT_FIELDS.items()}
+    elif 'readings' in data:
+        readings = data['readings']
+        count = len(readings)
+        try:
+            records = {column: [reading[field] for reading in readings]
+                       for field, column in PREDICT_FIELDS.items()}
+        except KeyError as e:
+            raise RequestError(f'Missing required field: {e.args[0]}')
     else:
-        risk_level = 'LOW'
-        recommendation = 'Continue with dry strategy'
-        tire_choice = 'Soft/Medium/Hard compound'
-        action = 'normal'
+        raise RequestError('Expected "readings" or "columns" in request body')
     
-    humidity = weather_data['HUMIDITY']
-    temp_diff = weather_data['AIR_TEMP'] - weather_data['TRACK_TEMP']
+    if count > MAX_BATCH_SIZE:
+        raise RequestError(f'Batch too large: {count} > {MAX_BATCH_SIZE}')
     
-    notes = []
-    if humidity > 70:
-        notes.append('High humidity increases rain risk')
-    if temp_diff < -10:
-        notes.append('Track significantly warmer than air - favorable for dry tires')
-    elif temp_diff > 0:
-        notes.append('Air warmer than track - potential for cooling')
+    pooled = circuit_model(circuit)
+    result = pooled.model.predict_batch(records)
+    predictions = {key: values.tolist() for key, values in result.items()}
+    if not columnar:
+        predictions = [
+            {'rain_probability': rain, 'no_rain_probability': no_rain, 'prediction': label}
+            for rain, no_rain, label in zip(predictions['rain_probability'],
+                                            predictions['no_rain_probability'],
+                                            predictions['prediction'])
+        ]
     
-    if weather_data['WIND_SPEED'] > 20:
-        notes.append('High wind speeds - expect variable conditions')
+    payload = {
+        'success': True,
+        'count': count,
+        'predictions': predictions,
+        'model_version': pooled.model.version,
+        'timestamp': datetime.now().isoformat()
+    }
+    if circuit:
+        payload['circuit'] = pooled.circuit
+    return payload
+
+def approx_payload(args):
+    """
+    Rain probability interpolated from the precomputed grid. Takes humidity,
+    pressure, wind_speed and either temp_diff or air_temp + track_temp.
+    """
+    probability_grid = model_pool.default.grid
+    if probability_grid is None:
+        raise RequestError('Probability grid not available', 503)
+    served_model_version.set(probability_grid.meta['model_version'])
+    
+    inputs = {name: query_number(args, name, float)
+              for name in ('humidity', 'pressure', 'wind_speed', 'temp_diff', 'air_temp', 'track_temp')}
+    if inputs['temp_diff'] is None and None not in (inputs['air_temp'], inputs['track_temp']):
+        inputs['temp_diff'] = inputs['air_temp'] - inputs['track_temp']
+    for name in ('humidity', 'pressure', 'wind_speed', 'temp_diff'):
+        if inputs[name] is None:
+            raise RequestError(f'Missing required field: {name}')
+        if not math.isfinite(inputs[name]):
+            raise RequestError(f'{name} must be a finite number')
     
+    rain_prob, clipped = probability_grid.probability(
+        inputs['humidity'], inputs['pressure'], inputs['temp_diff'], inputs['wind_speed'])
     return {
-        'risk_level': risk_level,
-        'rain_probability_percent': round(rain_prob * 100, 2),
-        'recommendation': recommendation,
-        'tire_choice': tire_choice,
-        'action': action,
-        'notes': notes
+        'success': True,
+        'rain_probability': round(rain_prob, 4),
+        'prediction': int(rain_prob > 0.5),
+        'approximate': True,
+        'max_error': probability_grid.meta['max_error'],
+        'error_source': probability_grid.meta.get('error_source', 'grid_points'),
+        'clipped': clipped,
+        'model_version': probability_grid.meta['model_version']
     }
 
-def calculate_pitstop_strategy(rain_prob, current_lap, total_laps, current_tire, humidity=None, wind_speed=None):
-    """Calculate optimal pit stop strategy - ENHANCED VERSION"""
+def current_weather_payload(live_weather):
+    """Latest reading: live weather when available, otherwise the dataset"""
+    if live_weather:
+        return {
+            'success': True,
+            'source': 'live',
+            'location': COTA_LOCATION,
+            'data': {
+                'timestamp': live_weather['timestamp'],
+                'air_temp': live_weather['air_temp'],
+                'track_temp': live_weather['track_temp'],
+                'humidity': live_weather['humidity'],
+                'pressure': live_weather['pressure'],
+                'wind_speed': live_weather['wind_speed'],
+                'wind_direction': live_weather['wind_direction'],
+                'rain': live_weather['rain'],
+                'weather_description': live_weather.get('weather_description', '')
+            }
+        }
     
-    laps_remaining = total_laps - current_lap
+    dataset = weather_store.snapshot()
+    if len(dataset) == 0:
+        raise RequestError('Weather dataset is empty', status=503)
     
-    tire_life = {
-        'soft': 15,
-        'medium': 25,
-        'hard': 35,
-        'intermediate': 20,
-        'wet': 25
+    return {
+        'success': True,
+        'source': 'dataset',
+        'location': 'Historical data',
+        'data': {
+            'timestamp': dataset['TIME_UTC_STR'][-1],
+            'air_temp': float(dataset['AIR_TEMP'][-1]),
+            'track_temp': float(dataset['TRACK_TEMP'][-1]),
+            'humidity': float(dataset['HUMIDITY'][-1]),
+            'pressure': float(dataset['PRESSURE'][-1]),
+            'wind_speed': float(dataset['WIND_SPEED'][-1]),
+            'wind_direction': float(dataset['WIND_DIRECTION'][-1]),
+            'rain': int(dataset['RAIN'][-1]),
+            'weather_description': ''
+        }
     }
+
+def query_number(args, name, cast=int):
+    """Query parameter as a number, None when absent or malformed"""
+    try:
+        value = args.get(name)
+        return None if value is None else cast(value)
+    except (TypeError, ValueError):
+        return None
+
+def history_payload(args):
+    """/api/weather/history payload for a mapping of query parameters"""
+    cursor = args.get('cursor')
+    if cursor is not None:
+        try:
+            cursor = parse_cursor(cursor)
+        except ValueError:
+            raise RequestError('cursor must be a next_cursor value')
+    return build_history(
+        weather_store.snapshot(),
+        limit=query_number(args, 'limit'),
+        since=query_number(args, 'since'),
+        until=query_number(args, 'until'),
+        cursor=cursor,
+        points=query_number(args, 'points'),
+        columnar=args.get('format', 'rows') == 'columns'
+    )
+
+def request_seed(data):
+    """The optional "seed" of a strategy request as a non-negative int; 400 otherwise"""
+    try:
+        return parse_seed(data.get('seed'))
+    except ValueError as e:
+        raise RequestError(str(e))
+
+def pitstop_payload(data):
+    """Pit stop strategy for one car"""
+    rain_prob = float(data.get('rain_probability', 0))
+    current_lap = int(data.get('current_lap', 1))
+    total_laps = int(data.get('total_laps', 50))
+    current_tire = data.get('current_tire', 'soft')
+    seed = request_seed(data)
+    
+    # Get weather data if available
+    weather_data = data.get('weather_data', {})
+    humidity = weather_data.get('humidity')
+    wind_speed = weather_data.get('wind_speed')
     
-    # Calculate confidence
-    confidence_label, confidence_value = calculate_confidence(rain_prob, humidity, wind_speed)
+    # Memoized: the same state (and seed) always gets the same answer
+    with metrics.phase('strategy'):
+        strategy = cached_pitstop_strategy(
+            rain_prob, current_lap, total_laps, current_tire, humidity, wind_speed, seed
+        )
     
-    # Detect rain spike
-    rain_spike = detect_rain_spike(rain_prob, current_lap)
+    return {
+        'success': True,
+        'strategy': strategy
+    }
+
+def grid_rain_probability(data):
+    """
+    One rain probability for the whole grid: the request's rain_probability,
+    else the model on the request's weather_data, else on the latest reading.
+    Returns (rain_prob, weather, source, model version or None) with weather
+    in request field names.
+    """
+    weather = data.get('weather_data') or {}
+    if 'rain_probability' in data:
+        return float(data['rain_probability']), weather, 'request', None
     
-    # Determine track condition
-    if rain_prob > 0.7:
-        track_condition = 'wet'
-    elif rain_prob > 0.4:
-        track_condition = 'damp'
+    if all(field in weather for field in PREDICT_FIELDS):
+        source = 'weather_data'
     else:
-        track_condition = 'dry'
+        dataset = weather_store.snapshot()
+        if len(dataset) == 0:
+            raise RequestError('No rain_probability, weather_data or stored reading to predict from')
+        weather = {field: float(dataset[column][-1]) for field, column in PREDICT_FIELDS.items()}
+        source = 'latest_reading'
     
-    # EMERGENCY: Very high rain (80-100%)
-    if rain_prob > 0.8:
-        if current_tire in ['soft', 'medium', 'hard']:
-            next_tire = 'Full Wet'
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, 'wet')
-            
-            return {
-                'action': 'PIT NOW',
-                'recommended_tire': next_tire,
-                'urgency': 'CRITICAL',
-                'reasoning': f'Rain spike detected at Lap {rain_spike["spike_lap"]}; pit before conditions worsen',
-                'estimated_lap': current_lap + 1,
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 0,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
-        else:
-            next_tire = 'Full Wet'
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, track_condition)
-            
-            return {
-                'action': 'STAY OUT',
-                'recommended_tire': next_tire,
-                'urgency': 'LOW',
-                'reasoning': 'Already on wet tires - continue racing',
-                'estimated_lap': min(current_lap + 20, total_laps - 2),
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 20,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
+    reading = {column: float(weather[field]) for field, column in PREDICT_FIELDS.items()}
+    serving = circuit_model(None)
+    return serving.model.predict(reading)['rain_probability'], weather, source, serving.model.version
+
+def pitstop_batch_payload(data):
+    """Pit stop strategy for every car, from one rain prediction and one DP table"""
+    cars = data.get('cars')
+    if not isinstance(cars, list) or not cars:
+        raise RequestError('Expected a non-empty "cars" list')
+    if len(cars) > MAX_GRID_SIZE:
+        raise RequestError(f'Too many cars: {len(cars)} > {MAX_GRID_SIZE}')
     
-    # HIGH URGENCY: High rain (60-80%)
-    elif rain_prob > 0.6:
-        if current_tire in ['soft', 'medium', 'hard']:
-            urgent_pit_lap = current_lap + 2
-            next_tire = 'Intermediate'
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, 'damp')
-            
-            return {
-                'action': 'PIT SOON',
-                'recommended_tire': next_tire,
-                'urgency': 'HIGH',
-                'reasoning': f'Rain spike at Lap {rain_spike["spike_lap"]} detected; prepare for wet conditions',
-                'estimated_lap': urgent_pit_lap,
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 2,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
-        else:
-            next_tire = 'Intermediate'
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, track_condition)
-            
-            return {
-                'action': 'CONTINUE',
-                'recommended_tire': next_tire,
-                'urgency': 'LOW',
-                'reasoning': 'Already prepared for wet conditions',
-                'estimated_lap': min(current_lap + 18, total_laps - 2),
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 18,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
+    try:
+        current_lap = int(data.get('current_lap', 1))
+        total_laps = int(data.get('total_laps', 50))
+        rain_prob, weather, source, model_version = grid_rain_probability(data)
+        humidity = weather.get('humidity')
+        wind_speed = weather.get('wind_speed')
+        
+        seed = request_seed(data)
+        grid = [(int(car.get('current_lap', current_lap)), car.get('current_tire', 'soft'),
+                 int(car.get('tire_age', 0))) for car in cars]
+        with metrics.phase('strategy'):
+            optimal = pit_planner.solve_grid(rain_prob, total_laps, grid, data.get('track_condition'))
+    except (AttributeError, TypeError, ValueError) as e:
+        raise RequestError(str(e))
     
-    # MEDIUM URGENCY: Moderate rain (40-60%)
-    elif rain_prob > 0.4:
-        if current_tire in ['soft', 'medium', 'hard']:
-            cautious_pit_lap = current_lap + 5
-            next_tire = 'Intermediate'
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, 'damp')
-            
-            return {
-                'action': 'PREPARE',
-                'recommended_tire': next_tire,
-                'urgency': 'MEDIUM',
-                'reasoning': f'Weather variance high; pit at Lap {cautious_pit_lap} if conditions worsen',
-                'estimated_lap': min(cautious_pit_lap, total_laps - 3),
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 5,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
-        else:
-            next_tire = current_tire
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, track_condition)
-            
-            return {
-                'action': 'MONITOR',
-                'recommended_tire': next_tire,
-                'urgency': 'LOW',
-                'reasoning': 'Conditions uncertain, monitor weather closely',
-                'estimated_lap': min(current_lap + 15, total_laps - 2),
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 15,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
+    strategies = []
+    with metrics.phase('strategy'):
+        for i, (car, (lap, tire, tire_age), best) in enumerate(zip(cars, grid, optimal)):
+            strategies.append({
+                'car': car.get('car', i + 1),
+                'current_tire': tire,
+                'tire_age': tire_age,
+                'strategy': cached_pitstop_strategy(rain_prob, lap, total_laps, tire, humidity, wind_speed, seed),
+                'optimal': best
+            })
+    
+    return {
+        'success': True,
+        'rain_probability': rain_prob,
+        'rain_probability_source': source,
+        'model_version': model_version,
+        'count': len(strategies),
+        'strategies': strategies,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def simulate_payload(data):
+    """Monte Carlo pit plan for one car"""
+    seed = request_seed(data)
+    try:
+        with metrics.phase('strategy'):
+            result = simulate_strategy(
+                float(data.get('rain_probability', 0)),
+                int(data.get('current_lap', 1)),
+                int(data.get('total_laps', 50)),
+                data.get('current_tire', 'soft'),
+                tire_age=int(data.get('tire_age', 0)),
+                scenarios=int(data.get('scenarios', DEFAULT_SCENARIOS)),
+                max_stops=int(data.get('max_stops', MAX_STOPS)),
+                seed=seed
+            )
+    except (TypeError, ValueError) as e:
+        raise RequestError(str(e))
     
-    # LOW RISK: Light rain (20-40%)
-    elif rain_prob > 0.2:
-        base_stint = tire_life.get(current_tire, 20)
-        conservative_pit = current_lap + int(base_stint * 0.8)
+    return {
+        'success': True,
+        'simulation': result
+    }
+
+def optimal_payload(data):
+    """Optimal pit schedule for one car"""
+    try:
+        with metrics.phase('strategy'):
+            result = pit_planner.solve(
+                float(data.get('rain_probability', 0)),
+                int(data.get('current_lap', 1)),
+                int(data.get('total_laps', 50)),
+                data.get('current_tire', 'soft'),
+                tire_age=int(data.get('tire_age', 0)),
+                track_condition=data.get('track_condition')
+            )
+    except (TypeError, ValueError) as e:
+        raise RequestError(str(e))
+    
+    return {
+        'success': True,
+        'strategy': result
+    }
+
+def analytics_window(args):
+    """(last, seconds) of ?last / ?seconds; 400 for a window that selects nothing"""
+    last = query_number(args, 'last')
+    seconds = query_number(args, 'seconds', float)
+    if last is not None and last < 1:
+        raise RequestError('last must be at least 1')
+    if seconds is not None and not (math.isfinite(seconds) and seconds >= 0):
+        raise RequestError('seconds must be a non-negative number')
+    return last, seconds
+
+def analytics_etag(args):
+    """ETag of the summary selected by ?last / ?seconds"""
+    last, seconds = analytics_window(args)
+    windowed = last is not None or seconds is not None
+    return weather_aggregator.etag(f'{last}-{seconds}' if windowed else None)
+
+def analytics_payload(args):
+    """Analytics summary (whole dataset, or a ?last / ?seconds window)"""
+    dataset = weather_store.snapshot()
+    last, seconds = analytics_window(args)
+    
+    if last is not None or seconds is not None:
+        summary = weather_aggregator.window_summary(dataset, last=last, seconds=seconds)
+    else:
+        summary = weather_aggregator.summary()
+    
+    return {
+        'success': True,
+        'summary': summary,
+        'version': analytics_etag(args)
+    }
+
+def admin_reload_payload(data, token):
+    """
+    Reload a circuit's model now ({"circuit": <id>, "version": <version>},
+    both optional: default circuit, its LATEST). Needs the ADMIN_TOKEN.
+    """
+    if not ADMIN_TOKEN:
+        raise RequestError('Admin endpoints are disabled (ADMIN_TOKEN is not set)', 404)
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise RequestError('Invalid admin token', 403)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise RequestError('Expected a JSON object in request body')
+    for field in ('circuit', 'version'):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            raise RequestError(f'"{field}" must be a string')
+    try:
+        report = model_reloader.reload(data.get('circuit') or None, data.get('version') or None)
+    except ReloadRejected as e:
+        raise RequestError(str(e), 409)
+    except UnknownCircuit as e:
+        raise RequestError(str(e), 404)
+    return {'success': True, 'reload': report}
+
+@app.route('/api/predict', methods=['POST'])
+def predict_rain():
+    """Predict rain probability based on weather data"""
+    try:
+        return jsonify(predict_payload(request.get_json(), request.args.get('circuit')))
         
-        if current_tire == 'soft':
-            next_tire = 'Medium'
-        elif current_tire == 'medium':
-            next_tire = 'Hard'
-        else:
-            next_tire = 'Medium'
+    except RequestError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_rain_batch():
+    """
+    Predict rain probability for many readings in one model call.
+    Accepts {"readings": [{air_temp, ...}, ...]} (or a bare list) and answers
+    with one prediction per reading, or {"columns": {"air_temp": [...], ...}}
+    and answers with one array per output field. Order follows the input.
+    """
+    try:
+        return jsonify(predict_batch_payload(request.get_json(), request.args.get('circuit')))
+        
+    except RequestError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/predict/approx', methods=['GET'])
+def predict_rain_approx():
+    """
+    Fast approximate rain probability from the precomputed lookup grid,
+    for sliders and sweeps. The response carries the grid's measured
+    maximum error; use /api/predict for the exact model answer.
+    """
+    try:
+        return jsonify(approx_payload(request.args))
         
-        expected_lap_time = estimate_lap_time(next_tire, rain_prob, track_condition)
+    except RequestError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/weather/current', methods=['GET'])
+def get_current_weather():
+    """Get latest weather data"""
+    try:
+        return jsonify(current_weather_payload(fetch_live_weather_cota()))
+    except RequestError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/weather/history', methods=['GET'])
+def get_weather_history():
+    """
+    Get historical weather data
+    Query: limit (max 5000), since/until (TIME_UTC_SECONDS, inclusive),
+    cursor (next_cursor of the previous page), points (downsample to at
+    most N buckets for charts), format=rows|columns
+    """
+    try:
+        return jsonify(history_payload(request.args))
         
-        return {
-            'action': 'CONTINUE',
-            'recommended_tire': next_tire,
-            'urgency': 'LOW',
-            'reasoning': f'Dry track optimal; switch to {next_tire} at Lap {conservative_pit}',
-            'estimated_lap': min(conservative_pit, total_laps - 3),
-            'confidence': confidence_label,
-            'confidence_value': confidence_value,
-            'stint_length': min(int(base_stint * 0.8), laps_remaining - 3),
-            'expected_lap_time': expected_lap_time,
-            'rain_spike': rain_spike
-        }
+    except RequestError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status
+    except Exception as e:
+        return server_error(e)
+
+def build_stream_events(dataset, start, end):
+    """Reading + prediction + strategy for readings [start, end), one model call"""
+    serving = model_pool.default.model
+    records = {column: dataset[column][start:end] for column in PREDICT_FIELDS.values()}
+    if serving.uses_trend_features:
+        records.update(dataset_trends(dataset, start, end))
+    predictions = serving.predict_batch(records)
+    readings = columns_to_rows({field: to_json_list(values)
+                                for field, values in history_columns(dataset, start, end).items()})
     
-    # MINIMAL RISK: Dry conditions (0-20%)
-    else:
-        base_stint = tire_life.get(current_tire, 20)
-        optimal_pit_lap = current_lap + base_stint
-        optimal_pit_lap = min(optimal_pit_lap, total_laps - 2)
+    events = []
+    for i, reading in enumerate(readings):
+        rain_prob = float(predictions['rain_probability'][i])
+        weather_data = {column: reading[field] for field, column in PREDICT_FIELDS.items()}
+        events.append((reading['time_seconds'], {
+            'reading': reading,
+            'prediction': {
+                'rain_probability': rain_prob,
+                'no_rain_probability': float(predictions['no_rain_probability'][i]),
+                'prediction': int(predictions['prediction'][i])
+            },
+            'strategy': get_strategy_recommendation(rain_prob, weather_data),
+            'model_version': serving.version
+        }))
+    return events
+
+# One poller + one inference per new reading, shared by every stream client
+reading_broadcaster = ReadingBroadcaster(weather_store, build_stream_events)
+
+@app.route('/api/stream', methods=['GET'])
+def stream_readings():
+    """Server-sent events: each new reading with its rain probability and strategy"""
+    subscription = reading_broadcaster.subscribe()
+    
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                event = subscription.get()
+                yield event.sse if event is not None else ': keepalive\n\n'
+        finally:
+            reading_broadcaster.unsubscribe(subscription)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+try:
+    from flask_sock import Sock
+except ImportError:  # WebSocket transport is optional
+    Sock = None
+
+if Sock is not None:
+    sock = Sock(app)
+    
+    @sock.route('/api/stream/ws')
+    def stream_readings_ws(ws):
+        """WebSocket variant of /api/stream (JSON messages)"""
+        subscription = reading_broadcaster.subscribe()
+        try:
+            while True:
+                event = subscription.get()
+                if event is not None:
+                    ws.send(event.json)
+        finally:
+            reading_broadcaster.unsubscribe(subscription)
+
+@app.route('/api/strategy/pitstop', methods=['POST'])
+def pitstop_strategy():
+    """Calculate pit stop strategy with enhanced features"""
+    try:
+        return jsonify(pitstop_payload(request.get_json()))
         
-        if laps_remaining <= 5:
-            expected_lap_time = estimate_lap_time(current_tire, rain_prob, track_condition)
-            
-            return {
-                'action': 'STAY OUT',
-                'recommended_tire': current_tire,
-                'urgency': 'NONE',
-                'reasoning': f'Too few laps remaining; finish race on {current_tire} tires',
-                'estimated_lap': total_laps,
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': laps_remaining,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
+    except RequestError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/strategy/pitstop/batch', methods=['POST'])
+def pitstop_strategy_batch():
+    """
+    Pit stop strategy for the whole grid. Body: current_lap, total_laps,
+    cars [{car, current_tire, tire_age, current_lap?}], and rain_probability
+    or weather_data (default: the latest stored reading).
+    """
+    try:
+        return jsonify(pitstop_batch_payload(request.get_json()))
         
-        if current_tire == 'soft':
-            next_tire = 'Medium'
-        elif current_tire == 'medium':
-            next_tire = 'Hard'
-        elif current_tire == 'hard':
-            if laps_remaining > 30:
-                next_tire = 'Medium'
-            else:
-                next_tire = 'Hard'
-        else:
-            next_tire = 'Soft'
+    except RequestError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/strategy/optimal', methods=['POST'])
+def optimal_pitstop_strategy():
+    """
+    Optimal stop laps and compounds for the rest of the race, from a DP over
+    (lap, compound, tire age, track condition). Body: rain_probability,
+    current_lap, total_laps (up to 100), current_tire, optional tire_age and
+    track_condition (dry/damp/wet).
+    """
+    try:
+        return jsonify(optimal_payload(request.get_json()))
         
-        expected_lap_time = estimate_lap_time(next_tire, rain_prob, track_condition)
+    except RequestError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/strategy/simulate', methods=['POST'])
+def simulate_pitstop_strategy():
+    """
+    Rank pit plans (up to two stops) by expected race time over sampled
+    rain timelines. Body: rain_probability, current_lap, total_laps,
+    current_tire, optional tire_age, scenarios, max_stops and seed.
+    """
+    try:
+        return jsonify(simulate_payload(request.get_json()))
         
-        return {
-            'action': 'CONTINUE',
-            'recommended_tire': next_tire,
-            'urgency': 'LOW',
-            'reasoning': f'Optimal conditions; pit at Lap {optimal_pit_lap} for {next_tire} compound',
-            'estimated_lap': optimal_pit_lap,
-            'confidence': confidence_label,
-            'confidence_value': confidence_value,
-            'stint_length': base_stint,
-            'expected_lap_time': expected_lap_time,
-            'rain_spike': rain_spike
-        }
+    except RequestError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status
+    except Exception as e:
+        return server_error(e)
 
 @app.route('/api/analytics/summary', methods=['GET'])
 def analytics_summary():
-    """Get analytics summary"""
+    """
+    Get analytics summary from the running aggregates.
+    Optional ?last=N and/or ?seconds=T restrict it to the most recent
+    readings. The response carries an ETag; If-None-Match yields a 304.
+    """
     try:
-        df = pd.read_csv(DATA_PATH, sep=';')
-        
-        summary = {
-            'total_readings': len(df),
-            'rain_events': int(df['RAIN'].sum()),
-            'rain_percentage': float((df['RAIN'].sum() / len(df)) * 100),
-            'avg_temperature': {
-                'air': float(df['AIR_TEMP'].mean()),
-                'track': float(df['TRACK_TEMP'].mean())
-            },
-            'avg_humidity': float(df['HUMIDITY'].mean()),
-            'avg_pressure': float(df['PRESSURE'].mean()),
-            'avg_wind_speed': float(df['WIND_SPEED'].mean()),
-            'temperature_range': {
-                'air_min': float(df['AIR_TEMP'].min()),
-                'air_max': float(df['AIR_TEMP'].max()),
-                'track_min': float(df['TRACK_TEMP'].min()),
-                'track_max': float(df['TRACK_TEMP'].max())
-            }
-        }
+        weather_store.refresh()
+        etag = analytics_etag(request.args)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify(analytics_payload(request.args))
+        response.set_etag(etag)
+        return response
         
-        return jsonify({
-            'success': True,
-            'summary': summary
-        })
+    except RequestError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/admin/reload', methods=['POST'])
+def admin_reload():
+    """Validate and swap in a published model without restarting (X-Admin-Token)"""
+    try:
+        return jsonify(admin_reload_payload(request.get_json(silent=True), request.headers.get('X-Admin-Token')))
         
+    except RequestError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status
     except Exception as e:
-        return jsonify({'error': str(e), 'success': False}), 500
+        return server_error(e)
+
+# Read from the owning components when /api/metrics is scraped
+metrics.registry.collected(
+    'rain_model_info', 'Loaded model artifact', labels=('version', 'backend', 'trend_features'),
+    collect=lambda: {(model_pool.default.model.version, model_pool.default.model.backend,
+                      str(model_pool.default.model.uses_trend_features).lower()): 1})
+metrics.registry.collected(
+    'prediction_cache_lookups_total', '/api/predict cache lookups', 'counter', ('result',),
+    lambda: {('hit',): model_pool.default.cache.hits, ('miss',): model_pool.default.cache.misses,
+             ('expired',): model_pool.default.cache.expired})
+metrics.registry.collected(
+    'prediction_cache_entries', '/api/predict cache size',
+    collect=lambda: {(): model_pool.default.cache.info()['size']})
+metrics.registry.collected(
+    'strategy_cache_lookups_total', 'Memoized pitstop strategy lookups', 'counter', ('result',),
+    lambda: {('hit',): strategy_cache_info()['hits'], ('miss',): strategy_cache_info()['misses']})
+metrics.registry.collected(
+    'planner_table_lookups_total', 'Optimal strategy value table lookups', 'counter', ('result',),
+    lambda: {('hit',): pit_planner.hits, ('miss',): pit_planner.misses})
+metrics.registry.collected(
+    'weather_cache_lookups_total', 'Live weather cache lookups', 'counter', ('result',),
+    lambda: {(name,): value for name, value in weather_client.stats.items()})
+metrics.registry.collected(
+    'dataset_loads_total', 'Weather dataset full reloads and incremental appends', 'counter', ('kind',),
+    lambda: {('reload',): weather_store.reloads, ('append',): weather_store.appends})
+metrics.registry.collected(
+    'dataset_rows', 'Readings in the current dataset snapshot', collect=lambda: {(): len(weather_store.snapshot())})
+metrics.registry.collected(
+    'model_pool_lookups_total', 'Circuit model pool lookups (the default circuit is not counted)', 'counter',
+    ('result',), lambda: {('hit',): model_pool.hits, ('miss',): model_pool.misses,
+                          ('eviction',): model_pool.evictions})
+metrics.registry.collected(
+    'model_reloads_total', 'Hot model reloads by outcome', 'counter', ('result',),
+    lambda: {('reloaded',): model_reloader.reloads, ('rejected',): model_reloader.rejected})
+metrics.registry.collected(
+    'model_pool_bytes', 'Artifact bytes of the loaded circuit models', collect=lambda: {(): model_pool.info()['bytes']})
+metrics.registry.collected(
+    'feature_sessions', 'Active trend feature sessions', collect=lambda: {(): feature_store.info()['sessions']})
+metrics.registry.collected(
+    'stream_subscribers', 'Connected /api/stream clients', collect=lambda: {(): reading_broadcaster.subscriber_count})
+metrics.registry.collected(
+    'stream_events_total', 'Events published to /api/stream', 'counter',
+    collect=lambda: {(): reading_broadcaster.events_published})
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Request, model and cache metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     print("=" * 50)
@@ -623,10 +946,18 @@ if __name__ == '__main__':
     print("Endpoints:")
     print("  GET  /api/health              - Health check")
     print("  POST /api/predict             - Rain prediction")
+    print("  POST /api/predict/batch       - Batch rain prediction")
+    print("  GET  /api/predict/approx      - Approximate rain prediction (grid)")
     print("  GET  /api/weather/current     - Current weather")
     print("  GET  /api/weather/history     - Weather history")
     print("  POST /api/strategy/pitstop    - Pit stop strategy (ENHANCED)")
+    print("  POST /api/strategy/pitstop/batch - Pit stop strategy, whole grid")
+    print("  POST /api/strategy/simulate   - Monte Carlo pit plan")
+    print("  POST /api/strategy/optimal    - Optimal pit schedule (DP)")
     print("  GET  /api/analytics/summary   - Analytics summary")
+    print("  GET  /api/stream              - Live readings (SSE)")
+    print("  GET  /api/metrics             - Prometheus metrics")
+    print("  POST /api/admin/reload        - Hot-reload the published model")
     print("=" * 50)
     
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -1,8 +1,9 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
 from model import RainPredictionModel
+import registry
+import column_cache
+from strategy import get_strategy_recommendation, cached_pitstop_strategy, parse_seed
 import os
 from datetime import datetime
 import requests
@@ -25,15 +26,11 @@ COTA_LON = -97.6411
 COTA_LOCATION = 'Circuit of the Americas, Austin, Texas'
 USE_LIVE_WEATHER = False
 
+# Load the published artifact read-only; training only happens (once, under
+# the registry lock) when nothing has been published yet. Retrain with train.py.
 try:
-    if os.path.exists(MODEL_PATH):
-        rain_model.load_model(MODEL_PATH)
-        print("✓ Model loaded successfully")
-    else:
-        print("Training new model...")
-        rain_model.train(DATA_PATH)
-        rain_model.save_model(MODEL_PATH)
-        print("✓ Model trained and saved")
+    manifest = registry.ensure_model(rain_model, DATA_PATH, MODEL_PATH)
+    print(f"✓ Model {manifest['version']} loaded and ready!")
 except Exception as e:
     print(f"⚠ Model initialization: {e}")
 
@@ -79,83 +76,6 @@ def fetch_live_weather_cota() -> Optional[dict]:
         print(f"⚠ Error fetching live weather: {e}")
         return None
 
-def calculate_confidence(rain_prob, humidity=None, wind_speed=None):
-    """Calculate true confidence based on weather variance and track stability"""
-    confidence_value = 0.85  # Base confidence
-    
-    # Reduce confidence for moderate rain probabilities (uncertain conditions)
-    if 0.3 < rain_prob < 0.7:
-        confidence_value -= 0.20
-    
-    # Reduce confidence for high humidity variance
-    if humidity and (humidity > 85 or humidity < 30):
-        confidence_value -= 0.10
-    
-    # Reduce confidence for high wind (variable conditions)
-    if wind_speed and wind_speed > 25:
-        confidence_value -= 0.15
-    
-    confidence_value = max(0.3, min(0.95, confidence_value))
-    
-    if confidence_value >= 0.80:
-        return 'very high', confidence_value
-    elif confidence_value >= 0.65:
-        return 'high', confidence_value
-    elif confidence_value >= 0.50:
-        return 'medium', confidence_value
-    else:
-        return 'low', confidence_value
-
-def detect_rain_spike(rain_prob, current_lap):
-    """Detect if there's an upcoming rain spike"""
-    spike_lap = None
-    spike_detected = False
-    
-    # Simulate rain spike detection based on probability jump
-    # In a real system, this would analyze weather forecast trends
-    if 0.45 < rain_prob < 0.65:
-        # Moderate probability suggests spike may occur soon
-        spike_lap = current_lap + np.random.randint(3, 8)
-        spike_detected = True
-    elif rain_prob > 0.75:
-        # High probability suggests spike is imminent or happening
-        spike_lap = current_lap + 1
-        spike_detected = True
-    
-    return {
-        'detected': spike_detected,
-        'spike_lap': spike_lap
-    }
-
-def estimate_lap_time(tire_compound, rain_prob, track_condition='dry'):
-    """Estimate expected lap time after pitstop"""
-    # Base lap times for each compound (in seconds)
-    base_lap_times = {
-        'soft': 85.0,
-        'medium': 86.5,
-        'hard': 88.0,
-        'intermediate': 90.0,
-        'wet': 95.0
-    }
-    
-    base_time = base_lap_times.get(tire_compound.split()[0].lower(), 86.0)
-    
-    # Adjust for conditions
-    if track_condition == 'wet' and tire_compound.lower() in ['soft', 'medium', 'hard']:
-        base_time += 8.0  # Dry tires on wet track are much slower
-    elif track_condition == 'damp':
-        if tire_compound.lower() == 'intermediate':
-            base_time -= 1.5  # Intermediates excel on damp track
-        elif tire_compound.lower() in ['soft', 'medium', 'hard']:
-            base_time += 3.0  # Dry tires on damp track
-
-    
-    # Add variance based on rain probability
-    if rain_prob > 0.6:
-        base_time += np.random.uniform(0.5, 2.0)
-    
-    return round(base_time, 1)
-
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -163,6 +83,7 @@ def health_check():
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'model_loaded': rain_model.model is not None,
+        'model_version': rain_model.version,
         'live_weather_enabled': USE_LIVE_WEATHER,
         'location': COTA_LOCATION if USE_LIVE_WEATHER else 'Dataset only'
     })
@@ -228,7 +149,7 @@ def get_current_weather():
                 }
             })
         else:
-            df = pd.read_csv(DATA_PATH, sep=';')
+            df = column_cache.read_frame(DATA_PATH)
             latest = df.iloc[-1].to_dict()
             
             return jsonify({
@@ -255,7 +176,7 @@ def get_weather_history():
     """Get historical weather data"""
     try:
         limit = int(request.args.get('limit', 50))
-        df = pd.read_csv(DATA_PATH, sep=';')
+        df = column_cache.read_frame(DATA_PATH)
         history = df.tail(limit)
         
         data = []
@@ -291,14 +212,18 @@ def pitstop_strategy():
         current_lap = int(data.get('current_lap', 1))
         total_laps = int(data.get('total_laps', 50))
         current_tire = data.get('current_tire', 'soft')
+        try:
+            seed = parse_seed(data.get('seed'))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
         
         # Get weather data if available
         weather_data = data.get('weather_data', {})
         humidity = weather_data.get('humidity')
         wind_speed = weather_data.get('wind_speed')
         
-        strategy = calculate_pitstop_strategy(
-            rain_prob, current_lap, total_laps, current_tire, humidity, wind_speed
+        strategy = cached_pitstop_strategy(
+            rain_prob, current_lap, total_laps, current_tire, humidity, wind_speed, seed
         )
         
         return jsonify({
@@ -309,263 +234,11 @@ def pitstop_strategy():
     except Exception as e:
         return jsonify({'error': str(e), 'success': False}), 500
 
-def get_strategy_recommendation(rain_prob, weather_data):
-    """Generate strategy recommendation"""
-    
-    if rain_prob > 0.7:
-        risk_level = 'HIGH'
-        recommendation = 'Prepare for wet conditions immediately'
-        tire_choice = 'Intermediate or Full Wet'
-        action = 'urgent'
-    elif rain_prob > 0.4:
-        risk_level = 'MEDIUM'
-        recommendation = 'Monitor conditions closely, prepare wet tires'
-        tire_choice = 'Keep Intermediate ready'
-        action = 'caution'
-    else:
-        risk_level = 'LOW'
-        recommendation = 'Continue with dry strategy'
-        tire_choice = 'Soft/Medium/Hard compound'
-        action = 'normal'
-    
-    humidity = weather_data['HUMIDITY']
-    temp_diff = weather_data['AIR_TEMP'] - weather_data['TRACK_TEMP']
-    
-    notes = []
-    if humidity > 70:
-        notes.append('High humidity increases rain risk')
-    if temp_diff < -10:
-        notes.append('Track significantly warmer than air - favorable for dry tires')
-    elif temp_diff > 0:
-        notes.append('Air warmer than track - potential for cooling')
-    
-    if weather_data['WIND_SPEED'] > 20:
-        notes.append('High wind speeds - expect variable conditions')
-    
-    return {
-        'risk_level': risk_level,
-        'rain_probability_percent': round(rain_prob * 100, 2),
-        'recommendation': recommendation,
-        'tire_choice': tire_choice,
-        'action': action,
-        'notes': notes
-    }
-
-def calculate_pitstop_strategy(rain_prob, current_lap, total_laps, current_tire, humidity=None, wind_speed=None):
-    """Calculate optimal pit stop strategy - ENHANCED VERSION"""
-    
-    laps_remaining = total_laps - current_lap
-    
-    tire_life = {
-        'soft': 15,
-        'medium': 25,
-        'hard': 35,
-        'intermediate': 20,
-        'wet': 25
-    }
-    
-    # Calculate confidence
-    confidence_label, confidence_value = calculate_confidence(rain_prob, humidity, wind_speed)
-    
-    # Detect rain spike
-    rain_spike = detect_rain_spike(rain_prob, current_lap)
-    
-    # Determine track condition
-    if rain_prob > 0.7:
-        track_condition = 'wet'
-    elif rain_prob > 0.4:
-        track_condition = 'damp'
-    else:
-        track_condition = 'dry'
-    
-    # EMERGENCY: Very high rain (80-100%)
-    if rain_prob > 0.8:
-        if current_tire in ['soft', 'medium', 'hard']:
-            next_tire = 'Full Wet'
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, 'wet')
-            
-            return {
-                'action': 'PIT NOW',
-                'recommended_tire': next_tire,
-                'urgency': 'CRITICAL',
-                'reasoning': f'Rain spike detected at Lap {rain_spike["spike_lap"]}; pit before conditions worsen',
-                'estimated_lap': current_lap + 1,
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 0,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
-        else:
-            next_tire = 'Full Wet'
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, track_condition)
-            
-            return {
-                'action': 'STAY OUT',
-                'recommended_tire': next_tire,
-                'urgency': 'LOW',
-                'reasoning': 'Already on wet tires - continue racing',
-                'estimated_lap': min(current_lap + 20, total_laps - 2),
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 20,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
-    
-    # HIGH URGENCY: High rain (60-80%)
-    elif rain_prob > 0.6:
-        if current_tire in ['soft', 'medium', 'hard']:
-            urgent_pit_lap = current_lap + 2
-            next_tire = 'Intermediate'
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, 'damp')
-            
-            return {
-                'action': 'PIT SOON',
-                'recommended_tire': next_tire,
-                'urgency': 'HIGH',
-                'reasoning': f'Rain spike at Lap {rain_spike["spike_lap"]} detected; prepare for wet conditions',
-                'estimated_lap': urgent_pit_lap,
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 2,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
-        else:
-            next_tire = 'Intermediate'
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, track_condition)
-            
-            return {
-                'action': 'CONTINUE',
-                'recommended_tire': next_tire,
-                'urgency': 'LOW',
-                'reasoning': 'Already prepared for wet conditions',
-                'estimated_lap': min(current_lap + 18, total_laps - 2),
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 18,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
-    
-    # MEDIUM URGENCY: Moderate rain (40-60%)
-    elif rain_prob > 0.4:
-        if current_tire in ['soft', 'medium', 'hard']:
-            cautious_pit_lap = current_lap + 5
-            next_tire = 'Intermediate'
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, 'damp')
-            
-            return {
-                'action': 'PREPARE',
-                'recommended_tire': next_tire,
-                'urgency': 'MEDIUM',
-                'reasoning': f'Weather variance high; pit at Lap {cautious_pit_lap} if conditions worsen',
-                'estimated_lap': min(cautious_pit_lap, total_laps - 3),
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 5,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
-        else:
-            next_tire = current_tire
-            expected_lap_time = estimate_lap_time(next_tire, rain_prob, track_condition)
-            
-            return {
-                'action': 'MONITOR',
-                'recommended_tire': next_tire,
-                'urgency': 'LOW',
-                'reasoning': 'Conditions uncertain, monitor weather closely',
-                'estimated_lap': min(current_lap + 15, total_laps - 2),
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': 15,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
-    
-    # LOW RISK: Light rain (20-40%)
-    elif rain_prob > 0.2:
-        base_stint = tire_life.get(current_tire, 20)
-        conservative_pit = current_lap + int(base_stint * 0.8)
-        
-        if current_tire == 'soft':
-            next_tire = 'Medium'
-        elif current_tire == 'medium':
-            next_tire = 'Hard'
-        else:
-            next_tire = 'Medium'
-        
-        expected_lap_time = estimate_lap_time(next_tire, rain_prob, track_condition)
-        
-        return {
-            'action': 'CONTINUE',
-            'recommended_tire': next_tire,
-            'urgency': 'LOW',
-            'reasoning': f'Dry track optimal; switch to {next_tire} at Lap {conservative_pit}',
-            'estimated_lap': min(conservative_pit, total_laps - 3),
-            'confidence': confidence_label,
-            'confidence_value': confidence_value,
-            'stint_length': min(int(base_stint * 0.8), laps_remaining - 3),
-            'expected_lap_time': expected_lap_time,
-            'rain_spike': rain_spike
-        }
-    
-    # MINIMAL RISK: Dry conditions (0-20%)
-    else:
-        base_stint = tire_life.get(current_tire, 20)
-        optimal_pit_lap = current_lap + base_stint
-        optimal_pit_lap = min(optimal_pit_lap, total_laps - 2)
-        
-        if laps_remaining <= 5:
-            expected_lap_time = estimate_lap_time(current_tire, rain_prob, track_condition)
-            
-            return {
-                'action': 'STAY OUT',
-                'recommended_tire': current_tire,
-                'urgency': 'NONE',
-                'reasoning': f'Too few laps remaining; finish race on {current_tire} tires',
-                'estimated_lap': total_laps,
-                'confidence': confidence_label,
-                'confidence_value': confidence_value,
-                'stint_length': laps_remaining,
-                'expected_lap_time': expected_lap_time,
-                'rain_spike': rain_spike
-            }
-        
-        if current_tire == 'soft':
-            next_tire = 'Medium'
-        elif current_tire == 'medium':
-            next_tire = 'Hard'
-        elif current_tire == 'hard':
-            if laps_remaining > 30:
-                next_tire = 'Medium'
-            else:
-                next_tire = 'Hard'
-        else:
-            next_tire = 'Soft'
-        
-        expected_lap_time = estimate_lap_time(next_tire, rain_prob, track_condition)
-        
-        return {
-            'action': 'CONTINUE',
-            'recommended_tire': next_tire,
-            'urgency': 'LOW',
-            'reasoning': f'Optimal conditions; pit at Lap {optimal_pit_lap} for {next_tire} compound',
-            'estimated_lap': optimal_pit_lap,
-            'confidence': confidence_label,
-            'confidence_value': confidence_value,
-            'stint_length': base_stint,
-            'expected_lap_time': expected_lap_time,
-            'rain_spike': rain_spike
-        }
-
 @app.route('/api/analytics/summary', methods=['GET'])
 def analytics_summary():
     """Get analytics summary"""
     try:
-        df = pd.read_csv(DATA_PATH, sep=';')
+        df = column_cache.read_frame(DATA_PATH)
         
         summary = {
             'total_readings': len(df),
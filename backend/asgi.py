@@ -0,0 +1,313 @@
+"""
+ASGI entry point serving the same API as app.py:
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+The model, dataset store and payload builders are shared with the Flask
+app. Blocking I/O (live weather fetch, dataset reload) runs off the event
+loop via asyncio.to_thread; CPU-bound inference runs on a bounded thread
+pool so a burst of predictions cannot starve the loop or grow without limit.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import app as backend
+import metrics
+from app import RequestError
+from stream import KEEPALIVE_SECONDS, Subscription
+
+# Inference worker threads (NumPy/sklearn release the GIL for most of the work)
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', os.cpu_count() or 1))
+# Requests allowed to wait for an inference thread; the rest wait on the loop
+INFERENCE_QUEUE = int(os.getenv('INFERENCE_QUEUE', INFERENCE_THREADS * 4))
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+]
+PREFLIGHT_HEADERS = [
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+    (b'access-control-allow-headers', b'Content-Type, If-None-Match, X-Admin-Token'),
+    (b'access-control-max-age', b'600'),
+]
+
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS,
+                                        thread_name_prefix='inference')
+_inference_slots = None
+
+
+async def run_inference(fn, *args):
+    """Run CPU-bound work on the inference pool, at most INFERENCE_QUEUE at once"""
+    global _inference_slots
+    if _inference_slots is None:
+        _inference_slots = asyncio.Semaphore(INFERENCE_QUEUE)
+    async with _inference_slots:
+        # In the request's context, so phases timed on the pool reach its RequestTimer
+        context = contextvars.copy_context()
+        result = await asyncio.get_running_loop().run_in_executor(inference_executor, context.run, fn, *args)
+    # The model that answered, for X-Model-Version
+    backend.served_model_version.set(context.get(backend.served_model_version))
+    return result
+
+
+async def refresh_dataset():
+    """Pick up CSV changes without blocking the loop (a stat when nothing changed)"""
+    await asyncio.to_thread(backend.weather_store.refresh)
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.body = body
+        self.query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        self.headers = {name.decode('latin-1'): value.decode('latin-1')
+                        for name, value in scope.get('headers', [])}
+
+    def json(self):
+        try:
+            with metrics.phase('parse'):
+                return json.loads(self.body)
+        except ValueError:
+            raise RequestError('Request body must be JSON')
+
+
+def etag_matches(header, etag):
+    """If-None-Match check for a strong ETag"""
+    if header is None:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/').strip('"') == etag for tag in tags)
+
+
+# Route handlers return (status, payload) or (status, payload, extra headers)
+
+async def home(request):
+    return 200, backend.home_payload()
+
+
+async def health(request):
+    return 200, backend.health_payload()
+
+
+async def predict(request):
+    return 200, await run_inference(backend.predict_payload, request.json(), request.query.get('circuit'))
+
+
+async def predict_batch(request):
+    return 200, await run_inference(backend.predict_batch_payload, request.json(), request.query.get('circuit'))
+
+
+async def predict_approx(request):
+    # A handful of array reads; cheaper inline than a hop to the pool
+    return 200, backend.approx_payload(request.query)
+
+
+async def admin_reload(request):
+    # Loading and validating a model takes seconds: off the loop, outside the inference pool
+    data = request.json() if request.body else None
+    return 200, await asyncio.to_thread(backend.admin_reload_payload, data, request.headers.get('x-admin-token'))
+
+
+async def metrics_text(request):
+    return 200, metrics.render(), [(b'content-type', b'text/plain; version=0.0.4')]
+
+
+async def current_weather(request):
+    live_weather = None
+    if backend.USE_LIVE_WEATHER:
+        live_weather = await asyncio.to_thread(backend.fetch_live_weather_cota)
+    if live_weather is None:
+        await refresh_dataset()
+    return 200, backend.current_weather_payload(live_weather)
+
+
+async def weather_history(request):
+    await refresh_dataset()
+    return 200, await run_inference(backend.history_payload, request.query)
+
+
+async def pitstop(request):
+    return 200, backend.pitstop_payload(request.json())
+
+
+async def pitstop_batch(request):
+    return 200, await run_inference(backend.pitstop_batch_payload, request.json())
+
+
+async def simulate(request):
+    return 200, await run_inference(backend.simulate_payload, request.json())
+
+
+async def optimal(request):
+    return 200, await run_inference(backend.optimal_payload, request.json())
+
+
+async def analytics(request):
+    await refresh_dataset()
+    etag = backend.analytics_etag(request.query)
+    headers = [(b'etag', f'"{etag}"'.encode())]
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return 304, None, headers
+    return 200, backend.analytics_payload(request.query), headers
+
+
+ROUTES = {
+    ('GET', '/'): home,
+    ('GET', '/api/health'): health,
+    ('POST', '/api/predict'): predict,
+    ('POST', '/api/predict/batch'): predict_batch,
+    ('GET', '/api/predict/approx'): predict_approx,
+    ('GET', '/api/weather/current'): current_weather,
+    ('GET', '/api/weather/history'): weather_history,
+    ('POST', '/api/strategy/pitstop'): pitstop,
+    ('POST', '/api/strategy/pitstop/batch'): pitstop_batch,
+    ('POST', '/api/strategy/simulate'): simulate,
+    ('POST', '/api/strategy/optimal'): optimal,
+    ('GET', '/api/analytics/summary'): analytics,
+    ('GET', '/api/metrics'): metrics_text,
+    ('POST', '/api/admin/reload'): admin_reload,
+}
+PATHS = {path for _, path in ROUTES}
+
+
+class AsyncSubscription(Subscription):
+    """Broadcaster subscription drained by a coroutine instead of a thread"""
+
+    def __init__(self, maxsize, loop):
+        super().__init__(maxsize)
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.loop = loop
+
+    def offer(self, event):
+        # Called from the broadcaster thread
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+async def stream(scope, receive, send):
+    """/api/stream: server-sent events without tying up a thread per client"""
+    broadcaster = backend.reading_broadcaster
+    subscription = AsyncSubscription(broadcaster.queue_size, asyncio.get_running_loop())
+    broadcaster.subscribe(subscription)
+    disconnected = asyncio.create_task(wait_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': CORS_HEADERS + [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+        while not disconnected.done():
+            next_event = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({next_event, disconnected}, timeout=KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if next_event in done:
+                chunk = next_event.result().sse.encode()
+            else:
+                next_event.cancel()
+                chunk = b': keepalive\n\n'
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        broadcaster.unsubscribe(subscription)
+        disconnected.cancel()
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise RequestError('Request body too large', status=413)
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+def model_version_header():
+    return (b'x-model-version', backend.response_model_version().encode('latin-1'))
+
+
+async def respond(send, status, payload, headers=()):
+    """Send payload as JSON, or as is when it is already text (headers set its type)"""
+    if isinstance(payload, str):
+        body = payload.encode()
+    else:
+        with metrics.phase('serialize'):
+            body = b'' if payload is None else json.dumps(payload).encode()
+    response_headers = CORS_HEADERS + list(headers)
+    if payload is not None and not isinstance(payload, str):
+        response_headers.append((b'content-type', b'application/json'))
+    response_headers.append((b'content-length', str(len(body)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            backend.model_reloader.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            inference_executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path']
+    if method == 'OPTIONS' and (path in PATHS or path == '/api/stream'):
+        return await respond(send, 204, None, PREFLIGHT_HEADERS)
+    if method == 'GET' and path == '/api/stream':
+        return await stream(scope, receive, send)
+
+    handler = ROUTES.get((method, path))
+    backend.served_model_version.set(None)
+    token = metrics.start_request(path if handler is not None else 'unmatched', method)
+    # Reported when the client goes away before a response
+    result = (499, None)
+    try:
+        if handler is None:
+            status = 405 if path in PATHS else 404
+            result = (status, {'error': 'Not found' if status == 404 else 'Method not allowed', 'success': False})
+        else:
+            try:
+                body = await read_body(receive)
+                if body is None:
+                    return
+                result = await handler(Request(scope, body))
+            except RequestError as e:
+                result = (e.status, {'error': str(e), 'success': False})
+            except Exception as e:
+                metrics.request_errors.inc(path)
+                print(f"ERROR in {path}: {traceback.format_exc()}")
+                result = (500, {'error': str(e), 'success': False})
+        status, payload, *headers = result
+        await respond(send, status, payload, list(headers[0] if headers else ()) + [model_version_header()])
+    finally:
+        metrics.finish_request(token, result[0])
@@ -0,0 +1,55 @@
+"""FlatForest evaluator against sklearn's predict_proba at several batch sizes."""
+import argparse
+import copy
+import sys
+import time
+
+import numpy as np
+
+from common import load_model, sample_readings
+from forest import FlatForest
+
+
+def best_of(fn, X, repeat):
+    fn(X)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    rain_model = load_model()
+    start = time.perf_counter()
+    flat = FlatForest.from_sklearn(rain_model.model)
+    print(f"flattened {flat.n_trees} trees / {len(flat.feature)} nodes "
+          f"({flat.nbytes / 1024:.0f} KiB) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # Serial sklearn sums trees in a fixed order, which the flat evaluator reproduces
+    serial = copy.copy(rain_model.model)
+    serial.n_jobs = 1
+
+    identical = True
+    for size in args.sizes:
+        X = rain_model.scale_features(rain_model.build_feature_matrix(sample_readings(size, seed=size)))
+        same = np.array_equal(serial.predict_proba(X), flat.predict_proba(X))
+        identical &= same
+
+        repeat = max(1, args.repeat * 100 // max(size, 100))
+        sk_time = best_of(rain_model.model.predict_proba, X, repeat)
+        flat_time = best_of(flat.predict_proba, X, repeat)
+        print(f"n={size:<6d} sklearn {sk_time * 1000:8.3f} ms   flat {flat_time * 1000:8.3f} ms   "
+              f"speedup {sk_time / flat_time:5.1f}x   identical={same}")
+
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
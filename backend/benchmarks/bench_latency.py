@@ -0,0 +1,48 @@
+"""Single-row latency of predict() against the pandas reference path."""
+import argparse
+import sys
+
+import numpy as np
+
+from common import load_model, sample_readings, time_calls
+
+# Latency budget for one live reading through predict()
+P50_TARGET_MS = 1.0
+P99_TARGET_MS = 5.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readings', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    rain_model = load_model()
+    readings = sample_readings(args.readings)
+
+    # Both paths must agree before their speed matters
+    mismatches = 0
+    for reading in readings:
+        fast = rain_model.predict(reading)
+        reference = rain_model.predict_pandas(reading)
+        if (fast['prediction'] != reference['prediction']
+                or not np.isclose(fast['rain_probability'], reference['rain_probability'],
+                                  rtol=0, atol=1e-12)):
+            mismatches += 1
+    print(f"result mismatches vs pandas path: {mismatches}/{len(readings)}")
+
+    results = {}
+    for name, fn in [('pandas', rain_model.predict_pandas), ('fast', rain_model.predict)]:
+        fn(readings[0])
+        it = iter(readings * 2)
+        latencies = time_calls(lambda: fn(next(it)), len(readings)) * 1000
+        results[name] = np.percentile(latencies, [50, 99])
+        print(f"{name:>6}: p50 {results[name][0]:7.3f} ms   p99 {results[name][1]:7.3f} ms")
+
+    p50, p99 = results['fast']
+    ok = mismatches == 0 and p50 <= P50_TARGET_MS and p99 <= P99_TARGET_MS
+    print(f"target p50 <= {P50_TARGET_MS} ms, p99 <= {P99_TARGET_MS} ms: {'PASS' if ok else 'FAIL'}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
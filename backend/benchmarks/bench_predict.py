@@ -0,0 +1,38 @@
+"""Throughput of predict_batch against calling predict once per reading."""
+import argparse
+import time
+
+import numpy as np
+
+from common import load_model, sample_readings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 1000, 10000])
+    parser.add_argument('--single-rows', type=int, default=200,
+                        help='readings timed through the single-row path')
+    args = parser.parse_args(argv)
+
+    rain_model = load_model()
+
+    readings = sample_readings(args.single_rows)
+    start = time.perf_counter()
+    single = [rain_model.predict(reading)['rain_probability'] for reading in readings]
+    single_rate = len(readings) / (time.perf_counter() - start)
+    print(f"predict (single row):  {single_rate:10.0f} rows/s")
+
+    batch = rain_model.predict_batch(readings)['rain_probability']
+    assert np.allclose(batch, single), 'predict_batch disagrees with predict'
+
+    for size in args.sizes:
+        readings = sample_readings(size, seed=size)
+        start = time.perf_counter()
+        rain_model.predict_batch(readings)
+        elapsed = time.perf_counter() - start
+        print(f"predict_batch n={size:<6d} {size / elapsed:10.0f} rows/s  "
+              f"({elapsed * 1000:.1f} ms, {size / elapsed / single_rate:.0f}x single)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Hit rate vs accuracy of the /api/predict cache at several quantization levels."""
+import argparse
+import sys
+
+import numpy as np
+
+from common import INPUT_COLUMNS, load_model, sample_readings, time_calls
+from prediction_cache import DEFAULT_PRECISION, PredictionCache
+
+
+def dashboard_stream(n_calls, seed=0):
+    """Readings that drift slowly with sensor noise, like consecutive dashboard polls"""
+    rng = np.random.default_rng(seed)
+    anchors = sample_readings(max(1, n_calls // 200), seed)
+    stream = []
+    for anchor in anchors:
+        base = np.array([anchor[name] for name in INPUT_COLUMNS])
+        drift = np.cumsum(rng.normal(0.0, 0.02, (200, len(INPUT_COLUMNS))), axis=0)
+        noise = rng.normal(0.0, 0.03, drift.shape)
+        stream.extend(dict(zip(INPUT_COLUMNS, row)) for row in (base + drift + noise).tolist())
+    return stream[:n_calls]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=5000)
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.1, 0.5, 1.0, 5.0, 10.0],
+                        help='multipliers applied to DEFAULT_PRECISION')
+    args = parser.parse_args(argv)
+
+    rain_model = load_model()
+    stream = dashboard_stream(args.calls)
+    exact = np.array([rain_model.predict(reading)['rain_probability'] for reading in stream])
+
+    print(f"{args.calls} calls; default steps {DEFAULT_PRECISION}")
+    print(f"{'scale':>6} {'hit rate':>9} {'mean err':>9} {'max err':>9} {'flips':>6} {'us/call':>8}")
+    for scale in args.scales:
+        precision = {name: step * scale for name, step in DEFAULT_PRECISION.items()}
+        cache = PredictionCache(rain_model, precision=precision, max_size=4096, ttl=3600)
+        cached = np.array([cache.predict(reading)['rain_probability'] for reading in stream])
+        error = np.abs(cached - exact)
+        flips = int(np.sum((cached > 0.5) != (exact > 0.5)))
+        hit_rate = cache.hits / (cache.hits + cache.misses)
+
+        it = iter(stream * 2)
+        latency = np.median(time_calls(lambda: cache.predict(next(it)), len(stream))) * 1e6
+        print(f"{scale:6.2f} {hit_rate:9.3f} {error.mean():9.5f} {error.max():9.5f} {flips:6d} {latency:8.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
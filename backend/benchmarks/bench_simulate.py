@@ -0,0 +1,39 @@
+"""Monte Carlo strategy simulator latency against the pit-wall decision budget."""
+import argparse
+import sys
+
+import numpy as np
+
+from common import time_calls
+from simulator import simulate_strategy
+
+# A pit call has to be made within this budget
+BUDGET_MS = 200.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scenarios', type=int, default=10000)
+    parser.add_argument('--total-laps', type=int, default=80)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args(argv)
+
+    tires = ['soft', 'medium', 'hard', 'intermediate']
+    worst = 0.0
+    print(f"{args.scenarios} scenarios, {args.total_laps} laps remaining, up to 2 stops")
+    for rain_prob in (0.05, 0.3, 0.5, 0.7, 0.9):
+        it = iter(tires * args.repeat)
+        latencies = time_calls(lambda: simulate_strategy(rain_prob, 0, args.total_laps, next(it),
+                                                         scenarios=args.scenarios, seed=0),
+                               args.repeat) * 1000
+        p50, p99 = np.percentile(latencies, [50, 99])
+        worst = max(worst, p99)
+        print(f"rain {rain_prob:4.2f}: p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+    ok = worst < BUDGET_MS
+    print(f"worst p99 {worst:.2f} ms vs budget {BUDGET_MS:.0f} ms: {'OK' if ok else 'OVER BUDGET'}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Check the live weather client against a local stub of the upstream API:
+concurrent misses coalesce onto one upstream call, stale hits return at once
+while a single background refresh runs, and errors are not retried within
+error_ttl. Exits 1 if any check fails.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from weather_client import CachedWeatherClient, parse_openweather
+
+SAMPLE = {
+    'main': {'temp': 24.0, 'humidity': 55.0, 'pressure': 1012.0},
+    'wind': {'speed': 3.0, 'deg': 180},
+    'weather': [{'description': 'clear sky'}],
+}
+
+
+class StubUpstream:
+    """An OpenWeather stand-in on localhost that counts the requests it serves"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+        self.status = 200
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.calls += 1
+                time.sleep(stub.delay)
+                body = json.dumps(SAMPLE).encode()
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/data/2.5/weather"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def concurrent_gets(client, n_callers):
+    """n_callers threads call get() together; returns (values, per-call seconds)"""
+    barrier = threading.Barrier(n_callers)
+    values, seconds = [None] * n_callers, [0.0] * n_callers
+
+    def call(i):
+        barrier.wait()
+        started = time.perf_counter()
+        values[i] = client.get()
+        seconds[i] = time.perf_counter() - started
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n_callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return values, seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--callers', type=int, default=32)
+    parser.add_argument('--delay', type=float, default=0.2, help='stub upstream latency in seconds')
+    args = parser.parse_args(argv)
+
+    stub = StubUpstream(args.delay)
+    ttl = 0.5
+    client = CachedWeatherClient(stub.url, {}, lambda data: parse_openweather(data, 'stub'),
+                                 ttl=ttl, stale_ttl=60.0, error_ttl=60.0, timeout=2.0)
+    failures = []
+
+    def check(name, ok, detail):
+        print(f"{'✓' if ok else '⚠'} {name}: {detail}")
+        if not ok:
+            failures.append(name)
+
+    try:
+        values, _ = concurrent_gets(client, args.callers)
+        check('coalesced misses', stub.calls == 1 and all(values),
+              f"{args.callers} concurrent misses -> {stub.calls} upstream call(s)")
+
+        values, seconds = concurrent_gets(client, args.callers)
+        check('fresh hits', stub.calls == 1 and all(values),
+              f"{args.callers} hits -> {stub.calls} upstream call(s)")
+
+        time.sleep(ttl + 0.1)
+        before, coalesced = stub.calls, client.stats['coalesced']
+        values, seconds = concurrent_gets(client, args.callers)
+        slowest = max(seconds)
+        check('stale hits return at once', all(values) and slowest < args.delay / 2,
+              f"slowest of {args.callers} stale hits took {slowest * 1000:.1f} ms "
+              f"(upstream {args.delay * 1000:.0f} ms)")
+        time.sleep(args.delay * 3)
+        # A second refresh thread would wait on the first and show up as coalesced
+        refreshes = stub.calls - before + client.stats['coalesced'] - coalesced
+        check('single revalidation', refreshes == 1,
+              f"{args.callers} stale hits -> {refreshes} background refresh(es)")
+
+        time.sleep(ttl + 0.1)
+        stub.status = 500
+        before = stub.calls
+        client.get()
+        time.sleep(args.delay * 3)
+        stale_value = client.get()
+        check('failed refresh keeps the stale value', stale_value is not None,
+              f"upstream 500 -> {'stale value' if stale_value else 'None'}")
+
+        client._value = client._fetched_at = None
+        for _ in range(5):
+            client.get()
+        check('errors are not retried', stub.calls - before == 1,
+              f"1 failed refresh, then 5 misses -> {stub.calls - before} upstream call(s)")
+    finally:
+        stub.close()
+
+    print(f"stats: {client.cache_info()}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Memory per pre-forked worker: the app loaded separately in every worker
+(preload_app off), loaded once in the master and forked (preload), and
+preloaded with the collector frozen before the fork as gunicorn.conf.py
+does (preload+freeze). Each worker serves a short mix of requests through
+the Flask test client and runs a full collection before it is measured.
+
+USS is the memory only that worker holds (what each extra worker costs);
+PSS splits shared pages between the processes sharing them, so the PSS of
+the master plus workers is the memory the whole server uses. Linux only.
+
+    python benchmarks/bench_worker_memory.py --workers 1 2 4 8
+    python benchmarks/bench_worker_memory.py --pid <gunicorn master pid>
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+
+# common (and through it NumPy, pandas and scikit-learn) is imported by the
+# workers only: a master without preload_app has not loaded them either
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('per-worker', 'preload', 'preload+freeze')
+RESULT_PREFIX = 'RESULT '
+
+
+def memory(pid):
+    """rss, pss and uss of a process in MB (from /proc/<pid>/smaps_rollup)"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as stream:
+        for line in stream:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0])
+    return {
+        'rss': fields['Rss'] / 1024,
+        'pss': fields['Pss'] / 1024,
+        'uss': (fields['Private_Clean'] + fields['Private_Dirty']) / 1024,
+    }
+
+
+def children(pid):
+    """Pids whose parent is pid"""
+    found = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stream:
+                # The command name may contain spaces; ppid is the second field after it
+                ppid = int(stream.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+    return sorted(found)
+
+
+def load_app():
+    import common  # noqa: F401  (puts backend/ on sys.path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+    return app
+
+
+def serve(requests):
+    """What a worker does between fork and measurement"""
+    from common import REQUEST_FIELDS, sample_readings
+    client = load_app().test_client()
+    readings = [{REQUEST_FIELDS[k]: v for k, v in r.items()} for r in sample_readings(requests)]
+    for i, reading in enumerate(readings):
+        client.post('/api/predict', json=reading)
+        if i % 50 == 0:
+            client.post('/api/predict/batch', json={'readings': readings[:1000]})
+            client.post('/api/strategy/pitstop', json={'rain_probability': reading['humidity'] / 100,
+                                                       'current_lap': 10, 'total_laps': 50})
+            client.get('/api/weather/history?limit=500')
+    gc.collect()
+
+
+def run(mode, workers, requests):
+    """Fork workers the way gunicorn does for mode and measure them (runs in a fresh interpreter)"""
+    os.chdir(BACKEND_DIR)
+    preload = mode != 'per-worker'
+    freeze = mode == 'preload+freeze'
+    if freeze:
+        gc.disable()
+    if preload:
+        load_app()
+
+    pids, ready = [], []
+    for _ in range(workers):
+        read_end, write_end = os.pipe()
+        if freeze:
+            gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            if freeze:
+                gc.enable()
+            serve(requests)
+            os.write(write_end, b'.')
+            signal.pause()
+            os._exit(0)
+        os.close(write_end)
+        pids.append(pid)
+        ready.append(read_end)
+
+    for read_end in ready:
+        os.read(read_end, 1)
+    measured = [memory(pid) for pid in pids]
+    master = memory(os.getpid())
+    for pid in pids:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    mean = {key: sum(m[key] for m in measured) / workers for key in ('rss', 'pss', 'uss')}
+    return {'mode': mode, 'workers': workers, 'worker': mean, 'master': master,
+            'total_pss': master['pss'] + sum(m['pss'] for m in measured)}
+
+
+def measure_running(pid):
+    """Print memory of a running server's master and its workers"""
+    print(f"{'pid':>8} {'role':<7} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8}")
+    total = 0.0
+    for role, process in [('master', pid)] + [('worker', child) for child in children(pid)]:
+        m = memory(process)
+        total += m['pss']
+        print(f"{process:>8} {role:<7} {m['rss']:8.1f} {m['pss']:8.1f} {m['uss']:8.1f}")
+    print(f"total PSS {total:.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--mode', action='append', choices=MODES, help='repeatable (default: all)')
+    parser.add_argument('--requests', type=int, default=500, help='predictions served by each worker')
+    parser.add_argument('--pid', type=int, help='measure a running gunicorn master and its workers instead')
+    parser.add_argument('--run', nargs=2, metavar=('MODE', 'WORKERS'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.pid:
+        measure_running(args.pid)
+        return 0
+    if args.run:
+        print(RESULT_PREFIX + json.dumps(run(args.run[0], int(args.run[1]), args.requests)))
+        return 0
+
+    print(f"{'mode':<15} {'workers':>7} {'worker RSS':>10} {'worker PSS':>10} {'worker USS':>10} "
+          f"{'master PSS':>10} {'total PSS':>10}  (MB)")
+    for mode in args.mode or MODES:
+        for workers in args.workers:
+            # A fresh interpreter per configuration, so nothing is inherited between runs
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', mode, str(workers),
+                                     '--requests', str(args.requests)],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(next(line for line in output.splitlines()
+                                     if line.startswith(RESULT_PREFIX))[len(RESULT_PREFIX):])
+            worker = result['worker']
+            print(f"{mode:<15} {workers:>7} {worker['rss']:10.1f} {worker['pss']:10.1f} {worker['uss']:10.1f} "
+                  f"{result['master']['pss']:10.1f} {result['total_pss']:10.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
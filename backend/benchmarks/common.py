@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import registry  # noqa: E402
+from model import RainPredictionModel  # noqa: E402
+
+DATA_PATH = os.path.join(BACKEND_DIR, '..', 'data', 'raindata.csv')
+MODEL_PATH = os.path.join(BACKEND_DIR, 'model_data')
+INPUT_COLUMNS = ['AIR_TEMP', 'TRACK_TEMP', 'HUMIDITY', 'PRESSURE', 'WIND_SPEED', 'WIND_DIRECTION']
+# Dataset column -> API request field
+REQUEST_FIELDS = {
+    'AIR_TEMP': 'air_temp', 'TRACK_TEMP': 'track_temp', 'HUMIDITY': 'humidity',
+    'PRESSURE': 'pressure', 'WIND_SPEED': 'wind_speed', 'WIND_DIRECTION': 'wind_direction',
+}
+# Rows copied together by synthetic_weather, so trends and rain spells survive resampling
+BLOCK_ROWS = 10
+
+
+def load_model():
+    """Load (or train once) the published model the server would use"""
+    rain_model = RainPredictionModel()
+    registry.ensure_model(rain_model, DATA_PATH, MODEL_PATH)
+    return rain_model
+
+
+def sample_readings(n_rows, seed=0):
+    """Resample dataset rows with small jitter so inputs are realistic but varied"""
+    rng = np.random.default_rng(seed)
+    df = pd.read_csv(DATA_PATH, sep=';')[INPUT_COLUMNS]
+    base = df.to_numpy(dtype=np.float64)[rng.integers(0, len(df), n_rows)]
+    base += rng.normal(0.0, 0.5, base.shape)
+    return [dict(zip(INPUT_COLUMNS, row)) for row in base.tolist()]
+
+
+def synthetic_weather(n_rows, seed=0):
+    """
+    A weather archive of n_rows in the CSV's layout, scaled up from the
+    dataset: blocks of consecutive readings in random order, plus slowly
+    drifting noise (a tenth of each column's spread), on a fresh timeline
+    at the dataset's sampling interval. RAIN comes with its block.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.read_csv(DATA_PATH, sep=';')
+    blocks = -(-n_rows // BLOCK_ROWS)
+    starts = rng.integers(0, len(df) - BLOCK_ROWS + 1, blocks)
+    index = (starts[:, None] + np.arange(BLOCK_ROWS)).ravel()[:n_rows]
+
+    frame = pd.DataFrame(index=range(n_rows))
+    interval = float(np.diff(df['TIME_UTC_SECONDS']).mean())
+    seconds = int(df['TIME_UTC_SECONDS'].iloc[0]) + np.round(np.arange(n_rows) * interval).astype(np.int64)
+    frame['TIME_UTC_SECONDS'] = seconds
+    frame['TIME_UTC_STR'] = pd.to_datetime(seconds, unit='s').strftime('%-m/%-d/%Y %-I:%M:%S %p')
+    for name in INPUT_COLUMNS:
+        values = df[name].to_numpy(dtype=np.float64)
+        # AR(1) with unit variance: neighbouring readings get similar offsets
+        shocks = rng.normal(0.0, np.sqrt(1 - 0.9 ** 2), n_rows)
+        shocks[0] = rng.normal()
+        drift = lfilter([1.0], [1.0, -0.9], shocks)
+        frame[name] = np.round(values[index] + drift * 0.1 * values.std(), 2)
+    frame['WIND_DIRECTION'] = np.round(frame['WIND_DIRECTION']).astype(np.int64) % 360
+    frame['RAIN'] = df['RAIN'].to_numpy()[index]
+    return frame
+
+
+def write_synthetic_csv(path, n_rows, seed=0):
+    """synthetic_weather() saved like data/raindata.csv"""
+    synthetic_weather(n_rows, seed).to_csv(path, sep=';', index=False)
+    return path
+
+
+def time_calls(fn, repeat):
+    """Run fn repeat times and return per-call latencies in seconds"""
+    latencies = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies[i] = time.perf_counter() - start
+    return latencies
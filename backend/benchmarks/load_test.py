@@ -0,0 +1,119 @@
+"""
+HTTP load test: requests/sec and latency percentiles for a running server.
+
+Start the server(s) first, e.g.
+
+    gunicorn -k gthread --threads 16 -b :5000 app:app
+    uvicorn asgi:application --port 5001
+
+then compare them:
+
+    python benchmarks/load_test.py --url http://localhost:5000 --url http://localhost:5001
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from common import REQUEST_FIELDS, sample_readings
+
+# name -> (method, path, body factory)
+SCENARIOS = {
+    'predict': ('POST', '/api/predict', 'reading'),
+    'batch': ('POST', '/api/predict/batch', 'batch'),
+    'history': ('GET', '/api/weather/history?limit=500', None),
+    'current': ('GET', '/api/weather/current', None),
+    'analytics': ('GET', '/api/analytics/summary', None),
+    'pitstop': ('POST', '/api/strategy/pitstop', 'pitstop'),
+}
+
+
+def request_bodies(kind, count, batch_size):
+    """Pre-encoded request bodies so the client spends its time on I/O"""
+    if kind is None:
+        return [None]
+    readings = [{REQUEST_FIELDS[k]: v for k, v in r.items()} for r in sample_readings(count)]
+    if kind == 'reading':
+        return [json.dumps(r).encode() for r in readings]
+    if kind == 'batch':
+        return [json.dumps({'readings': readings[:batch_size]}).encode()]
+    return [json.dumps({'rain_probability': (i % 100) / 100, 'current_lap': 1 + i % 50,
+                        'total_laps': 50, 'current_tire': 'soft'}).encode() for i in range(count)]
+
+
+def worker(url, method, path, bodies, deadline, latencies, errors):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    headers = {'Content-Type': 'application/json'}
+    i = 0
+    while time.perf_counter() < deadline:
+        body = bodies[i % len(bodies)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+            ok = False
+        latencies.append(time.perf_counter() - start)
+        if not ok:
+            errors.append(1)
+    connection.close()
+
+
+def run(url, scenario, concurrency, duration, batch_size):
+    method, path, kind = SCENARIOS[scenario]
+    bodies = request_bodies(kind, 256, batch_size)
+    # Warm up (model plan, dataset, connection setup) outside the measurement
+    worker(url, method, path, bodies, time.perf_counter() + 0.5, [], [])
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=worker, args=(url, method, path, bodies, deadline, latencies, errors))
+               for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    millis = np.asarray(latencies) * 1000
+    p50, p90, p99 = np.percentile(millis, [50, 90, 99]) if len(millis) else (np.nan,) * 3
+    return {'requests': len(latencies), 'errors': len(errors), 'rps': len(latencies) / elapsed,
+            'p50': p50, 'p90': p90, 'p99': p99, 'max': millis.max() if len(millis) else np.nan}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', action='append', required=True, help='server base URL (repeatable)')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='endpoint mix to run (repeatable, default: all)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per scenario')
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'server':<28} {'scenario':<10} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+    for scenario in args.scenario or list(SCENARIOS):
+        for url in args.url:
+            result = run(url, scenario, args.concurrency, args.duration, args.batch_size)
+            failed |= result['errors'] > 0
+            print(f"{url:<28} {scenario:<10} {result['rps']:9.1f} {result['p50']:8.2f} {result['p90']:8.2f} "
+                  f"{result['p99']:8.2f} {result['max']:8.2f} {result['errors']:7d}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
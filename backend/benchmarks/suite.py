@@ -0,0 +1,270 @@
+"""
+Benchmark suite: model inference, pit strategy, every Flask route and
+training, on synthetic weather scaled from data/raindata.csv. Each case
+reports its median (and p99) seconds per call. Results can be saved as
+JSON and are compared with a stored baseline: a case slower than its
+baseline by more than --tolerance fails the run.
+
+    python benchmarks/suite.py                        # run, compare with baseline.json
+    python benchmarks/suite.py --quick --json out.json
+    python benchmarks/suite.py --update-baseline      # accept this run as the baseline
+
+Baselines are only comparable on the same machine; record one per machine.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from common import (BACKEND_DIR, REQUEST_FIELDS, load_model, sample_readings, time_calls,
+                    write_synthetic_csv)
+from model import RainPredictionModel
+from strategy import calculate_pitstop_strategy
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_TOLERANCE = 0.5
+# Differences below this are timer noise, whatever the ratio
+MIN_DELTA_SECONDS = 50e-6
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+TRAIN_SIZES = [1000, 10000, 50000]
+QUICK_BATCH_SIZES = [1, 100, 10000]
+QUICK_TRAIN_SIZES = [1000, 5000]
+TIRES = ['soft', 'medium', 'hard', 'intermediate', 'wet']
+
+
+def stats(latencies, rows=None):
+    result = {
+        'seconds': float(np.median(latencies)),
+        'p99': float(np.percentile(latencies, 99)),
+        'calls': len(latencies),
+    }
+    if rows is not None:
+        result['rows'] = rows
+        result['rows_per_second'] = rows / result['seconds']
+    return result
+
+
+def measure(fn, repeat, rows=None):
+    """Warm up once, then time repeat calls of fn"""
+    fn()
+    return stats(time_calls(fn, repeat), rows)
+
+
+def cycle(items):
+    """Callable returning the next item on each call, round and round"""
+    state = {'i': -1}
+
+    def following():
+        state['i'] = (state['i'] + 1) % len(items)
+        return items[state['i']]
+    return following
+
+
+def bench_predict(quick):
+    rain_model = load_model()
+    readings = sample_readings(1000)
+    reading = cycle(readings)
+    yield 'predict/single', measure(lambda: rain_model.predict(reading()), 300 if quick else 1000, rows=1)
+
+    for size in QUICK_BATCH_SIZES if quick else BATCH_SIZES:
+        batch = sample_readings(size, seed=size)
+        repeat = max(3, min(200, 20000 // size)) // (2 if quick else 1)
+        yield f'predict_batch/{size}', measure(lambda: rain_model.predict_batch(batch), max(repeat, 3), rows=size)
+
+
+def bench_strategy(quick):
+    rng = np.random.default_rng(0)
+    cases = [(float(rng.random()), int(rng.integers(1, 50)), 50, TIRES[i % len(TIRES)],
+              float(rng.uniform(40, 95)), float(rng.uniform(0, 30))) for i in range(500)]
+    case = cycle(cases)
+    yield 'strategy/calculate_pitstop_strategy', measure(lambda: calculate_pitstop_strategy(*case()),
+                                                          200 if quick else 1000)
+
+
+def route_requests():
+    """name -> (method, path, list of JSON bodies or None)"""
+    readings = [{REQUEST_FIELDS[k]: v for k, v in r.items()} for r in sample_readings(256)]
+    pitstops = [{'rain_probability': (i % 100) / 100, 'current_lap': 1 + i % 49, 'total_laps': 50,
+                 'current_tire': TIRES[i % len(TIRES)], 'weather_data': {'humidity': 60 + i % 30}}
+                for i in range(256)]
+    cars = [{'car': i + 1, 'current_tire': TIRES[i % 3], 'tire_age': i % 20} for i in range(20)]
+    return {
+        'root': ('GET', '/', None),
+        'health': ('GET', '/api/health', None),
+        'predict': ('POST', '/api/predict', readings),
+        'predict_batch': ('POST', '/api/predict/batch', [{'readings': readings[:100]}]),
+        'predict_approx': ('GET', '/api/predict/approx?humidity=65&pressure=992&air_temp=28.5'
+                                  '&track_temp=35.2&wind_speed=12.5', None),
+        'weather_current': ('GET', '/api/weather/current', None),
+        'weather_history': ('GET', '/api/weather/history?limit=500', None),
+        'analytics_summary': ('GET', '/api/analytics/summary', None),
+        'strategy_pitstop': ('POST', '/api/strategy/pitstop', pitstops),
+        'strategy_pitstop_batch': ('POST', '/api/strategy/pitstop/batch',
+                                   [{'current_lap': 20, 'total_laps': 56, 'cars': cars}]),
+        'strategy_optimal': ('POST', '/api/strategy/optimal',
+                             [dict(body, tire_age=5) for body in pitstops]),
+        'strategy_simulate': ('POST', '/api/strategy/simulate',
+                              [dict(body, scenarios=2000, seed=0) for body in pitstops[:16]]),
+        'metrics': ('GET', '/api/metrics', None),
+    }
+
+
+def bench_routes(quick):
+    # The app resolves model_data and ../data relative to backend/
+    os.chdir(BACKEND_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+    client = app.test_client()
+
+    for name, (method, path, bodies) in route_requests().items():
+        body = cycle(bodies or [None])
+
+        def call():
+            response = client.open(path, method=method, json=body())
+            if response.status_code != 200:
+                raise RuntimeError(f'{method} {path}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}')
+        yield f'route/{name}', measure(call, 50 if quick else 200)
+
+
+def bench_training(quick):
+    with tempfile.TemporaryDirectory() as directory:
+        for size in QUICK_TRAIN_SIZES if quick else TRAIN_SIZES:
+            csv_path = write_synthetic_csv(os.path.join(directory, f'weather-{size}.csv'), size, seed=size)
+
+            def train():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    RainPredictionModel().train(csv_path)
+            # One timed fit per size; the first also builds the column cache
+            train()
+            yield f'train/{size}', stats(time_calls(train, 1), rows=size)
+
+
+GROUPS = {
+    'predict': bench_predict,
+    'strategy': bench_strategy,
+    'routes': bench_routes,
+    'training': bench_training,
+}
+
+
+def environment(quick):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'created_at': datetime.now().isoformat(),
+        'commit': commit,
+        'quick': quick,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Rows of (case, seconds, baseline seconds or None, ratio or None, regressed)"""
+    rows = []
+    for case, result in results.items():
+        previous = baseline.get(case)
+        if previous is None:
+            rows.append((case, result['seconds'], None, None, False))
+            continue
+        ratio = result['seconds'] / previous['seconds']
+        regressed = (ratio > 1 + tolerance
+                     and result['seconds'] - previous['seconds'] > MIN_DELTA_SECONDS)
+        rows.append((case, result['seconds'], previous['seconds'], ratio, regressed))
+    return rows
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.1f} us'
+    if seconds < 1:
+        return f'{seconds * 1e3:.2f} ms'
+    return f'{seconds:.2f} s'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--group', action='append', choices=sorted(GROUPS),
+                        help='benchmark group to run (repeatable, default: all)')
+    parser.add_argument('--quick', action='store_true', help='fewer sizes and repeats')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='store these results as the baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown as a fraction of the baseline (default 0.5)')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for group in args.group or list(GROUPS):
+        started = time.perf_counter()
+        for case, result in GROUPS[group](args.quick):
+            results[case] = result
+            print(f"  {case:<40} {format_seconds(result['seconds']):>10}")
+        print(f"✓ {group} ({time.perf_counter() - started:.1f}s)")
+
+    report = {'environment': environment(args.quick), 'results': results}
+    if args.json:
+        with open(args.json, 'w') as stream:
+            json.dump(report, stream, indent=2)
+        print(f"✓ Results written to {args.json}")
+
+    if args.update_baseline:
+        baseline = {'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as stream:
+                baseline = json.load(stream)
+        # Groups not run this time keep their stored numbers
+        report['results'] = dict(baseline.get('results', {}), **results)
+        with open(args.baseline, 'w') as stream:
+            json.dump(report, stream, indent=2)
+        print(f"✓ Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠ No baseline at {args.baseline}; run with --update-baseline to record one")
+        return 0
+    with open(args.baseline) as stream:
+        baseline = json.load(stream)
+    stored = baseline.get('environment', {})
+    if (stored.get('machine'), stored.get('cpus')) != (report['environment']['machine'], report['environment']['cpus']):
+        print(f"⚠ Baseline was recorded on {stored.get('machine')} with {stored.get('cpus')} CPUs; "
+              f"timings may not be comparable")
+
+    rows = compare(results, baseline.get('results', {}), args.tolerance)
+    print(f"\n{'case':<40} {'now':>10} {'baseline':>10} {'change':>8}")
+    for case, seconds, previous, ratio, regressed in rows:
+        change = '-' if ratio is None else f'{(ratio - 1) * 100:+.0f}%'
+        print(f"{case:<40} {format_seconds(seconds):>10} {format_seconds(previous):>10} {change:>8}"
+              f"{'  REGRESSION' if regressed else ''}")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"\n⚠ {len(regressions)} case(s) more than {args.tolerance:.0%} slower than the baseline")
+        return 1
+    print(f"\n✓ No case more than {args.tolerance:.0%} slower than the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
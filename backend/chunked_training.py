@@ -0,0 +1,144 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+import column_cache
+from model import ROLLING_WINDOW
+
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_SAMPLE_SIZE = 500000
+# Columns read from the archive; the rest (timestamps, strings) are skipped
+RAW_COLUMNS = ['AIR_TEMP', 'TRACK_TEMP', 'HUMIDITY', 'PRESSURE', 'WIND_SPEED', 'WIND_DIRECTION', 'RAIN']
+# Rows carried into the next chunk: the rolling window's history, and one row for the diffs
+CARRY_ROWS = max(ROLLING_WINDOW - 1, 1)
+
+
+class FeatureStream:
+    """
+    engineer_features() over a semicolon CSV read in chunks. The last
+    CARRY_ROWS raw rows of each chunk are prepended to the next, so the
+    rolling and change features come out as if the whole file had been
+    engineered at once. Iterating yields one engineered DataFrame per chunk.
+    Chunks are sliced from the memory-mapped column cache when it is fresh.
+    """
+
+    def __init__(self, rain_model, csv_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.rain_model = rain_model
+        self.csv_path = csv_path
+        self.chunk_size = chunk_size
+        self.rows = 0
+
+    def chunks(self):
+        cached = column_cache.load(self.csv_path)
+        if cached is None:
+            yield from pd.read_csv(self.csv_path, sep=';', usecols=RAW_COLUMNS, chunksize=self.chunk_size)
+            return
+        columns = cached[0]
+        for start in range(0, cached[1]['rows'], self.chunk_size):
+            yield pd.DataFrame({name: columns[name][start:start + self.chunk_size] for name in RAW_COLUMNS})
+
+    def __iter__(self):
+        self.rows = 0
+        tail = None
+        for chunk in self.chunks():
+            carried = 0 if tail is None else len(tail)
+            frame = chunk if tail is None else pd.concat([tail, chunk], ignore_index=True)
+            tail = frame.iloc[-CARRY_ROWS:]
+            self.rows += len(chunk)
+            yield self.rain_model.engineer_features(frame).iloc[carried:]
+
+
+class Reservoir:
+    """Uniform sample of at most `capacity` rows from a stream (Algorithm R, a chunk at a time)"""
+
+    def __init__(self, capacity, width, seed=0):
+        self.capacity = capacity
+        self.rows = np.empty((capacity, width))
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, rows):
+        count = len(rows)
+        filled = min(max(self.capacity - self.seen, 0), count)
+        self.rows[self.seen:self.seen + filled] = rows[:filled]
+        if filled < count:
+            # Row number i replaces a random slot with probability capacity / (i + 1)
+            slots = self.rng.integers(0, np.arange(self.seen + filled, self.seen + count) + 1)
+            keep = slots < self.capacity
+            slots, rows = slots[keep], rows[filled:][keep]
+            # Within a chunk the later of two rows drawn for one slot wins
+            last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]
+            self.rows[slots[last]] = rows[last]
+        self.seen += count
+
+    def sample(self):
+        return self.rows[:min(self.seen, self.capacity)]
+
+
+def sample_training_set(rain_model, csv_path, sample_size=DEFAULT_SAMPLE_SIZE,
+                        chunk_size=DEFAULT_CHUNK_SIZE, seed=0):
+    """
+    Features and labels for a uniform sample of at most sample_size rows,
+    in one pass and bounded memory. Missing values are filled with the
+    column means over the whole archive, as load_and_prepare_data does.
+    Returns (X, y, rows_seen); X and y are indexed by CSV row number.
+    """
+    columns = list(rain_model.feature_columns)
+    reservoir = Reservoir(sample_size, len(columns) + 2, seed)
+    totals = np.zeros(len(columns))
+    counts = np.zeros(len(columns))
+
+    stream = FeatureStream(rain_model, csv_path, chunk_size)
+    for frame in stream:
+        values = frame[columns].to_numpy(dtype=np.float64)
+        totals += np.nansum(values, axis=0)
+        counts += np.sum(~np.isnan(values), axis=0)
+        labelled = frame['RAIN'].notna().to_numpy()
+        row_numbers = np.arange(stream.rows - len(frame), stream.rows, dtype=np.float64)
+        reservoir.add(np.column_stack([row_numbers, values, frame['RAIN'].to_numpy(dtype=np.float64)])[labelled])
+
+    sample = reservoir.sample()
+    index = sample[:, 0].astype(np.int64)
+    X = pd.DataFrame(sample[:, 1:-1], columns=columns, index=index)
+    X = X.fillna(pd.Series(totals / np.maximum(counts, 1), index=columns))
+    y = pd.Series(sample[:, -1].astype(np.int64), name='RAIN', index=index)
+    return X, y, stream.rows
+
+
+def _row_values(columns, name, positions):
+    """columns[name] at positions as float64, NaN where a position is before the first row"""
+    values = np.asarray(columns[name])[np.maximum(positions, 0)].astype(np.float64)
+    return np.where(positions >= 0, values, np.nan)
+
+
+def _check_rows(columns, rows):
+    rows = np.asarray(rows, dtype=np.int64)
+    if len(rows) and (rows.min() < 0 or rows.max() >= len(columns['RAIN'])):
+        raise ValueError('Row numbers outside the CSV')
+    return rows
+
+
+def engineer_rows(rain_model, csv_path, rows):
+    """
+    engineer_features() at the given CSV row numbers, as if the whole file
+    had been engineered: each row is engineered after the CARRY_ROWS rows
+    before it, the same history FeatureStream carries between chunks.
+    """
+    columns = column_cache.read_columns(csv_path)
+    rows = _check_rows(columns, rows)
+    width = CARRY_ROWS + 1
+    positions = (rows[:, None] + np.arange(-CARRY_ROWS, 1)).ravel()
+    # Missing history (before row 0) is NaN, which the rolling and change features skip like a file start
+    frame = pd.DataFrame({name: _row_values(columns, name, positions) for name in RAW_COLUMNS})
+    return rain_model.engineer_features(frame).iloc[CARRY_ROWS::width].reset_index(drop=True)
+
+
+def rows_sha256(csv_path, rows):
+    """SHA-256 of the raw RAW_COLUMNS values at the given CSV row numbers"""
+    columns = column_cache.read_columns(csv_path)
+    rows = _check_rows(columns, rows)
+    digest = hashlib.sha256()
+    for name in RAW_COLUMNS:
+        digest.update(np.ascontiguousarray(np.asarray(columns[name])[rows], dtype=np.float64).tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,159 @@
+"""
+Typed columnar copy of a semicolon CSV: one .npy file per column plus a
+schema.json, in a `<csv>.columns/` directory next to the CSV. The schema
+records the source's size, mtime and SHA-256, so a stale copy is detected
+and rebuilt from the CSV.
+
+    python column_cache.py ../data/raindata.csv
+"""
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+CACHE_SUFFIX = '.columns'
+SCHEMA_FILE = 'schema.json'
+FORMAT_VERSION = 1
+
+
+def cache_dir(csv_path):
+    return csv_path + CACHE_SUFFIX
+
+
+def _columns(frame):
+    """Column name -> NumPy array; text becomes fixed-width unicode so it can be memory-mapped"""
+    columns = {}
+    for name in frame.columns:
+        values = frame[name].to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        columns[name] = values
+    return columns
+
+
+def write(csv_path, frame, data, stat, sep=';'):
+    """
+    Store the parsed frame of data (the CSV's bytes at stat). Column files
+    are named by content hash and the schema is replaced last, so readers
+    see either the old copy or the new one.
+    """
+    directory = cache_dir(csv_path)
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256(data).hexdigest()
+
+    files = []
+    for index, (name, values) in enumerate(_columns(frame).items()):
+        filename = f'{index:02d}-{digest[:16]}.npy'
+        handle, temporary = tempfile.mkstemp(dir=directory, prefix='.column-')
+        with os.fdopen(handle, 'wb') as stream:
+            np.save(stream, values)
+        os.replace(temporary, os.path.join(directory, filename))
+        files.append({'name': name, 'dtype': values.dtype.str, 'file': filename})
+
+    schema = {
+        'format': FORMAT_VERSION,
+        'source': os.path.basename(csv_path),
+        'sep': sep,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': digest,
+        # Bytes up to the last complete line
+        'consumed': data.rfind(b'\n') + 1,
+        'rows': len(frame),
+        'columns': files,
+        'created_at': datetime.now().isoformat(),
+    }
+    handle, temporary = tempfile.mkstemp(dir=directory, prefix='.schema-')
+    with os.fdopen(handle, 'w') as stream:
+        json.dump(schema, stream, indent=2)
+    os.replace(temporary, os.path.join(directory, SCHEMA_FILE))
+
+    # Column files of earlier versions
+    current = {column['file'] for column in files}
+    for filename in os.listdir(directory):
+        if filename.endswith('.npy') and filename not in current:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except OSError:
+                pass
+    return schema
+
+
+def build(csv_path, sep=';'):
+    """Parse the CSV and (re)write its cache; returns (columns, schema)"""
+    stat = os.stat(csv_path)
+    with open(csv_path, 'rb') as handle:
+        data = handle.read()
+    frame = pd.read_csv(io.BytesIO(data), sep=sep)
+    schema = write(csv_path, frame, data, stat, sep)
+    return _columns(frame), schema
+
+
+def _fresh(csv_path, schema):
+    """True if the CSV still has the content the schema was built from"""
+    stat = os.stat(csv_path)
+    if (stat.st_size, stat.st_mtime_ns) == (schema['size'], schema['mtime_ns']):
+        return True
+    if stat.st_size != schema['size']:
+        return False
+    # Same size, new mtime (touched or copied): compare content
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest() == schema['sha256']
+
+
+def load(csv_path, sep=';', mmap=True):
+    """(columns, schema) from a fresh cache, memory-mapped by default; None if missing or stale"""
+    directory = cache_dir(csv_path)
+    try:
+        with open(os.path.join(directory, SCHEMA_FILE)) as stream:
+            schema = json.load(stream)
+        if schema.get('format') != FORMAT_VERSION or schema.get('sep') != sep or not _fresh(csv_path, schema):
+            return None
+        columns = {column['name']: np.load(os.path.join(directory, column['file']),
+                                           mmap_mode='r' if mmap else None)
+                   for column in schema['columns']}
+    except (OSError, ValueError, KeyError):
+        return None
+    if any(len(values) != schema['rows'] for values in columns.values()):
+        return None
+    return columns, schema
+
+
+def read_columns(csv_path, sep=';', mmap=True):
+    """Columns of the CSV from the cache, rebuilding it first if it is stale"""
+    cached = load(csv_path, sep, mmap)
+    if cached is not None:
+        return cached[0]
+    try:
+        return build(csv_path, sep)[0]
+    except OSError as e:
+        # Read-only data directory: still serve the CSV
+        print(f"⚠ Could not write column cache for {csv_path}: {e}")
+        return _columns(pd.read_csv(csv_path, sep=sep))
+
+
+def read_frame(csv_path, sep=';', columns=None):
+    """The CSV as a DataFrame, like pd.read_csv(csv_path, sep=sep)[columns]"""
+    data = read_columns(csv_path, sep)
+    names = list(data) if columns is None else list(columns)
+    return pd.DataFrame({name: data[name] for name in names}, copy=False)
+
+
+def main(argv=None):
+    paths = (argv if argv is not None else sys.argv[1:]) or [os.path.join('..', 'data', 'raindata.csv')]
+    for csv_path in paths:
+        columns, schema = build(csv_path)
+        print(f"✓ {csv_path}: {schema['rows']} rows, {len(columns)} columns -> {cache_dir(csv_path)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+import io
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import column_cache
+
+# Typed columns of data/raindata.csv; anything else is kept as object
+COLUMN_DTYPES = {
+    'TIME_UTC_SECONDS': np.int64,
+    'TIME_UTC_STR': object,
+    'AIR_TEMP': np.float64,
+    'TRACK_TEMP': np.float64,
+    'HUMIDITY': np.float64,
+    'PRESSURE': np.float64,
+    'WIND_SPEED': np.float64,
+    'WIND_DIRECTION': np.float64,
+    'RAIN': np.int64,
+}
+
+# Bytes before the consumed offset that must be unchanged for an append
+FINGERPRINT_BYTES = 256
+
+
+class DatasetSnapshot:
+    """Immutable view of the dataset at one version"""
+
+    def __init__(self, columns, length, version):
+        self.columns = columns
+        self.length = length
+        self.version = version
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+
+class WeatherDataStore:
+    """
+    Process-wide columnar copy of the weather CSV.
+    The file is parsed once into typed NumPy arrays; refresh() stats it and
+    parses only the appended rows when it grows, falling back to a full
+    reload when it was rewritten. Full reloads come from the column cache
+    (column_cache.py) when it matches the file, and refresh it when not.
+    A full reload takes a final line without newline as a row, like
+    read_csv; appends wait for complete lines, since a row at the end of a
+    growing file may still be being written.
+    Readers get lock-free snapshots whose arrays are never modified after
+    publication.
+    """
+
+    def __init__(self, csv_path, sep=';'):
+        self.csv_path = csv_path
+        self.sep = sep
+        self.reloads = 0
+        self.appends = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._buffers = {}
+        self._capacity = 0
+        self._header = None
+        self._offset = 0
+        self._fingerprint = b''
+        # The snapshot ends with a row that had no newline yet
+        self._partial_tail = False
+        self._stat = None
+        self._snapshot = DatasetSnapshot({}, 0, 0)
+
+    def add_listener(self, callback):
+        """Call callback(snapshot, first_new_row, reloaded) after every change"""
+        self._listeners.append(callback)
+
+    def snapshot(self):
+        """Return the current data, picking up file changes first"""
+        self.refresh()
+        return self._snapshot
+
+    def refresh(self):
+        """Sync with the file; return True if the data changed"""
+        try:
+            stat = os.stat(self.csv_path)
+        except FileNotFoundError:
+            return False
+        if self._stat == (stat.st_size, stat.st_mtime_ns):
+            return False
+
+        with self._lock:
+            stat = os.stat(self.csv_path)
+            if self._stat == (stat.st_size, stat.st_mtime_ns):
+                return False
+
+            with open(self.csv_path, 'rb') as handle:
+                grew = self._stat is not None and stat.st_size > self._stat[0]
+                # A row without newline may be completed by the new bytes: reload it whole
+                if self._header is not None and grew and not self._partial_tail and self._unchanged(handle):
+                    handle.seek(self._offset)
+                    first_new_row = self._snapshot.length
+                    changed = self._append(handle.read())
+                    reloaded = False
+                else:
+                    first_new_row = 0
+                    changed = self._reload_cached(handle, stat) or self._reload(handle.read(), stat)
+                    reloaded = True
+            self._stat = (stat.st_size, stat.st_mtime_ns)
+
+            # Under the lock so listeners see changes in order
+            if changed:
+                for callback in self._listeners:
+                    callback(self._snapshot, first_new_row, reloaded)
+        return changed
+
+    def _unchanged(self, handle):
+        start = max(0, self._offset - len(self._fingerprint))
+        handle.seek(start)
+        return handle.read(self._offset - start) == self._fingerprint
+
+    def _remember_offset(self, data, consumed, base):
+        self._offset = base + consumed
+        self._fingerprint = data[max(0, consumed - FINGERPRINT_BYTES):consumed]
+
+    def _typed(self, columns):
+        """Store dtypes for a mapping of column arrays (a DataFrame or the column cache)"""
+        parsed = {}
+        for name in self._header:
+            dtype = COLUMN_DTYPES.get(name, object)
+            values = np.asarray(columns[name])
+            if dtype is np.int64 and values.dtype.kind == 'f':
+                values = np.nan_to_num(values, nan=0.0)
+            parsed[name] = values.astype(dtype)
+        return parsed
+
+    def _frame(self, data):
+        return pd.read_csv(io.BytesIO(data), sep=self.sep, header=None, names=self._header)
+
+    def _parse(self, data):
+        return self._typed(self._frame(data))
+
+    def _reload_cached(self, handle, stat):
+        """Full reload from a column cache built from exactly this file"""
+        cached = column_cache.load(self.csv_path, self.sep)
+        if cached is None:
+            return False
+        columns, schema = cached
+        self._header = [column['name'] for column in schema['columns']]
+        self._install(self._typed(columns), schema['rows'])
+
+        start = max(0, schema['consumed'] - FINGERPRINT_BYTES)
+        handle.seek(start)
+        data = handle.read()
+        self._remember_offset(data, schema['consumed'] - start, start)
+        self._partial_tail = bool(data[schema['consumed'] - start:].strip())
+        self.reloads += 1
+        self._publish(schema['rows'])
+        return True
+
+    def _reload(self, data, stat=None):
+        header_end = data.find(b'\n') + 1
+        if header_end == 0:
+            return False
+        self._header = data[:header_end].decode().strip().split(self.sep)
+
+        body_end = data.rfind(b'\n') + 1
+        self._partial_tail = bool(data[max(body_end, header_end):].strip())
+        if body_end > header_end or self._partial_tail:
+            frame = self._frame(data[header_end:])
+            parsed = self._typed(frame)
+            if stat is not None:
+                try:
+                    column_cache.write(self.csv_path, frame, data, stat, self.sep)
+                except OSError as e:
+                    print(f"⚠ Could not write column cache: {e}")
+        else:
+            parsed = {name: np.empty(0, dtype=COLUMN_DTYPES.get(name, object)) for name in self._header}
+        length = len(parsed[self._header[0]])
+
+        self._install(parsed, length)
+        self._remember_offset(data, body_end, 0)
+        self.reloads += 1
+        self._publish(length)
+        return True
+
+    def _install(self, parsed, length):
+        self._capacity = max(length * 2, 1024)
+        self._buffers = {}
+        for name, values in parsed.items():
+            buffer = np.empty(self._capacity, dtype=values.dtype)
+            buffer[:length] = values
+            self._buffers[name] = buffer
+
+    def _append(self, data):
+        # Only complete lines; a row still being written is picked up next time
+        body_end = data.rfind(b'\n') + 1
+        if body_end == 0:
+            return False
+        parsed = self._parse(data[:body_end])
+        start = self._snapshot.length
+        length = start + len(parsed[self._header[0]])
+
+        if length > self._capacity:
+            # New buffers, so arrays held by earlier snapshots stay untouched
+            self._capacity = max(length, self._capacity * 2)
+            for name, old in self._buffers.items():
+                buffer = np.empty(self._capacity, dtype=old.dtype)
+                buffer[:start] = old[:start]
+                self._buffers[name] = buffer
+        for name, values in parsed.items():
+            self._buffers[name][start:length] = values
+
+        base = self._offset
+        self._remember_offset(self._fingerprint + data, len(self._fingerprint) + body_end,
+                              base - len(self._fingerprint))
+        self.appends += 1
+        self._publish(length)
+        return True
+
+    def _publish(self, length):
+        columns = {name: buffer[:length] for name, buffer in self._buffers.items()}
+        for values in columns.values():
+            values.flags.writeable = False
+        self._snapshot = DatasetSnapshot(columns, length, self._snapshot.version + 1)
@@ -0,0 +1,138 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from model import CHANGE_SOURCES, ROLLING_SOURCES, ROLLING_WINDOW
+
+DEFAULT_MAX_SESSIONS = 1024
+# A session idle for longer starts a fresh window (its trend is stale)
+DEFAULT_SESSION_TTL = 3600.0
+
+
+def _number(value):
+    return math.nan if value is None else float(value)
+
+
+class SessionWindow:
+    """
+    The last `window` readings of one session in a ring buffer, with
+    running sums for the rolling means and the previous reading for the
+    changes, so each new reading costs O(1). Same semantics as
+    engineer_features(): NaN readings are skipped by the means and turn
+    the changes into 0.
+    """
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+        self.rolling = list(ROLLING_SOURCES.items())
+        self.changes = list(CHANGE_SOURCES.items())
+        self.ring = [[math.nan] * len(self.rolling) for _ in range(window)]
+        self.sums = [0.0] * len(self.rolling)
+        self.counts = [0] * len(self.rolling)
+        self.previous = [math.nan] * len(self.changes)
+        self.position = 0
+        self.readings = 0
+        self.updated = time.monotonic()
+
+    def update(self, reading):
+        """Add a reading (model input columns); returns its trend features"""
+        features = {}
+        slot = self.ring[self.position]
+        for i, (name, source) in enumerate(self.rolling):
+            old, new = slot[i], _number(reading.get(source))
+            if old == old:
+                self.sums[i] -= old
+                self.counts[i] -= 1
+            if new == new:
+                self.sums[i] += new
+                self.counts[i] += 1
+            slot[i] = new
+            features[name] = self.sums[i] / self.counts[i] if self.counts[i] else math.nan
+
+        self.position = (self.position + 1) % self.window
+        if self.position == 0:
+            # Once per lap of the ring, drop the rounding the running sums picked up
+            for i in range(len(self.rolling)):
+                kept = [row[i] for row in self.ring if row[i] == row[i]]
+                self.sums[i], self.counts[i] = math.fsum(kept), len(kept)
+
+        for i, (name, source) in enumerate(self.changes):
+            new = _number(reading.get(source))
+            change = new - self.previous[i]
+            features[name] = change if change == change else 0.0
+            self.previous[i] = new
+
+        self.readings += 1
+        self.updated = time.monotonic()
+        return features
+
+
+class SessionFeatureStore:
+    """Trend windows per session id (e.g. one per car or client), LRU-bounded"""
+
+    def __init__(self, window=ROLLING_WINDOW, max_sessions=DEFAULT_MAX_SESSIONS, ttl=DEFAULT_SESSION_TTL):
+        self.window = window
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.expired = 0
+        self.evicted = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, session_id, reading):
+        """Add a reading to the session; returns (trend features, readings in the session)"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.updated > self.ttl:
+                session = None
+                self.expired += 1
+            if session is None:
+                session = self._sessions[session_id] = SessionWindow(self.window)
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            features = session.update(reading)
+            return features, session.readings
+
+    def drop(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def info(self):
+        return {
+            'sessions': len(self._sessions),
+            'max_sessions': self.max_sessions,
+            'window': self.window,
+            'ttl': self.ttl,
+            'expired': self.expired,
+            'evicted': self.evicted
+        }
+
+
+def dataset_trends(dataset, start, end, window=ROLLING_WINDOW):
+    """
+    Trend features of dataset rows [start, end), from those rows and the
+    window - 1 before them (as engineer_features() over the whole dataset)
+    """
+    first = max(0, start - (window - 1))
+    trends = {}
+    for name, source in ROLLING_SOURCES.items():
+        values = np.asarray(dataset[source][first:end], dtype=np.float64)
+        present = ~np.isnan(values)
+        sums = np.concatenate([[0.0], np.cumsum(np.where(present, values, 0.0))])
+        counts = np.concatenate([[0], np.cumsum(present)])
+        upper = np.arange(start - first, end - first) + 1
+        lower = np.maximum(upper - window, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            trends[name] = (sums[upper] - sums[lower]) / (counts[upper] - counts[lower])
+    for name, source in CHANGE_SOURCES.items():
+        values = np.asarray(dataset[source][max(0, start - 1):end], dtype=np.float64)
+        change = np.diff(values, prepend=np.nan) if start == 0 else np.diff(values)
+        trends[name] = np.nan_to_num(change, nan=0.0)
+    return trends
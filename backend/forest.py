@@ -0,0 +1,150 @@
+import json
+import os
+
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.utils.fixes import parse_version
+
+ARRAY_NAMES = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+
+# sklearn >= 1.4 stores class fractions in tree_.value and returns them as-is;
+# older releases store weighted counts and normalize inside predict_proba
+NORMALIZE_LEAVES = parse_version(sklearn.__version__) < parse_version('1.4')
+
+
+def _breadth_first_order(children_left, children_right):
+    """Old node ids in breadth-first order, with siblings adjacent"""
+    levels = []
+    frontier = np.array([0])
+    while frontier.size:
+        levels.append(frontier)
+        internal = frontier[children_left[frontier] != -1]
+        frontier = np.column_stack([children_left[internal], children_right[internal]]).ravel()
+    return np.concatenate(levels)
+
+
+class FlatForest:
+    """
+    A RandomForestClassifier flattened into contiguous NumPy arrays.
+    Every node of every tree lives at one global index; leaves point at
+    themselves so all trees can be walked in lock-step for a fixed depth.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes):
+        self.feature = feature          # int32, split feature per node (0 at leaves)
+        self.threshold = threshold      # float64, go left when x <= threshold (inf at leaves)
+        self.left = left                # int32, global index of left child (self at leaves)
+        self.right = right              # int32, global index of right child (left + 1, self at leaves)
+        self.value = value              # float64 (n_nodes, n_classes), class probabilities per node
+        self.roots = roots              # int32, global index of each tree's root
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAY_NAMES)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """
+        Flatten a fitted RandomForestClassifier.
+        Nodes are renumbered breadth-first so every right child sits at
+        left + 1, which lets apply() take one gather per level instead of two.
+        """
+        if not isinstance(forest, RandomForestClassifier):
+            raise TypeError(f"Cannot flatten {type(forest).__name__}; expected RandomForestClassifier")
+        if forest.n_outputs_ != 1:
+            raise TypeError("Only single-output forests can be flattened")
+
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        n_nodes = int(sizes.sum())
+
+        feature = np.zeros(n_nodes, dtype=np.int32)
+        threshold = np.full(n_nodes, np.inf)
+        left = np.empty(n_nodes, dtype=np.int32)
+        right = np.empty(n_nodes, dtype=np.int32)
+        value = np.empty((n_nodes, forest.n_classes_), dtype=np.float64)
+
+        for tree, offset, size in zip(trees, offsets, sizes):
+            order = _breadth_first_order(tree.children_left, tree.children_right)
+            new_id = np.empty(size, dtype=np.int64)
+            new_id[order] = np.arange(offset, offset + size)
+
+            is_leaf = tree.children_left[order] == -1
+            internal = order[~is_leaf]
+            nodes = slice(offset, offset + size)
+
+            # Leaves point at themselves and never branch (x > inf is False)
+            left[nodes] = new_id[order]
+            right[nodes] = new_id[order]
+            left[new_id[internal]] = new_id[tree.children_left[internal]]
+            right[new_id[internal]] = new_id[tree.children_right[internal]]
+            feature[new_id[internal]] = tree.feature[internal]
+            threshold[new_id[internal]] = tree.threshold[internal]
+
+            proba = tree.value[order, 0, :].astype(np.float64)
+            if NORMALIZE_LEAVES:
+                normalizer = proba.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                proba /= normalizer
+            value[nodes] = proba
+
+        max_depth = max(tree.max_depth for tree in trees)
+        return cls(feature, threshold, left, right, value,
+                   offsets.astype(np.int32), max_depth, forest.classes_)
+
+    def apply(self, X):
+        """Return the leaf index reached in every tree, shape (n_rows, n_trees)"""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat_x = X.ravel()
+        row_base = (np.arange(n_rows, dtype=np.int32) * n_features)[:, np.newaxis]
+
+        node = np.repeat(self.roots[np.newaxis, :], n_rows, axis=0)
+        for _ in range(self.max_depth):
+            x = flat_x.take(row_base + self.feature.take(node))
+            node = self.left.take(node) + (x > self.threshold.take(node))
+        return node
+
+    def predict_proba(self, X, chunk_size=512):
+        """
+        Class probabilities matching RandomForestClassifier.predict_proba.
+        Trees are summed in estimator order, as sklearn does when evaluating
+        serially, so the result is bit-for-bit identical.
+        """
+        X = np.asarray(X)
+        proba = np.empty((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), chunk_size):
+            leaves = self.apply(X[start:start + chunk_size])
+            # accumulate adds left to right, i.e. in tree order
+            proba[start:start + chunk_size] = np.add.accumulate(self.value.take(leaves, axis=0), axis=1)[:, -1]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def save(self, directory):
+        """Write the arrays as .npy files so they can be memory-mapped"""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'forest.json'), 'w') as handle:
+            json.dump({'max_depth': self.max_depth, 'classes': self.classes_.tolist()}, handle)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load arrays written by save(), read-only memory-mapped by default"""
+        with open(os.path.join(directory, 'forest.json')) as handle:
+            meta = json.load(handle)
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                  for name in ARRAY_NAMES}
+        return cls(max_depth=meta['max_depth'], classes=meta['classes'], **arrays)
@@ -0,0 +1,89 @@
+"""
+gunicorn settings for app.py:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+With preload_app the app (published model, scaler, flattened trees,
+probability grid, dataset snapshot) is imported once in the master and
+the workers are forked from it, so they share those pages copy-on-write
+instead of each loading its own copy. Two things would otherwise copy the
+pages back into every worker:
+
+- the cyclic garbage collector, which writes to the header of every
+  object it examines. The master disables it while loading and freezes
+  everything loaded into the permanent generation just before forking, so
+  workers' collections never visit those objects (gc.freeze()).
+- freed memory in the master, which workers reuse and dirty. Disabling
+  the collector while loading avoids the holes collections would punch.
+
+NumPy array data is not an object header, so refcounting never writes to
+it; memory-mapped artifact arrays (registry.load) are file-backed and stay
+shared even without preload. benchmarks/bench_worker_memory.py measures
+the memory per worker with and without this setup.
+
+Per-process state under several workers:
+
+- /api/metrics: each worker counts only its own requests. With more than
+  one worker, METRICS_MULTIPROC_DIR defaults to a directory for this
+  server that the workers write their values to and every scrape sums
+  (metrics.py). It is emptied at start and removed at exit.
+- session_id trend features (feature_store.py): a session's window lives
+  in the worker that served it. Consecutive readings of one session must
+  reach the same worker (sticky routing at the load balancer), or run a
+  single worker with more threads (WEB_CONCURRENCY=1), or the ASGI server.
+  Caches, the dataset store and the model reloader are per worker by
+  design: each one converges on the same files.
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))
+# Threads per worker; /api/stream holds one per connected client
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+preload_app = os.getenv('PRELOAD_APP', 'true').lower() == 'true'
+
+# Created (and removed) here unless METRICS_MULTIPROC_DIR was set by the caller
+_own_metrics_dir = workers > 1 and not os.getenv('METRICS_MULTIPROC_DIR')
+if _own_metrics_dir:
+    # Read by metrics.py when the app is imported (by the master with preload, else by each worker)
+    os.environ['METRICS_MULTIPROC_DIR'] = os.path.join(tempfile.gettempdir(), f'rain-pit-metrics-{os.getpid()}')
+
+if preload_app:
+    # Loaded after this file: no collections (and no freed holes) while the app loads
+    gc.disable()
+
+
+def on_starting(server):
+    directory = os.getenv('METRICS_MULTIPROC_DIR')
+    if directory:
+        # Counters start from zero with the server, not from a previous run's files
+        os.makedirs(directory, exist_ok=True)
+        for filename in os.listdir(directory):
+            if filename.endswith('.json'):
+                os.remove(os.path.join(directory, filename))
+    if workers > 1:
+        server.log.warning('session_id trend features need sticky routing with %d workers', workers)
+
+
+def on_exit(server):
+    if _own_metrics_dir:
+        shutil.rmtree(os.environ['METRICS_MULTIPROC_DIR'], ignore_errors=True)
+
+
+def worker_exit(server, worker):
+    import metrics
+    metrics.flush()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        gc.enable()
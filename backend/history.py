@@ -0,0 +1,137 @@
+import numpy as np
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 5000
+MAX_POINTS = 2000
+
+# Response field -> dataset column, in response order
+HISTORY_FIELDS = [
+    ('timestamp', 'TIME_UTC_STR'),
+    ('time_seconds', 'TIME_UTC_SECONDS'),
+    ('air_temp', 'AIR_TEMP'),
+    ('track_temp', 'TRACK_TEMP'),
+    ('humidity', 'HUMIDITY'),
+    ('pressure', 'PRESSURE'),
+    ('wind_speed', 'WIND_SPEED'),
+    ('wind_direction', 'WIND_DIRECTION'),
+    ('rain', 'RAIN'),
+]
+AVERAGED_FIELDS = {'air_temp', 'track_temp', 'humidity', 'pressure', 'wind_speed', 'wind_direction'}
+
+
+def parse_cursor(value):
+    """
+    (time, row) of a next_cursor string "<time>:<row>"; a bare time (the
+    old format) gives (time, None). Raises ValueError when malformed.
+    """
+    time, _, row = str(value).partition(':')
+    return int(time), (int(row) if row else None)
+
+
+def cursor_end(times, cursor):
+    """Row where a page before cursor ends (exclusive)"""
+    time, row = cursor
+    # Rows are stable while the file is only appended to; the time catches a rewrite
+    if row is not None and 0 <= row < len(times) and times[row] == time:
+        return row
+    return int(np.searchsorted(times, time, side='left'))
+
+
+def select_range(times, limit=None, since=None, until=None, cursor=None):
+    """
+    Return (start, end, next_cursor) for the newest `limit` readings with
+    since <= time <= until, before cursor (a (time, row) pair). times must
+    be ascending; next_cursor is the cursor for the page before this one.
+    It names the first row of this page, so readings sharing a timestamp
+    across a page boundary are neither repeated nor skipped.
+    """
+    lower = 0 if since is None else int(np.searchsorted(times, since, side='left'))
+    upper = len(times) if until is None else int(np.searchsorted(times, until, side='right'))
+    if cursor is not None:
+        upper = min(upper, cursor_end(times, cursor))
+    upper = max(upper, lower)
+
+    start = lower if limit is None else max(lower, upper - limit)
+    next_cursor = f'{int(times[start])}:{start}' if start > lower else None
+    return start, upper, next_cursor
+
+
+def downsample(columns, points):
+    """Average numeric fields over `points` equal-count buckets (rain: any)"""
+    n_rows = len(columns['time_seconds'])
+    if points is None or n_rows <= points:
+        return columns
+
+    edges = np.linspace(0, n_rows, points + 1).astype(np.int64)
+    starts = edges[:-1]
+    lasts = edges[1:] - 1
+    sizes = np.diff(edges)
+
+    sampled = {}
+    for field, values in columns.items():
+        if field in AVERAGED_FIELDS:
+            values = values.astype(np.float64)
+            present = ~np.isnan(values)
+            totals = np.add.reduceat(np.where(present, values, 0.0), starts)
+            counts = np.add.reduceat(present.astype(np.int64), starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                sampled[field] = totals / counts
+        elif field == 'rain':
+            sampled[field] = np.maximum.reduceat(values, starts)
+        else:
+            # Timestamps: label each bucket with its newest reading
+            sampled[field] = values[lasts]
+    sampled['bucket_size'] = sizes
+    return sampled
+
+
+def to_json_list(values):
+    """Convert a column to plain Python values, NaN becoming None"""
+    if values.dtype.kind == 'f' and np.isnan(values).any():
+        return [None if v != v else v for v in values.tolist()]
+    return values.tolist()
+
+
+def history_columns(dataset, start, end):
+    """Slice readings [start, end) into response-named columns"""
+    if not len(dataset):
+        return {field: np.empty(0) for field, _ in HISTORY_FIELDS}
+    return {field: np.asarray(dataset[column][start:end]) for field, column in HISTORY_FIELDS}
+
+
+def columns_to_rows(lists):
+    """Zip already converted column lists into one dict per reading"""
+    fields = list(lists)
+    return [dict(zip(fields, values)) for values in zip(*lists.values())]
+
+
+def build_history(dataset, limit=DEFAULT_LIMIT, since=None, until=None, cursor=None,
+                  points=None, columnar=False):
+    """
+    Build the /api/weather/history payload from a DatasetSnapshot.
+    Rows are selected with binary searches and converted column by column;
+    rows mode only zips the converted columns back together.
+    """
+    if points is not None:
+        points = max(1, min(int(points), MAX_POINTS))
+        # Output size is bounded by points, so the range may exceed MAX_LIMIT
+        limit = None if limit is None else max(0, int(limit))
+    else:
+        limit = max(0, min(DEFAULT_LIMIT if limit is None else int(limit), MAX_LIMIT))
+
+    times = dataset['TIME_UTC_SECONDS'] if len(dataset) else np.empty(0, dtype=np.int64)
+    start, end, next_cursor = select_range(times, limit, since, until, cursor)
+
+    columns = downsample(history_columns(dataset, start, end), points)
+    lists = {field: to_json_list(values) for field, values in columns.items()}
+    data = lists if columnar else columns_to_rows(lists)
+
+    return {
+        'success': True,
+        'format': 'columns' if columnar else 'rows',
+        'data': data,
+        'count': end - start,
+        'points': len(lists['time_seconds']),
+        'next_cursor': next_cursor,
+        'total_records': len(dataset)
+    }
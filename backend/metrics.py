@@ -0,0 +1,401 @@
+"""
+In-process request and model metrics, rendered in the Prometheus text
+format by /api/metrics.
+
+Requests are timed as a whole and by phase (JSON parse, feature build,
+scaler, forest, strategy, serialization). Each phase is a couple of
+perf_counter() calls reported to the RequestTimer of the current request
+(a context variable). Outside a request, phase reports are a no-op.
+Values owned by other components, such as cache statistics and dataset
+reloads, are read when /api/metrics is scraped. Nothing is added to the
+hot path for them.
+
+Under several worker processes (gunicorn) each worker only sees its own
+requests. With METRICS_MULTIPROC_DIR set, every worker writes its values
+to <dir>/<pid>-<start>.json every METRICS_FLUSH_SECONDS and on exit, and
+a scrape adds up the files of all workers, past ones included, so
+counters and histograms do not reset when a scrape lands on another
+worker or a worker is replaced. Gauges come from live workers only, one
+series per worker (a pid label).
+"""
+import atexit
+import bisect
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR') or None
+FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+
+_current = contextvars.ContextVar('request_timer', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def state(self):
+        with self._lock:
+            return {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+
+    def merge(self, processes):
+        """Bucket counts and sums of all processes' states ((pid, live, state) triples)"""
+        merged = {}
+        for _, _, state in processes:
+            for labels, (counts, total) in state.items():
+                if labels in merged:
+                    counts = [a + b for a, b in zip(merged[labels][0], counts)]
+                    total += merged[labels][1]
+                merged[labels] = (list(counts), total)
+        return merged, self.labels
+
+    def samples(self, series=None, names=None):
+        series = self.state() if series is None else series
+        names = self.labels if names is None else names
+        bucket_names = names + ('le',)
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f'{self.name}_bucket{_labels(bucket_names, labels + (le,))} {cumulative}'
+            yield f'{self.name}_sum{_labels(names, labels)} {total!r}'
+            yield f'{self.name}_count{_labels(names, labels)} {cumulative}'
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=(), lock=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = lock or threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def state(self):
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, processes):
+        return _sum(processes), self.labels
+
+    def samples(self, values=None, names=None):
+        values = self.state() if values is None else values
+        names = self.labels if names is None else names
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_labels(names, labels)} {_number(value)}'
+
+
+class Collected:
+    """Counter or gauge whose values are read from a callback at scrape time"""
+
+    def __init__(self, name, help, type, labels, collect):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def state(self):
+        return {labels: value for labels, value in self.collect().items() if value is not None}
+
+    def merge(self, processes):
+        if self.type == 'counter':
+            return _sum(processes), self.labels
+        # Gauges describe a process (its cache, its model): one series per live worker
+        values = {}
+        for pid, live, state in processes:
+            if live:
+                values.update({labels + (str(pid),): value for labels, value in state.items()})
+        return values, self.labels + ('pid',)
+
+    def samples(self, values=None, names=None):
+        values = self.state() if values is None else values
+        names = self.labels if names is None else names
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_labels(names, labels)} {_number(value)}'
+
+
+def _sum(processes):
+    total = {}
+    for _, _, state in processes:
+        for labels, value in state.items():
+            total[labels] = total.get(labels, 0) + value
+    return total
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def counter(self, name, help, labels=(), lock=None):
+        """Counters given the same lock can be updated together with one acquire"""
+        return self.register(Counter(name, help, labels, lock))
+
+    def collected(self, name, help, type='gauge', labels=(), collect=dict):
+        """collect() returns {label values tuple: value}"""
+        return self.register(Collected(name, help, type, labels, collect))
+
+    def snapshot(self):
+        """{metric name: state} of this process; metrics whose collector fails are left out"""
+        states = {}
+        for metric in self._metrics:
+            try:
+                states[metric.name] = metric.state()
+            except Exception:
+                pass
+        return states
+
+    def render(self, processes=None):
+        """
+        Text exposition of this process, or with processes (a list of
+        (pid, live, snapshot)) of all of them merged
+        """
+        lines = []
+        for metric in self._metrics:
+            try:
+                if processes is None:
+                    samples = list(metric.samples())
+                else:
+                    samples = list(metric.samples(*metric.merge(
+                        [(pid, live, snapshot.get(metric.name, {})) for pid, live, snapshot in processes])))
+            except Exception as e:  # a broken collector must not take the endpoint down
+                lines.append(f'# {metric.name} collection failed: {type(e).__name__}')
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+request_seconds = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by route', ('route', 'method', 'status'))
+phase_seconds = registry.histogram(
+    'http_request_phase_seconds', 'Time spent in each phase of a request', ('route', 'phase'))
+request_errors = registry.counter(
+    'http_request_errors_total', 'Requests that failed with an unexpected server error', ('route',))
+_model_lock = threading.Lock()
+model_calls = registry.counter(
+    'rain_model_calls_total', 'Model inference calls', ('path',), _model_lock)
+model_rows = registry.counter(
+    'rain_model_rows_total', 'Readings scored by the model', ('path',), _model_lock)
+
+
+class RequestTimer:
+    """Phase durations of one request"""
+
+    __slots__ = ('route', 'method', 'started', 'phases')
+
+    def __init__(self, route, method):
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        self.phases = {}
+
+
+def start_request(route, method):
+    """Begin timing a request; returns the token for finish_request"""
+    if MULTIPROC_DIR is not None and _flusher_pid != os.getpid():
+        _start_flusher()
+    return _current.set(RequestTimer(route, method))
+
+
+def set_route(route):
+    timer = _current.get()
+    if timer is not None:
+        timer.route = route
+
+
+def finish_request(token, status):
+    timer = _current.get()
+    _current.reset(token)
+    if timer is None:
+        return
+    request_seconds.observe(time.perf_counter() - timer.started, timer.route, timer.method, str(status))
+    for phase, seconds in timer.phases.items():
+        phase_seconds.observe(seconds, timer.route, phase)
+
+
+def add_phase(phase, seconds):
+    """Charge seconds to a phase of the current request (no-op outside requests)"""
+    timer = _current.get()
+    if timer is not None:
+        timer.phases[phase] = timer.phases.get(phase, 0.0) + seconds
+
+
+def record_inference(path, rows, features, scaler, forest):
+    """One model call: counters plus its three phases, with a single context lookup"""
+    key = (path,)
+    calls, scored = model_calls._values, model_rows._values
+    with _model_lock:
+        calls[key] = calls.get(key, 0) + 1
+        scored[key] = scored.get(key, 0) + rows
+    timer = _current.get()
+    if timer is not None:
+        phases = timer.phases
+        phases['features'] = phases.get('features', 0.0) + features
+        phases['scaler'] = phases.get('scaler', 0.0) + scaler
+        phases['forest'] = phases.get('forest', 0.0) + forest
+
+
+class phase:
+    """with phase('strategy'): ...  -- times a block into the current request"""
+
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add_phase(self.name, time.perf_counter() - self.started)
+        return False
+
+
+# Multiprocess mode (METRICS_MULTIPROC_DIR)
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+_process_file = None
+
+
+def _snapshot_file():
+    """This process's file; named by pid and start time so a reused pid starts a new file"""
+    global _process_file
+    if _process_file is None or not _process_file.startswith(f'{os.getpid()}-'):
+        _process_file = f'{os.getpid()}-{time.time_ns()}.json'
+    return os.path.join(MULTIPROC_DIR, _process_file)
+
+
+def write_snapshot():
+    """Store this process's values for scrapes served by other workers"""
+    states = {name: [[list(labels), value] for labels, value in state.items()]
+              for name, state in registry.snapshot().items()}
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=MULTIPROC_DIR, prefix='.snapshot-')
+    with os.fdopen(handle, 'w') as stream:
+        json.dump(states, stream)
+    os.replace(temporary, _snapshot_file())
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_snapshots():
+    """(pid, live, snapshot) of every process that wrote to MULTIPROC_DIR, this one from memory"""
+    own = _snapshot_file()
+    processes = [(os.getpid(), True, registry.snapshot())]
+    for filename in os.listdir(MULTIPROC_DIR):
+        path = os.path.join(MULTIPROC_DIR, filename)
+        if not filename.endswith('.json') or path == own:
+            continue
+        try:
+            with open(path) as stream:
+                states = json.load(stream)
+        except (OSError, ValueError):
+            continue
+        pid = int(filename.split('-')[0])
+        snapshot = {name: {tuple(labels): (tuple(value) if isinstance(value, list) else value)
+                           for labels, value in state}
+                    for name, state in states.items()}
+        processes.append((pid, _alive(pid), snapshot))
+    return processes
+
+
+def _start_flusher():
+    """Once per process (a forked worker starts its own)"""
+    global _flusher_pid
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flush_forever, name='metrics-flusher', daemon=True).start()
+        atexit.register(flush)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        flush()
+
+
+def flush():
+    """write_snapshot() in multiprocess mode, logging instead of raising"""
+    if MULTIPROC_DIR is None:
+        return
+    try:
+        write_snapshot()
+    except OSError as e:
+        print(f"⚠ Could not write metrics snapshot: {e}")
+
+
+def render():
+    if MULTIPROC_DIR is None:
+        return registry.render()
+    flush()
+    return registry.render(read_snapshots())
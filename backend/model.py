@@ -1,19 +1,62 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 import joblib
+import copy
 import os
+import threading
+import time
+import column_cache
+import metrics
+from forest import FlatForest
+
+INFERENCE_BACKENDS = ('sklearn', 'flat', 'auto')
+# Above this many rows sklearn's compiled tree walk beats the NumPy evaluator
+FLAT_BATCH_LIMIT = 1000
+# Rows in the trailing mean used by the *_ROLLING features
+ROLLING_WINDOW = 5
+
+BASE_FEATURES = ['AIR_TEMP', 'TRACK_TEMP', 'HUMIDITY', 'PRESSURE',
+                 'WIND_SPEED', 'WIND_DIRECTION', 'TEMP_DIFF',
+                 'HUMIDITY_PRESSURE_RATIO']
+# Need the preceding readings: supplied by feature_store at inference time
+TREND_FEATURES = ['AIR_TEMP_ROLLING', 'HUMIDITY_ROLLING', 'HUMIDITY_CHANGE', 'PRESSURE_CHANGE']
+FEATURE_SETS = {
+    'base': BASE_FEATURES,
+    'full': BASE_FEATURES + TREND_FEATURES,
+}
+# Trend feature -> the reading it is computed from. Without history a
+# rolling mean is the reading itself and a change is 0, as on the first
+# row in engineer_features().
+ROLLING_SOURCES = {'AIR_TEMP_ROLLING': 'AIR_TEMP', 'HUMIDITY_ROLLING': 'HUMIDITY'}
+CHANGE_SOURCES = {'HUMIDITY_CHANGE': 'HUMIDITY', 'PRESSURE_CHANGE': 'PRESSURE'}
 
 class RainPredictionModel:
-    def __init__(self):
+    def __init__(self, backend='auto', feature_set='base'):
         self.model = None
+        # FlatForest of self.model read from its artifact (memory-mapped), if published with one
+        self.flat_forest = None
         self.scaler = StandardScaler()
-        self.feature_columns = ['AIR_TEMP', 'TRACK_TEMP', 'HUMIDITY', 'PRESSURE', 
-                                'WIND_SPEED', 'WIND_DIRECTION', 'TEMP_DIFF', 
-                                'HUMIDITY_PRESSURE_RATIO']
+        if feature_set not in FEATURE_SETS:
+            raise ValueError(f"Unknown feature set {feature_set!r}; expected one of {tuple(FEATURE_SETS)}")
+        self.feature_columns = list(FEATURE_SETS[feature_set])
+        self.version = None
+        self.manifest = None
+        self.metrics = None
+        # Dataset rows of the test split in the last fit (X's index), recorded on publish
+        self.holdout_rows = None
+        self.backend = None
+        self._inference = None
+        self._local = threading.local()
+        self.set_backend(backend)
+    
+    @property
+    def uses_trend_features(self):
+        """True if the model was trained on features that need the preceding readings"""
+        return any(name in TREND_FEATURES for name in self.feature_columns)
         
     def engineer_features(self, df):
         """Create additional features for better prediction"""
@@ -26,8 +69,8 @@ class RainPredictionModel:
         df['HUMIDITY_PRESSURE_RATIO'] = df['HUMIDITY'] / df['PRESSURE']
         
         # Rolling averages for trend detection
-        df['AIR_TEMP_ROLLING'] = df['AIR_TEMP'].rolling(window=5, min_periods=1).mean()
-        df['HUMIDITY_ROLLING'] = df['HUMIDITY'].rolling(window=5, min_periods=1).mean()
+        df['AIR_TEMP_ROLLING'] = df['AIR_TEMP'].rolling(window=ROLLING_WINDOW, min_periods=1).mean()
+        df['HUMIDITY_ROLLING'] = df['HUMIDITY'].rolling(window=ROLLING_WINDOW, min_periods=1).mean()
         
         # Humidity change rate
         df['HUMIDITY_CHANGE'] = df['HUMIDITY'].diff().fillna(0)
@@ -39,8 +82,8 @@ class RainPredictionModel:
     
     def load_and_prepare_data(self, csv_path):
         """Load and prepare data from CSV"""
-        # Read CSV with semicolon delimiter
-        df = pd.read_csv(csv_path, sep=';')
+        # Typed columns cached next to the CSV; the CSV is parsed only when it changed
+        df = column_cache.read_frame(csv_path, sep=';')
         
         # Engineer features
         df = self.engineer_features(df)
@@ -57,25 +100,37 @@ class RainPredictionModel:
         df = self.load_and_prepare_data(csv_path)
         
         # Prepare features and target
-        X = df[self.feature_columns]
-        y = df['RAIN']
-        
+        return self.fit(df[self.feature_columns], df['RAIN'])
+    
+    def fit(self, X, y, rows_seen=None, estimator=None):
+        """
+        Scale, split, train and evaluate on prepared features. rows_seen is
+        the size of the archive X was sampled from, when it is a sample;
+        estimator replaces the default Random Forest (e.g. a search winner).
+        """
         # Check class distribution
         rain_count = y.sum()
         total_count = len(y)
         print(f"Dataset: {total_count} samples, {rain_count} rain events ({rain_count/total_count*100:.2f}%)")
+        if rows_seen is not None:
+            print(f"Sampled from {rows_seen} rows")
         
         # Scale features
         X_scaled = self.scaler.fit_transform(X)
         
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X_scaled, y, test_size=0.2, random_state=42, stratify=y if rain_count > 0 else None
+        # Split data (by position, so the test rows can be traced back to the dataset)
+        train_rows, test_rows = train_test_split(
+            np.arange(total_count), test_size=0.2, random_state=42, stratify=y if rain_count > 0 else None
         )
+        y_values = np.asarray(y)
+        X_train, X_test = X_scaled[train_rows], X_scaled[test_rows]
+        y_train, y_test = y_values[train_rows], y_values[test_rows]
+        self.holdout_rows = np.sort(np.asarray(X.index)[test_rows]) if isinstance(X, pd.DataFrame) else None
         
         # Train Random Forest with class balancing
         print("Training model...")
-        self.model = RandomForestClassifier(
+        self.flat_forest = None
+        self.model = estimator if estimator is not None else RandomForestClassifier(
             n_estimators=200,
             max_depth=10,
             min_samples_split=5,
@@ -93,6 +148,10 @@ class RainPredictionModel:
         
         print(f"\nModel Performance:")
         print(f"Accuracy: {accuracy:.4f}")
+        self.metrics = {'samples': int(total_count), 'rain_events': int(rain_count),
+                        'accuracy': float(accuracy)}
+        if rows_seen is not None:
+            self.metrics['rows_seen'] = int(rows_seen)
         
         if rain_count > 0:
             precision = precision_score(y_test, y_pred, zero_division=0)
@@ -101,6 +160,8 @@ class RainPredictionModel:
             print(f"Precision: {precision:.4f}")
             print(f"Recall: {recall:.4f}")
             print(f"F1 Score: {f1:.4f}")
+            self.metrics.update({'precision': float(precision), 'recall': float(recall),
+                                 'f1': float(f1)})
         
         # Feature importance
         feature_importance = pd.DataFrame({
@@ -113,10 +174,129 @@ class RainPredictionModel:
         
         return self.model
     
+    def set_backend(self, backend):
+        """
+        Choose how the forest is evaluated: 'sklearn', 'flat' (FlatForest
+        arrays) or 'auto' (flat up to FLAT_BATCH_LIMIT rows, sklearn above).
+        All three return identical probabilities.
+        """
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown inference backend {backend!r}; expected one of {INFERENCE_BACKENDS}")
+        self.backend = backend
+        self._inference = None
+
+    def prepare_inference(self):
+        """Precompute the fixed feature order, scaler arrays and evaluator used by predict()"""
+        index = {name: j for j, name in enumerate(self.feature_columns)}
+        derived = {'TEMP_DIFF', 'HUMIDITY_PRESSURE_RATIO'}
+
+        # A single row gains nothing from joblib's thread pool; share the
+        # fitted trees but evaluate them serially
+        estimator = copy.copy(self.model)
+        if hasattr(estimator, 'n_jobs'):
+            estimator.n_jobs = 1
+
+        flat = None
+        if self.backend != 'sklearn' and self.flat_forest is not None:
+            flat = self.flat_forest
+        elif self.backend != 'sklearn':
+            try:
+                flat = FlatForest.from_sklearn(self.model)
+            except TypeError as e:
+                print(f"⚠ Flat evaluator unavailable, using sklearn: {e}")
+
+        self._inference = {
+            'model': self.model,
+            'scaler': self.scaler,
+            'estimator': estimator,
+            'flat': flat,
+            'flat_limit': None if self.backend == 'flat' else FLAT_BATCH_LIMIT,
+            'n_features': len(self.feature_columns),
+            'inputs': [(j, name) for name, j in index.items() if name not in derived],
+            'temp_diff': (index['TEMP_DIFF'], index['AIR_TEMP'], index['TRACK_TEMP'])
+                         if 'TEMP_DIFF' in index else None,
+            'ratio': (index['HUMIDITY_PRESSURE_RATIO'], index['HUMIDITY'], index['PRESSURE'])
+                     if 'HUMIDITY_PRESSURE_RATIO' in index else None,
+            'rolling': [(index[name], index[source]) for name, source in ROLLING_SOURCES.items()
+                        if name in index and source in index],
+            'mean': np.ascontiguousarray(self.scaler.mean_, dtype=np.float64),
+            'scale': np.ascontiguousarray(self.scaler.scale_, dtype=np.float64),
+            'rain_column': 1 if len(self.model.classes_) > 1 else None,
+        }
+        return self._inference
+
+    def _plan(self):
+        plan = self._inference
+        if plan is None or plan['model'] is not self.model or plan['scaler'] is not self.scaler:
+            plan = self.prepare_inference()
+        return plan
+
+    def _predict_proba(self, plan, X):
+        """Run the selected evaluator over an already scaled matrix"""
+        flat = plan['flat']
+        if flat is not None and (plan['flat_limit'] is None or len(X) <= plan['flat_limit']):
+            return flat.predict_proba(X)
+        return (plan['estimator'] if len(X) == 1 else plan['model']).predict_proba(X)
+
     def predict(self, weather_data):
         """
         Predict rain probability
         weather_data: dict with keys matching feature columns
+        Pandas-free fast path over a per-thread preallocated row; gives the
+        same result as predict_pandas().
+        """
+        if self.model is None:
+            raise ValueError("Model not trained. Call train() first.")
+        
+        plan = self._plan()
+        started = time.perf_counter()
+        
+        row = getattr(self._local, 'row', None)
+        if row is None or row.shape[1] != plan['n_features']:
+            row = self._local.row = np.empty((1, plan['n_features']), dtype=np.float64)
+        values = row[0]
+        
+        for j, name in plan['inputs']:
+            value = weather_data.get(name)
+            values[j] = np.nan if value is None else value
+        for j, source in plan['rolling']:
+            if values[j] != values[j]:
+                values[j] = values[source]
+        if plan['temp_diff'] is not None:
+            j, air, track = plan['temp_diff']
+            values[j] = values[air] - values[track]
+        if plan['ratio'] is not None:
+            j, humidity, pressure = plan['ratio']
+            values[j] = values[humidity] / values[pressure]
+        values[np.isnan(values)] = 0
+        built = time.perf_counter()
+        
+        np.subtract(row, plan['mean'], out=row)
+        np.divide(row, plan['scale'], out=row)
+        scaled = time.perf_counter()
+        
+        # One estimator call; the class is derived from the same probabilities
+        proba = self._predict_proba(plan, row)[0]
+        prediction = int(plan['model'].classes_[proba.argmax()])
+        metrics.record_inference('single', 1, built - started, scaled - built, time.perf_counter() - scaled)
+        
+        if plan['rain_column'] is None:
+            rain_prob = 1.0 - float(proba[0]) if prediction == 0 else float(proba[0])
+            no_rain_prob = 1.0 - rain_prob
+        else:
+            no_rain_prob = float(proba[0])
+            rain_prob = float(proba[1])
+        
+        return {
+            'rain_probability': rain_prob,
+            'no_rain_probability': no_rain_prob,
+            'prediction': prediction
+        }
+    
+    def predict_pandas(self, weather_data):
+        """
+        Predict rain probability through pandas (reference for predict())
+        weather_data: dict with keys matching feature columns
         """
         if self.model is None:
             raise ValueError("Model not trained. Call train() first.")
@@ -124,11 +304,18 @@ class RainPredictionModel:
         # Create DataFrame from input
         df = pd.DataFrame([weather_data])
         
-        # Calculate only the basic engineered features (not rolling averages for single prediction)
+        # Derived features of the single reading
         df['TEMP_DIFF'] = df['AIR_TEMP'] - df['TRACK_TEMP']
         df['HUMIDITY_PRESSURE_RATIO'] = df['HUMIDITY'] / df['PRESSURE']
+        # Trend features not supplied: no history
+        for name in TREND_FEATURES:
+            if name in self.feature_columns:
+                if name not in df:
+                    df[name] = np.nan
+                if name in ROLLING_SOURCES:
+                    df[name] = df[name].fillna(df[ROLLING_SOURCES[name]])
         
-        # Select features - use only the 8 features the model was trained on
+        # Select features the model was trained on
         X = df[self.feature_columns].fillna(0)
         
         # Scale
@@ -160,6 +347,89 @@ class RainPredictionModel:
             'prediction': int(self.model.predict(X_scaled)[0])
         }
     
+    def build_feature_matrix(self, records):
+        """
+        Build the unscaled feature matrix for a batch of readings
+        records: list of dicts keyed like predict(), or a dict mapping each
+        column to an array (columnar payload). Rows keep input order.
+        """
+        if isinstance(records, dict):
+            columns = {key: np.asarray(value, dtype=np.float64) for key, value in records.items()}
+            n_rows = len(next(iter(columns.values()))) if columns else 0
+
+            def column(name):
+                return columns.get(name, np.full(n_rows, np.nan))
+        else:
+            n_rows = len(records)
+
+            def column(name):
+                # np.array maps missing/None values to NaN, like the DataFrame path
+                return np.array([record.get(name) for record in records], dtype=np.float64)
+
+        X = np.empty((n_rows, len(self.feature_columns)), dtype=np.float64)
+        raw = {}
+        for j, name in enumerate(self.feature_columns):
+            if name == 'TEMP_DIFF':
+                X[:, j] = raw['AIR_TEMP'] - raw['TRACK_TEMP']
+            elif name == 'HUMIDITY_PRESSURE_RATIO':
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    X[:, j] = raw['HUMIDITY'] / raw['PRESSURE']
+            elif name in ROLLING_SOURCES:
+                source = ROLLING_SOURCES[name]
+                values = column(name)
+                X[:, j] = np.where(np.isnan(values), raw[source] if source in raw else column(source), values)
+            else:
+                X[:, j] = column(name)
+            raw[name] = X[:, j]
+
+        X[np.isnan(X)] = 0
+        return X
+
+    def scale_features(self, X):
+        """Apply the fitted StandardScaler in place (same arithmetic as transform)"""
+        X -= self.scaler.mean_
+        X /= self.scaler.scale_
+        return X
+
+    def probabilities_from_proba(self, proba):
+        """Split predict_proba output into rain/no-rain probabilities and classes"""
+        classes = self.model.classes_
+        prediction = classes.take(np.argmax(proba, axis=1)).astype(np.int64)
+
+        if proba.shape[1] == 1:
+            # Model only knows one class; mirror predict()'s handling
+            known = proba[:, 0]
+            rain_prob = np.where(prediction == 0, 1.0 - known, known)
+        else:
+            rain_prob = proba[:, 1]
+        return {
+            'rain_probability': rain_prob,
+            'no_rain_probability': 1.0 - rain_prob if proba.shape[1] == 1 else proba[:, 0],
+            'prediction': prediction
+        }
+
+    def predict_batch(self, records):
+        """
+        Predict rain probability for many readings in one pass
+        records: list of dicts or a columnar dict of arrays (see build_feature_matrix)
+        Returns a dict of NumPy arrays in input order.
+        """
+        if self.model is None:
+            raise ValueError("Model not trained. Call train() first.")
+
+        started = time.perf_counter()
+        X = self.build_feature_matrix(records)
+        built = time.perf_counter()
+        self.scale_features(X)
+        scaled = time.perf_counter()
+        if len(X) == 0:
+            empty = np.empty(0)
+            return {'rain_probability': empty, 'no_rain_probability': empty,
+                    'prediction': np.empty(0, dtype=np.int64)}
+        result = self.probabilities_from_proba(self._predict_proba(self._plan(), X))
+        metrics.record_inference('batch', len(X), built - started, scaled - built, time.perf_counter() - scaled)
+        return result
+    
     def save_model(self, model_path='model_data'):
         """Save trained model and scaler"""
         os.makedirs(model_path, exist_ok=True)
@@ -170,6 +440,7 @@ class RainPredictionModel:
     def load_model(self, model_path='model_data'):
         """Load trained model and scaler"""
         self.model = joblib.load(os.path.join(model_path, 'rain_model.pkl'))
+        self.flat_forest = None
         self.scaler = joblib.load(os.path.join(model_path, 'scaler.pkl'))
         print("Model loaded successfully")
 
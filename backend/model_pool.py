@@ -0,0 +1,151 @@
+import itertools
+import re
+import threading
+
+import registry
+from model import RainPredictionModel
+from probability_grid import load_or_build
+
+DEFAULT_BUDGET_BYTES = 512 * 1024 * 1024
+CIRCUIT_ID = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+# registry.publish names versions after the artifact's SHA-256
+VERSION_ID = re.compile(r'^[0-9a-f]{1,64}$')
+
+
+class UnknownCircuit(LookupError):
+    """No model is published for the requested circuit"""
+
+
+class PooledModel:
+    """A loaded model with its prediction cache (and, for the default circuit, its probability grid)"""
+
+    __slots__ = ('circuit', 'model', 'cache', 'grid', 'bytes', 'used')
+
+    def __init__(self, circuit, model, cache, size, used, grid=None):
+        self.circuit = circuit
+        self.model = model
+        self.cache = cache
+        self.grid = grid
+        self.bytes = size
+        self.used = used
+
+
+class ModelPool:
+    """
+    One rain model per circuit, each loaded from its own registry
+    (registry.circuit_path) on first request and evicted least recently
+    used once the loaded artifacts exceed budget_bytes. Artifacts are
+    memory-mapped read-only, so processes serving the same circuit share
+    its pages. The default circuit's model is pinned and outside the
+    budget. Lookups of a loaded circuit take no lock, and replace() swaps
+    a circuit's model in one assignment: requests that already hold the
+    old PooledModel finish on it.
+    """
+
+    def __init__(self, model_path, default_model, default_cache=None, backend='auto',
+                 budget_bytes=DEFAULT_BUDGET_BYTES, make_cache=None, default_circuit=registry.DEFAULT_CIRCUIT,
+                 default_grid=None, data_path=None):
+        self.model_path = model_path
+        # Readings the default circuit's probability grid error is measured on
+        self.data_path = data_path
+        self.default_circuit = default_circuit
+        self.default = PooledModel(default_circuit, default_model, default_cache, 0, 0, default_grid)
+        self.backend = backend
+        self.budget_bytes = budget_bytes
+        self.make_cache = make_cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = {}
+        self._clock = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, circuit=None):
+        """PooledModel for a circuit id (default circuit when None); raises UnknownCircuit"""
+        if circuit is None or circuit == self.default_circuit:
+            return self.default
+        entry = self._entries.get(circuit)
+        if entry is not None:
+            # No lock: a lost update only makes a count or the LRU order slightly stale
+            entry.used = next(self._clock)
+            self.hits += 1
+            return entry
+        return self._load(circuit)
+
+    def _load(self, circuit):
+        if not CIRCUIT_ID.match(circuit):
+            raise UnknownCircuit(f'Invalid circuit id: {circuit!r}')
+        with self._lock:
+            entry = self._entries.get(circuit)
+            if entry is not None:
+                return entry
+
+            entry = self.build(circuit)
+            self.misses += 1
+
+            # Oldest first until the newcomer fits (it is kept even if it alone is over budget)
+            loaded = sum(other.bytes for other in self._entries.values())
+            for other in sorted(self._entries.values(), key=lambda e: e.used):
+                if loaded + entry.bytes <= self.budget_bytes:
+                    break
+                del self._entries[other.circuit]
+                loaded -= other.bytes
+                self.evictions += 1
+
+            entry.used = next(self._clock)
+            self._entries[circuit] = entry
+            print(f"✓ Model {entry.model.version} loaded for circuit {circuit} ({entry.bytes / 2 ** 20:.1f} MB)")
+            return entry
+
+    def build(self, circuit, version=None):
+        """A new PooledModel for a circuit's artifact (default: its LATEST), not yet in the pool"""
+        if version is not None and not VERSION_ID.match(version):
+            raise UnknownCircuit(f'Invalid model version: {version!r}')
+        rain_model = RainPredictionModel(backend=self.backend)
+        model_path = registry.circuit_path(self.model_path, circuit)
+        try:
+            manifest = registry.load(rain_model, model_path, version)
+        except FileNotFoundError:
+            raise UnknownCircuit(f'No model {version or "published"} for circuit {circuit!r}')
+        rain_model.prepare_inference()
+        directory = registry.artifact_dir(model_path, manifest['version'])
+        cache = self.make_cache(rain_model) if self.make_cache is not None else None
+        # /api/predict/approx serves the default circuit's grid only
+        grid = None
+        if circuit == self.default_circuit:
+            grid = load_or_build(rain_model, directory, registry.grid_cache_dir(model_path, manifest['version']),
+                                 self.data_path)
+        size = 0 if circuit == self.default_circuit else registry.artifact_bytes(model_path, manifest['version'])
+        return PooledModel(circuit, rain_model, cache, size, 0, grid)
+
+    def replace(self, entry):
+        """Serve entry for its circuit from now on; False if that circuit was evicted meanwhile"""
+        with self._lock:
+            if entry.circuit == self.default_circuit:
+                self.default = entry
+                return True
+            if entry.circuit not in self._entries:
+                return False
+            entry.used = next(self._clock)
+            self._entries[entry.circuit] = entry
+            return True
+
+    def loaded(self):
+        """The default circuit's PooledModel followed by every loaded circuit's"""
+        return [self.default] + list(self._entries.values())
+
+    def evict(self, circuit):
+        with self._lock:
+            return self._entries.pop(circuit, None) is not None
+
+    def info(self):
+        entries = list(self._entries.values())
+        return {
+            'default_circuit': self.default_circuit,
+            'loaded': sorted(entry.circuit for entry in entries),
+            'bytes': sum(entry.bytes for entry in entries),
+            'budget_bytes': self.budget_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
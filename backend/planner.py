@@ -0,0 +1,179 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from simulator import (COMPOUNDS, CONDITIONS, DRYING_LAPS, LAP_TIMES, MAX_RACE_LAPS, MAX_TIRE_AGE,
+                       PIT_LOSS_SECONDS, RAIN_HORIZON_LAPS, RAIN_MEAN_LAPS, compound_index, wear_table)
+
+# Race parameters are rounded to this before caching value tables
+RAIN_PROB_DECIMALS = 3
+CACHED_RACES = 32
+
+STAY = -1
+
+
+def condition_transitions(rain_prob):
+    """
+    Per-lap Markov model of the track condition (rows: from, columns: to),
+    with the same onset hazard, shower length and drying time as the
+    simulator's rain timelines
+    """
+    p = min(max(float(rain_prob), 0.0), 1.0)
+    onset = 1.0 - (1.0 - p) ** (1.0 / RAIN_HORIZON_LAPS)
+    dries = (1.0 - onset) / DRYING_LAPS
+    eases = 1.0 / RAIN_MEAN_LAPS
+    return np.array([
+        [1.0 - onset, onset * (1.0 - p), onset * p],
+        [dries, 1.0 - dries - onset * p, onset * p],
+        [0.0, eases, 1.0 - eases],
+    ])
+
+
+def condition_from_probability(rain_prob):
+    """Track condition implied by the rain probability (as in calculate_pitstop_strategy)"""
+    if rain_prob > 0.7:
+        return 'wet'
+    elif rain_prob > 0.4:
+        return 'damp'
+    return 'dry'
+
+
+# Time lost to wear on a lap driven at each tire age, per compound
+LAP_WEAR = np.diff(wear_table(MAX_TIRE_AGE), axis=1)
+
+
+class ValueTable:
+    """
+    Expected time to the flag for every (lap, compound, tire age, condition)
+    of one race, solved backwards from the last lap. Laps are solved only as
+    far back as requested, so a later call for an earlier lap extends the
+    table instead of starting over.
+    """
+
+    def __init__(self, total_laps, rain_prob):
+        self.total_laps = total_laps
+        self.transitions = condition_transitions(rain_prob)
+        shape = (total_laps + 2, len(COMPOUNDS), MAX_TIRE_AGE, len(CONDITIONS))
+        # values[l]: state at the start of lap l, whose condition is already known
+        self.values = np.zeros(shape)
+        self.policy = np.full(shape, STAY, dtype=np.int8)
+        self.solved_from = total_laps + 1
+        self.lock = threading.Lock()
+
+    def solve(self, first_lap):
+        """Fill laps first_lap..total_laps (no-op for laps already solved)"""
+        first_lap = max(1, first_lap)
+        if first_lap >= self.solved_from:
+            return
+        with self.lock:
+            next_age = np.minimum(np.arange(MAX_TIRE_AGE) + 1, MAX_TIRE_AGE - 1)
+            lap_cost = LAP_WEAR[:, :, None] + LAP_TIMES[:, None, :]
+            for lap in range(self.solved_from - 1, first_lap - 1, -1):
+                # ahead[k, a, c]: expected time from lap + 1 after driving lap in condition c
+                ahead = self.values[lap + 1][:, next_age, :] @ self.transitions.T
+                stay = lap_cost + ahead
+                fresh = PIT_LOSS_SECONDS + stay[:, 0, :]
+                pit_to = np.argmin(fresh, axis=0)
+                pit = fresh[pit_to, np.arange(len(CONDITIONS))]
+                pitting = pit[None, None, :] < stay
+                self.values[lap] = np.where(pitting, pit[None, None, :], stay)
+                self.policy[lap] = np.where(pitting, pit_to[None, None, :], STAY)
+                self.solved_from = lap
+
+    def plans(self, first_laps, compounds, ages, condition):
+        """Stops for many cars at once along the most likely condition path"""
+        compounds, ages = compounds.copy(), ages.copy()
+        stops = [[] for _ in range(len(compounds))]
+        for lap in range(int(first_laps.min()), self.total_laps + 1):
+            actions = self.policy[lap, compounds, ages, condition]
+            pitting = (actions != STAY) & (first_laps <= lap)
+            for car in np.flatnonzero(pitting):
+                stops[car].append({'lap': lap - 1, 'tire': COMPOUNDS[actions[car]]})
+            compounds = np.where(pitting, actions, compounds)
+            ages = np.where(pitting, 0, ages)
+            ages = np.where(first_laps <= lap, np.minimum(ages + 1, MAX_TIRE_AGE - 1), ages)
+            condition = int(np.argmax(self.transitions[condition]))
+        return stops
+
+
+class PitPlanner:
+    """Optimal pit schedules from per-race value tables kept in an LRU cache"""
+
+    def __init__(self, max_races=CACHED_RACES):
+        self.max_races = max_races
+        self.hits = 0
+        self.misses = 0
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def table(self, total_laps, rain_prob):
+        key = (int(total_laps), round(float(rain_prob), RAIN_PROB_DECIMALS))
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self.hits += 1
+                self._tables.move_to_end(key)
+                return table
+            self.misses += 1
+            table = self._tables[key] = ValueTable(*key)
+            if len(self._tables) > self.max_races:
+                self._tables.popitem(last=False)
+            return table
+
+    def cache_info(self):
+        return {'races': len(self._tables), 'hits': self.hits, 'misses': self.misses}
+
+    def solve(self, rain_prob, current_lap, total_laps, current_tire, tire_age=0, track_condition=None):
+        """
+        Optimal pit decisions for the rest of the race. The next lap is
+        assumed to run in track_condition (default: implied by rain_prob).
+        """
+        return self.solve_grid(rain_prob, total_laps, [(current_lap, current_tire, tire_age)],
+                               track_condition)[0]
+
+    def solve_grid(self, rain_prob, total_laps, cars, track_condition=None):
+        """
+        solve() for many cars in one race: cars is a list of
+        (current_lap, current_tire, tire_age). All cars share one value table
+        and are looked up together, so the grid costs about as much as one car.
+        """
+        total_laps = int(total_laps)
+        if not 0 < total_laps <= MAX_RACE_LAPS:
+            raise ValueError(f'total_laps must be between 1 and {MAX_RACE_LAPS}')
+        condition_name = track_condition or condition_from_probability(rain_prob)
+        if condition_name not in CONDITIONS:
+            raise ValueError(f'Unknown track condition: {track_condition}')
+        condition = CONDITIONS.index(condition_name)
+
+        next_laps, compounds, ages = [], [], []
+        for current_lap, current_tire, tire_age in cars:
+            if not 0 <= int(current_lap) < total_laps:
+                raise ValueError('current_lap must be before total_laps')
+            next_laps.append(int(current_lap) + 1)
+            compounds.append(compound_index(current_tire))
+            ages.append(min(max(0, int(tire_age)), MAX_TIRE_AGE - 1))
+        next_laps, compounds, ages = np.array(next_laps), np.array(compounds), np.array(ages)
+
+        table = self.table(total_laps, rain_prob)
+        table.solve(int(next_laps.min()))
+
+        actions = table.policy[next_laps, compounds, ages, condition]
+        values = table.values[next_laps, compounds, ages, condition]
+        # What to do next lap if the track turns out differently
+        contingencies = {name: table.policy[next_laps, compounds, ages, index]
+                         for index, name in enumerate(CONDITIONS)}
+        stops = table.plans(next_laps, compounds, ages, condition)
+
+        def decision(choice):
+            return 'STAY OUT' if choice == STAY else f'PIT for {COMPOUNDS[choice]}'
+
+        return [{
+            'action': 'STAY OUT' if actions[car] == STAY else 'PIT NOW',
+            'recommended_tire': COMPOUNDS[compounds[car] if actions[car] == STAY else actions[car]],
+            'stops': stops[car],
+            'expected_race_time': round(float(values[car]), 3),
+            'track_condition': condition_name,
+            'if_next_lap': {name: decision(choices[car]) for name, choices in contingencies.items()},
+            'laps_remaining': total_laps - int(next_laps[car]) + 1
+        } for car in range(len(next_laps))]
@@ -0,0 +1,168 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Model inputs and the step each is rounded to before lookup
+DEFAULT_PRECISION = {
+    'AIR_TEMP': 0.1,
+    'TRACK_TEMP': 0.1,
+    'HUMIDITY': 0.1,
+    'PRESSURE': 0.1,
+    'WIND_SPEED': 0.1,
+    'WIND_DIRECTION': 1.0,
+}
+DEFAULT_MAX_SIZE = 4096
+DEFAULT_TTL = 300.0
+
+
+def parse_precision(spec, default=DEFAULT_PRECISION):
+    """'HUMIDITY=0.5,PRESSURE=1' -> precision dict (unlisted inputs keep the default)"""
+    precision = dict(default)
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, step = item.partition('=')
+        name = name.strip().upper()
+        if name not in precision or float(step) <= 0:
+            raise ValueError(f'Invalid prediction cache precision: {item!r}')
+        precision[name] = float(step)
+    return precision
+
+
+class PredictionCache:
+    """
+    LRU/TTL cache in front of RainPredictionModel.predict.
+    Inputs are snapped to a grid of `precision` steps and the model is run
+    on the snapped values, so a cached answer is exactly what predict()
+    gives for its key. Entries are dropped whenever the model's artifact
+    (version or fitted estimator) changes.
+    """
+
+    def __init__(self, model, precision=None, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        self.model = model
+        self.precision = dict(precision or DEFAULT_PRECISION)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+        self._fields = list(self.precision.items())
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._token = None
+
+    def quantize(self, weather_data):
+        """
+        Snap each input to its step; returns (key, snapped inputs), or
+        (None, None) when an input is NaN or infinite and has no grid cell
+        """
+        key = []
+        snapped = {}
+        for name, step in self._fields:
+            value = weather_data.get(name)
+            if value is None:
+                key.append(None)
+                snapped[name] = None
+            else:
+                value = float(value)
+                if not math.isfinite(value):
+                    return None, None
+                index = round(value / step)
+                key.append(index)
+                snapped[name] = index * step
+        return tuple(key), snapped
+
+    def _check_model(self):
+        token = (self.model.version, id(self.model.model))
+        if token != self._token:
+            with self._lock:
+                if token != self._token:
+                    if self._token is not None:
+                        self.invalidations += 1
+                    self._entries.clear()
+                    self._token = token
+
+    def predict(self, weather_data):
+        """Cached RainPredictionModel.predict on the quantized inputs"""
+        if self.max_size <= 0:
+            return self.model.predict(weather_data)
+        self._check_model()
+        key, snapped = self.quantize(weather_data)
+        if key is None:
+            # Uncached: the model treats these inputs as it always has
+            return self.model.predict(weather_data)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(entry[1])
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+            token = self._token
+
+        result = self.model.predict(snapped)
+
+        with self._lock:
+            # Skip results computed while a new artifact was being loaded
+            if token == self._token:
+                self._entries[key] = (now, result)
+                if len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return dict(result)
+
+    def warm(self, other):
+        """
+        Fill with this model's answers for the inputs cached in other, in one
+        batch call, so swapping in a new model does not start from a cold
+        cache. Entries keep other's timestamps. Returns the entries added.
+        """
+        if self.max_size <= 0:
+            return 0
+        self._check_model()
+        with other._lock:
+            entries = [(key, entry[0]) for key, entry in other._entries.items()
+                       if len(key) == len(self._fields)][-self.max_size:]
+            token = self._token
+        if not entries:
+            return 0
+
+        records = {name: np.array([np.nan if key[i] is None else key[i] * step for key, _ in entries])
+                   for i, (name, step) in enumerate(self._fields)}
+        result = self.model.predict_batch(records)
+        answers = [{'rain_probability': float(rain), 'no_rain_probability': float(no_rain), 'prediction': int(label)}
+                   for rain, no_rain, label in zip(result['rain_probability'], result['no_rain_probability'],
+                                                   result['prediction'])]
+        with self._lock:
+            if token != self._token:
+                return 0
+            for (key, stored), answer in zip(entries, answers):
+                self._entries[key] = (stored, answer)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return len(entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'expired': self.expired,
+            'invalidations': self.invalidations,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'precision': self.precision,
+            'model_version': self.model.version
+        }
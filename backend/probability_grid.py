@@ -0,0 +1,209 @@
+import itertools
+import json
+import os
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+import column_cache
+
+GRID_FILE = 'grid.npy'
+GRID_META_FILE = 'grid.json'
+
+# (input, first, last, step); TEMP_DIFF is AIR_TEMP - TRACK_TEMP
+GRID_AXES = [
+    ('HUMIDITY', 0.0, 100.0, 2.5),
+    ('PRESSURE', 950.0, 1050.0, 2.5),
+    ('TEMP_DIFF', -30.0, 10.0, 1.0),
+    ('WIND_SPEED', 0.0, 60.0, 5.0),
+]
+# Probabilities are stored as uint8 levels 0..LEVELS
+LEVELS = 255
+# Dataset rows (or, without a dataset, random off-grid points) used to measure the error
+ERROR_SAMPLES = 20000
+# Raw model inputs; a query's air and track temperatures reach the grid only as their difference
+INPUT_COLUMNS = ('AIR_TEMP', 'TRACK_TEMP', 'HUMIDITY', 'PRESSURE', 'WIND_SPEED', 'WIND_DIRECTION')
+
+
+class ProbabilityGrid:
+    """
+    Rain probability precomputed over humidity x pressure x temperature
+    difference x wind speed, stored as uint8 and read back by multilinear
+    interpolation. The remaining inputs (air temperature, wind direction)
+    are held at the training means, so the error is measured against the
+    model on real readings, where they vary (see error_sample).
+    """
+
+    def __init__(self, values, axes, fixed, meta=None):
+        self.values = values
+        self.axes = [tuple(axis) for axis in axes]
+        self.fixed = dict(fixed)
+        self.meta = dict(meta or {})
+        self.starts = np.array([axis[1] for axis in self.axes])
+        self.steps = np.array([axis[3] for axis in self.axes])
+        self.sizes = np.array(values.shape)
+        self._scalar_axes = [(axis[1], axis[3], size - 1) for axis, size in zip(self.axes, values.shape)]
+
+    @staticmethod
+    def axis_points(axis):
+        _, first, last, step = axis
+        return first + step * np.arange(int(round((last - first) / step)) + 1)
+
+    def records(self, points):
+        """Model input columns for an (N, 4) array of grid-space points"""
+        humidity, pressure, temp_diff, wind_speed = points.T
+        air_temp = np.full(len(points), self.fixed['AIR_TEMP'])
+        return {
+            'AIR_TEMP': air_temp,
+            'TRACK_TEMP': air_temp - temp_diff,
+            'HUMIDITY': humidity,
+            'PRESSURE': pressure,
+            'WIND_SPEED': wind_speed,
+            'WIND_DIRECTION': np.full(len(points), self.fixed['WIND_DIRECTION']),
+        }
+
+    def points(self, records):
+        """Grid-space (N, 4) points of model input columns"""
+        return np.column_stack([records['HUMIDITY'], records['PRESSURE'],
+                                np.asarray(records['AIR_TEMP']) - np.asarray(records['TRACK_TEMP']),
+                                records['WIND_SPEED']])
+
+    @classmethod
+    def build(cls, rain_model, axes=GRID_AXES, error_samples=ERROR_SAMPLES, seed=0, version=None, sample=None):
+        """
+        Evaluate the model on every grid point and measure the error. With a
+        sample of real readings (error_sample) the error is that of
+        approximate answers for those readings, all inputs included;
+        without one it only covers interpolation between grid points.
+        """
+        mean = dict(zip(rain_model.feature_columns, rain_model.scaler.mean_.tolist()))
+        fixed = {'AIR_TEMP': mean['AIR_TEMP'], 'WIND_DIRECTION': mean['WIND_DIRECTION']}
+        coordinates = [cls.axis_points(axis) for axis in axes]
+        shape = tuple(len(points) for points in coordinates)
+
+        grid = cls(np.zeros(shape, dtype=np.uint8), axes, fixed)
+        mesh = np.stack(np.meshgrid(*coordinates, indexing='ij'), axis=-1).reshape(-1, len(axes))
+        exact = rain_model.predict_batch(grid.records(mesh))['rain_probability']
+        grid.values = np.rint(exact * LEVELS).astype(np.uint8).reshape(shape)
+
+        if sample is not None and len(sample['HUMIDITY']):
+            error = np.abs(grid.interpolate(grid.points(sample))[0] -
+                           rain_model.predict_batch(sample)['rain_probability'])
+            source = 'dataset_rows'
+        else:
+            rng = np.random.default_rng(seed)
+            samples = np.column_stack([rng.uniform(axis[1], axis[2], error_samples) for axis in axes])
+            error = np.abs(grid.interpolate(samples)[0] -
+                           rain_model.predict_batch(grid.records(samples))['rain_probability'])
+            source = 'grid_points'
+        grid.meta = {
+            'model_version': version or rain_model.version,
+            'built_at': datetime.now().isoformat(),
+            'points': int(mesh.shape[0]),
+            'max_error': round(float(error.max()), 6),
+            'mean_error': round(float(error.mean()), 6),
+            'p99_error': round(float(np.percentile(error, 99)), 6),
+            # dataset_rows: readings of the training data; grid_points: random
+            # points with air temperature and wind direction at their means
+            'error_source': source,
+            'error_samples': len(error),
+        }
+        return grid
+
+    def interpolate(self, points):
+        """Probabilities for an (N, 4) array of points; also returns which were clipped to the grid"""
+        position = (np.asarray(points, dtype=np.float64) - self.starts) / self.steps
+        clipped = ((position < 0) | (position > self.sizes - 1)).any(axis=1)
+        position = np.clip(position, 0, self.sizes - 1)
+        base = np.minimum(np.floor(position).astype(np.intp), self.sizes - 2)
+        fraction = position - base
+
+        result = np.zeros(len(position))
+        for offset in itertools.product((0, 1), repeat=len(self.axes)):
+            index = tuple(base[:, d] + offset[d] for d in range(len(self.axes)))
+            weight = np.prod(np.where(offset, fraction, 1.0 - fraction), axis=1)
+            result += weight * self.values[index]
+        return result / LEVELS, clipped
+
+    def probability(self, humidity, pressure, temp_diff, wind_speed):
+        """interpolate() for a single point without array overhead; returns (probability, clipped)"""
+        cells, clipped = [], False
+        for value, (start, step, last) in zip((humidity, pressure, temp_diff, wind_speed), self._scalar_axes):
+            position = (value - start) / step
+            if position < 0 or position > last:
+                clipped = True
+                position = min(max(position, 0.0), last)
+            cell = min(int(position), last - 1)
+            cells.append((cell, position - cell))
+
+        (h, fh), (p, fp), (t, ft), (w, fw) = cells
+        block = self.values[h:h + 2, p:p + 2, t:t + 2, w:w + 2].astype(np.float64)
+        block = block[0] * (1 - fh) + block[1] * fh
+        block = block[0] * (1 - fp) + block[1] * fp
+        block = block[0] * (1 - ft) + block[1] * ft
+        return float(block[0] * (1 - fw) + block[1] * fw) / LEVELS, clipped
+
+    def save(self, directory):
+        """Write grid.npy and grid.json into an artifact directory"""
+        meta = dict(self.meta, axes=[list(axis) for axis in self.axes], fixed=self.fixed, levels=LEVELS)
+        handle, temporary = tempfile.mkstemp(dir=directory, prefix='.grid-', suffix='.npy')
+        with os.fdopen(handle, 'wb') as stream:
+            np.save(stream, self.values)
+        os.replace(temporary, os.path.join(directory, GRID_FILE))
+        handle, temporary = tempfile.mkstemp(dir=directory, prefix='.grid-', suffix='.json')
+        with os.fdopen(handle, 'w') as stream:
+            json.dump(meta, stream, indent=2)
+        os.replace(temporary, os.path.join(directory, GRID_META_FILE))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, GRID_META_FILE)) as stream:
+            meta = json.load(stream)
+        values = np.load(os.path.join(directory, GRID_FILE), mmap_mode='r' if mmap else None)
+        axes, fixed = meta.pop('axes'), meta.pop('fixed')
+        meta.pop('levels', None)
+        return cls(values, axes, fixed, meta)
+
+    def info(self):
+        return dict(self.meta, axes=[{'input': name, 'first': first, 'last': last, 'step': step}
+                                     for name, first, last, step in self.axes],
+                    fixed_inputs=self.fixed, nbytes=int(self.values.nbytes))
+
+
+def error_sample(data_path, rows=ERROR_SAMPLES, seed=0):
+    """Model inputs of up to `rows` random complete readings of a weather CSV, None if unreadable"""
+    try:
+        frame = column_cache.read_frame(data_path, columns=INPUT_COLUMNS).dropna()
+    except (OSError, KeyError, ValueError) as e:
+        print(f"⚠ No readings to measure the probability grid error on: {e}")
+        return None
+    if len(frame) > rows:
+        frame = frame.sample(rows, random_state=seed)
+    return {name: frame[name].to_numpy(dtype=np.float64) for name in INPUT_COLUMNS}
+
+
+def load_or_build(rain_model, directory, cache_dir=None, data_path=None):
+    """
+    The grid published with an artifact (registry.publish). An artifact
+    that predates grids gets one built here, kept in cache_dir (when given)
+    for the next start; the artifact directory itself is never written.
+    Its error is measured on readings of data_path when given.
+    """
+    for source in (directory, cache_dir):
+        if source is None:
+            continue
+        try:
+            grid = ProbabilityGrid.load(source)
+        except FileNotFoundError:
+            continue
+        if grid.meta.get('model_version') == rain_model.version:
+            return grid
+    grid = ProbabilityGrid.build(rain_model, sample=error_sample(data_path) if data_path else None)
+    if cache_dir is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            grid.save(cache_dir)
+        except OSError as e:
+            print(f"⚠ Could not store probability grid: {e}")
+    return grid
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import joblib
+import numpy as np
+import sklearn
+
+from chunked_training import rows_sha256
+from forest import FlatForest
+from probability_grid import ProbabilityGrid, error_sample
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; fall back to an exclusive lock file
+    fcntl = None
+
+REGISTRY_DIR = 'registry'
+LATEST_FILE = 'LATEST'
+LOCK_FILE = '.registry.lock'
+ARTIFACT_FILE = 'model.joblib'
+MANIFEST_FILE = 'manifest.json'
+# FlatForest arrays (.npy) of a Random Forest artifact, memory-mapped on load
+FLAT_DIR = 'flat'
+# Registries of circuits other than the default live under <model_path>/circuits/<id>
+CIRCUITS_DIR = 'circuits'
+DEFAULT_CIRCUIT = 'cota'
+# Probability grids built at load time for artifacts published before grids
+# existed; kept beside the registry because artifact directories are read-only
+GRID_CACHE_DIR = 'grid-cache'
+# Test-split rows listed in a manifest for the reloader to validate on (evenly spread)
+HOLDOUT_RECORD_ROWS = 1000
+
+
+def holdout_record(data_path, rows, limit=HOLDOUT_RECORD_ROWS):
+    """
+    Manifest entry for a model's test split: up to `limit` of its dataset
+    row numbers and the hash of their contents, so a later check can tell
+    whether the dataset still holds those readings.
+    """
+    split = np.asarray(rows, dtype=np.int64)
+    rows = split
+    if len(split) > limit:
+        rows = split[np.linspace(0, len(split) - 1, limit).round().astype(np.int64)]
+    return {'rows': rows.tolist(), 'split_rows': len(split), 'sha256': rows_sha256(data_path, rows)}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Return the hex SHA-256 digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def registry_lock(model_path='model_data', timeout=600):
+    """Hold an exclusive cross-process lock on the registry directory"""
+    os.makedirs(model_path, exist_ok=True)
+    lock_path = os.path.join(model_path, LOCK_FILE)
+
+    if fcntl is not None:
+        with open(lock_path, 'a') as handle:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        return
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path + '.excl', os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for registry lock {lock_path}")
+            time.sleep(0.1)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path + '.excl')
+
+
+def circuit_path(model_path, circuit=None):
+    """Registry directory of a circuit; the default circuit uses model_path itself"""
+    if circuit is None or circuit == DEFAULT_CIRCUIT:
+        return model_path
+    return os.path.join(model_path, CIRCUITS_DIR, circuit)
+
+
+def artifact_dir(model_path, version):
+    """Directory holding one published model version"""
+    return os.path.join(model_path, REGISTRY_DIR, version)
+
+
+def grid_cache_dir(model_path, version):
+    """Where a probability grid built after publishing is kept (see probability_grid.load_or_build)"""
+    return os.path.join(model_path, GRID_CACHE_DIR, version)
+
+
+def latest_version(model_path='model_data'):
+    """Return the version LATEST points at, or None if nothing is published"""
+    try:
+        with open(os.path.join(model_path, LATEST_FILE)) as handle:
+            version = handle.read().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def read_manifest(model_path='model_data', version=None):
+    """Read the manifest of a published version (default: LATEST)"""
+    version = version or latest_version(model_path)
+    if version is None:
+        raise FileNotFoundError(f"No published model in {model_path}")
+    with open(os.path.join(artifact_dir(model_path, version), MANIFEST_FILE)) as handle:
+        return json.load(handle)
+
+
+def list_versions(model_path='model_data'):
+    """Return manifests of all published versions, newest first"""
+    root = os.path.join(model_path, REGISTRY_DIR)
+    if not os.path.isdir(root):
+        return []
+    manifests = []
+    for version in os.listdir(root):
+        if version.startswith('.'):
+            continue
+        try:
+            manifests.append(read_manifest(model_path, version))
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+    return sorted(manifests, key=lambda m: m['created_at'], reverse=True)
+
+
+def _write_latest(model_path, version):
+    fd, tmp_path = tempfile.mkstemp(dir=model_path, prefix='.latest-')
+    with os.fdopen(fd, 'w') as handle:
+        handle.write(version + '\n')
+    os.replace(tmp_path, os.path.join(model_path, LATEST_FILE))
+
+
+def _publish_locked(rain_model, data_path, model_path, extra=None):
+    root = os.path.join(model_path, REGISTRY_DIR)
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=root, prefix='.staging-')
+
+    try:
+        # Uncompressed so the arrays can be memory-mapped on load
+        bundle = {
+            'model': rain_model.model,
+            'scaler': rain_model.scaler,
+            'feature_columns': list(rain_model.feature_columns),
+        }
+        artifact_path = os.path.join(staging, ARTIFACT_FILE)
+        joblib.dump(bundle, artifact_path)
+        artifact_hash = file_sha256(artifact_path)
+        version = artifact_hash[:16]
+
+        manifest = {
+            'version': version,
+            'artifact_sha256': artifact_hash,
+            'created_at': datetime.now().isoformat(),
+            'model_type': type(rain_model.model).__name__,
+            'model_params': {k: v for k, v in rain_model.model.get_params().items()
+                             if isinstance(v, (int, float, str, bool, type(None)))},
+            'feature_columns': list(rain_model.feature_columns),
+            'dataset': {
+                'path': os.path.basename(data_path) if data_path else None,
+                'sha256': file_sha256(data_path) if data_path else None,
+            },
+            'metrics': getattr(rain_model, 'metrics', None),
+            'sklearn_version': sklearn.__version__,
+        }
+        holdout_rows = getattr(rain_model, 'holdout_rows', None)
+        if data_path and holdout_rows is not None and len(holdout_rows):
+            manifest['holdout'] = holdout_record(data_path, holdout_rows)
+        if extra:
+            manifest.update(extra)
+        try:
+            # Saved flat so forked workers map the same pages instead of each building a copy
+            flat = FlatForest.from_sklearn(rain_model.model)
+            flat.save(os.path.join(staging, FLAT_DIR))
+            manifest['flat_forest'] = {'trees': flat.n_trees, 'nodes': len(flat.feature), 'bytes': flat.nbytes}
+        except TypeError:
+            pass
+        # Shipped with the artifact so every retrain comes with a matching lookup grid
+        grid = ProbabilityGrid.build(rain_model, version=version,
+                                     sample=error_sample(data_path) if data_path else None)
+        grid.save(staging)
+        manifest['probability_grid'] = {key: grid.meta[key] for key in
+                                        ('points', 'max_error', 'mean_error', 'p99_error', 'error_source')}
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as handle:
+            json.dump(manifest, handle, indent=2)
+
+        destination = artifact_dir(model_path, version)
+        if os.path.exists(destination):
+            # Identical content was already published; just repoint LATEST
+            shutil.rmtree(staging)
+            manifest = read_manifest(model_path, version)
+        else:
+            os.replace(staging, destination)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _write_latest(model_path, version)
+    rain_model.version = version
+    rain_model.manifest = manifest
+    return manifest
+
+
+def publish(rain_model, data_path, model_path='model_data', extra=None):
+    """Write a trained model as a content-hashed artifact and make it LATEST"""
+    if rain_model.model is None:
+        raise ValueError("Model not trained. Call train() first.")
+    with registry_lock(model_path):
+        return _publish_locked(rain_model, data_path, model_path, extra)
+
+
+def load(rain_model, model_path='model_data', version=None, mmap=True):
+    """Load a published artifact (default: LATEST) read-only into rain_model"""
+    manifest = read_manifest(model_path, version)
+    artifact_path = os.path.join(artifact_dir(model_path, manifest['version']), ARTIFACT_FILE)
+    bundle = joblib.load(artifact_path, mmap_mode='r' if mmap else None)
+
+    rain_model.model = bundle['model']
+    flat_dir = os.path.join(artifact_dir(model_path, manifest['version']), FLAT_DIR)
+    rain_model.flat_forest = FlatForest.load(flat_dir, mmap) if os.path.isdir(flat_dir) else None
+    rain_model.scaler = bundle['scaler']
+    rain_model.feature_columns = list(bundle['feature_columns'])
+    rain_model.version = manifest['version']
+    rain_model.manifest = manifest
+    return manifest
+
+
+def artifact_bytes(model_path, version):
+    """Bytes a loaded version maps: the joblib artifact and its flat forest arrays"""
+    directory = artifact_dir(model_path, version)
+    total = os.path.getsize(os.path.join(directory, ARTIFACT_FILE))
+    flat_dir = os.path.join(directory, FLAT_DIR)
+    if os.path.isdir(flat_dir):
+        total += sum(os.path.getsize(os.path.join(flat_dir, name)) for name in os.listdir(flat_dir))
+    return total
+
+
+def ensure_model(rain_model, data_path, model_path='model_data'):
+    """
+    Load the LATEST artifact, training and publishing one only if none exists.
+    The registry lock makes sure a single worker trains while the others wait
+    and then load what it published.
+    """
+    try:
+        return load(rain_model, model_path)
+    except FileNotFoundError:
+        pass
+
+    with registry_lock(model_path):
+        try:
+            return load(rain_model, model_path)
+        except FileNotFoundError:
+            print("No published model found; training one...")
+            rain_model.train(data_path)
+            return _publish_locked(rain_model, data_path, model_path)
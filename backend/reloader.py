@@ -0,0 +1,227 @@
+"""
+Hot model reload. A background thread watches the LATEST file of every
+registry the pool serves (the default circuit and each loaded circuit).
+When LATEST moves, the new artifact is loaded and prepared, checked
+against held-out readings (HOLDOUT_PATH, or else the test split of the
+dataset recorded in its manifest), and given a warm prediction cache.
+Only then is it swapped into the pool; a model that cannot be checked is
+rejected. All of this happens off the request path.
+Requests that started on the old model finish on it.
+"""
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import column_cache
+import registry
+from chunked_training import engineer_rows, rows_sha256
+from model_pool import UnknownCircuit
+
+DEFAULT_INTERVAL = 30.0
+DEFAULT_HOLDOUT_ROWS = 1000
+# A new model may score at most this much lower than the serving one on the holdout
+DEFAULT_MAX_ACCURACY_DROP = 0.05
+# Latest dataset rows every new model must return valid probabilities on
+SANITY_ROWS = 32
+HISTORY_SIZE = 20
+
+
+class ReloadRejected(Exception):
+    """The new artifact failed validation and was not swapped in"""
+
+
+class ModelReloader:
+    def __init__(self, pool, holdout_path=None, data_path=None, holdout_rows=DEFAULT_HOLDOUT_ROWS,
+                 max_accuracy_drop=DEFAULT_MAX_ACCURACY_DROP, interval=DEFAULT_INTERVAL):
+        self.pool = pool
+        self.holdout_path = holdout_path
+        self.data_path = data_path
+        self.holdout_rows = holdout_rows
+        self.max_accuracy_drop = max_accuracy_drop
+        self.interval = interval
+        self.reloads = 0
+        self.rejected = 0
+        self.history = []
+        # LATEST as last seen per circuit; the watcher acts when it moves, so a
+        # rejected version or a manual rollback is not retried every interval
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def holdout_path_problem(self, *rain_models):
+        """Why HOLDOUT_PATH cannot validate these models, or None if it can"""
+        if self.holdout_path is None:
+            return 'no HOLDOUT_PATH is set'
+        holdout_sha256 = registry.file_sha256(self.holdout_path)
+        for rain_model in rain_models:
+            dataset = (getattr(rain_model, 'manifest', None) or {}).get('dataset') or {}
+            if dataset.get('sha256') == holdout_sha256:
+                # Scoring a model on its own training rows approves any overfit model
+                return f'HOLDOUT_PATH is the training data of model {rain_model.version}'
+        return None
+
+    def split_rows(self, rain_model):
+        """
+        Dataset rows of rain_model's test split (the manifest's holdout),
+        or None if it has none or the dataset no longer holds those readings
+        """
+        record = (getattr(rain_model, 'manifest', None) or {}).get('holdout')
+        if not record or self.data_path is None:
+            return None
+        try:
+            if rows_sha256(self.data_path, record['rows']) != record['sha256']:
+                return None
+        except (OSError, KeyError, ValueError):
+            return None
+        return np.asarray(record['rows'], dtype=np.int64)
+
+    def validation_rows(self, candidate, current):
+        """
+        (engineered readings, source, compare): the last holdout_rows rows
+        of HOLDOUT_PATH when it is independent of both models, else the
+        candidate's test split, narrowed to rows of the serving model's
+        test split when they share any. compare is False when the serving
+        model may have trained on the rows. ReloadRejected if there are none.
+        """
+        problem = self.holdout_path_problem(candidate, current)
+        if problem is None:
+            frame = column_cache.read_frame(self.holdout_path).tail(self.holdout_rows)
+            return candidate.engineer_features(frame.reset_index(drop=True)), 'holdout_path', True
+        rows = self.split_rows(candidate)
+        if rows is None:
+            raise ReloadRejected(f'No data to validate on: {problem}, and the dataset does not '
+                                 f'hold the test split of model {candidate.version}')
+        current_rows = self.split_rows(current)
+        common = np.empty(0, dtype=np.int64) if current_rows is None else np.intersect1d(rows, current_rows)
+        if len(common):
+            rows = common
+        return engineer_rows(candidate, self.data_path, rows[-self.holdout_rows:]), 'test_split', len(common) > 0
+
+    @staticmethod
+    def _check_probabilities(rain_model, records):
+        result = rain_model.predict_batch(records)
+        probability = result['rain_probability']
+        if not np.all(np.isfinite(probability)) or probability.min() < 0 or probability.max() > 1:
+            raise ReloadRejected('Model returned probabilities outside [0, 1]')
+        return result
+
+    def sanity_check(self, rain_model):
+        """Reject a model that returns invalid probabilities on the last SANITY_ROWS dataset rows"""
+        if self.data_path is None:
+            return
+        total = len(column_cache.read_columns(self.data_path)['RAIN'])
+        frame = engineer_rows(rain_model, self.data_path, np.arange(max(total - SANITY_ROWS, 0), total))
+        frame = frame.dropna(subset=rain_model.feature_columns)
+        if len(frame):
+            self._check_probabilities(rain_model, {name: frame[name].to_numpy(dtype=np.float64)
+                                                   for name in rain_model.feature_columns})
+
+    def accuracy(self, rain_model, frame):
+        """(accuracy, rows) on the labelled rows of engineered readings, after checking the probabilities"""
+        frame = frame.dropna(subset=list(rain_model.feature_columns) + ['RAIN'])
+        if len(frame) == 0:
+            return None, 0
+        records = {name: frame[name].to_numpy(dtype=np.float64) for name in rain_model.feature_columns}
+        result = self._check_probabilities(rain_model, records)
+        return float(np.mean(result['prediction'] == frame['RAIN'].to_numpy(dtype=np.int64))), len(frame)
+
+    def reload(self, circuit=None, version=None):
+        """
+        Load, validate and swap in a circuit's artifact (default: its
+        LATEST). Returns a report; raises ReloadRejected (and keeps serving
+        the current model) if validation fails, UnknownCircuit if there is
+        no such artifact.
+        """
+        circuit = circuit or self.pool.default_circuit
+        with self._lock:
+            started = time.perf_counter()
+            current = self.pool.default if circuit == self.pool.default_circuit else self.pool.get(circuit)
+            report = {'circuit': circuit, 'previous_version': current.model.version, 'at': datetime.now().isoformat()}
+            try:
+                candidate = self.pool.build(circuit, version)
+                report['version'] = candidate.model.version
+                if candidate.model.version == current.model.version:
+                    report.update(status='unchanged')
+                    return report
+
+                self.sanity_check(candidate.model)
+                frame, source, compare = self.validation_rows(candidate.model, current.model)
+                accuracy, rows = self.accuracy(candidate.model, frame)
+                if accuracy is None:
+                    raise ReloadRejected(f'No labelled rows to validate on ({source})')
+                compare = compare and current.model.model is not None
+                previous = self.accuracy(current.model, frame)[0] if compare else None
+                report.update(validation=source, holdout_rows=rows, accuracy=accuracy,
+                              previous_accuracy=previous)
+                if previous is not None and accuracy < previous - self.max_accuracy_drop:
+                    raise ReloadRejected(f'Holdout accuracy {accuracy:.4f} is more than '
+                                         f'{self.max_accuracy_drop} below the serving model ({previous:.4f})')
+
+                if candidate.cache is not None and current.cache is not None:
+                    report['cache_warmed'] = candidate.cache.warm(current.cache)
+                if not self.pool.replace(candidate):
+                    report.update(status='evicted')
+                    return report
+                self.reloads += 1
+                report.update(status='reloaded')
+                print(f"✓ Model {candidate.model.version} now serving circuit {circuit} "
+                      f"(was {current.model.version})")
+                return report
+            except UnknownCircuit:
+                report.update(status='not_found')
+                raise
+            except ReloadRejected as e:
+                self.rejected += 1
+                report.update(status='rejected', error=str(e))
+                print(f"⚠ Model {report.get('version')} for circuit {circuit} rejected: {e}")
+                raise
+            finally:
+                report.setdefault('status', 'failed')
+                report['seconds'] = round(time.perf_counter() - started, 3)
+                self.history = (self.history + [report])[-HISTORY_SIZE:]
+
+    def check(self):
+        """Reload every served registry whose LATEST moved since the last check"""
+        reports = []
+        for entry in self.pool.loaded():
+            latest = registry.latest_version(registry.circuit_path(self.pool.model_path, entry.circuit))
+            seen = self._seen.setdefault(entry.circuit, entry.model.version)
+            if latest is None or latest == seen:
+                continue
+            self._seen[entry.circuit] = latest
+            try:
+                reports.append(self.reload(entry.circuit, latest))
+            except (ReloadRejected, UnknownCircuit):
+                pass
+            except Exception as e:  # a broken artifact must not stop the watcher
+                print(f"⚠ Reload of circuit {entry.circuit} failed: {e}")
+        return reports
+
+    def start(self):
+        """Start the watcher once per process (lazily, so it survives forking)"""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='model-reloader', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.check()
+
+    def info(self):
+        return {
+            'interval': self.interval if self.interval > 0 else None,
+            'reloads': self.reloads,
+            'rejected': self.rejected,
+            'max_accuracy_drop': self.max_accuracy_drop,
+            'holdout_path': self.holdout_path,
+            'data_path': self.data_path,
+            'last': self.history[-1] if self.history else None
+        }
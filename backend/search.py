@@ -0,0 +1,277 @@
+"""
+Cross-validated hyperparameter search over Random Forest and Gradient
+Boosting configurations. Folds run on a process pool, finished folds are
+cached on disk (so an interrupted or over-budget run resumes where it
+stopped) and the winner is refit and published like train.py's model.
+"""
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+
+import registry
+from model import RainPredictionModel
+
+ESTIMATORS = {
+    'random_forest': RandomForestClassifier,
+    'gradient_boosting': GradientBoostingClassifier,
+}
+# Parameter grids; every combination is one candidate
+SEARCH_SPACE = {
+    'random_forest': {
+        'n_estimators': [100, 200],
+        'max_depth': [6, 10, None],
+        'min_samples_leaf': [1, 2],
+        'min_samples_split': [5],
+        'class_weight': ['balanced'],
+    },
+    'gradient_boosting': {
+        'n_estimators': [100, 200],
+        'learning_rate': [0.05, 0.1],
+        'max_depth': [2, 3],
+    },
+}
+DEFAULT_FOLDS = 5
+DEFAULT_BUDGET_SECONDS = 600
+SEARCH_DIR = 'search'
+RANDOM_STATE = 42
+# Single-row predict() calls timed per fold model
+LATENCY_CALLS = 200
+METRICS = ('accuracy', 'precision', 'recall', 'f1')
+
+
+def candidates(space=SEARCH_SPACE):
+    """(name, params) for every configuration in the search space"""
+    for name, grid in space.items():
+        keys = sorted(grid)
+        for values in itertools.product(*(grid[key] for key in keys)):
+            yield name, dict(zip(keys, values))
+
+
+def candidate_id(name, params):
+    return f"{name}({', '.join(f'{key}={value}' for key, value in sorted(params.items()))})"
+
+
+def make_estimator(name, params, n_jobs=None):
+    estimator = ESTIMATORS[name](random_state=RANDOM_STATE, **params)
+    if n_jobs is not None and 'n_jobs' in estimator.get_params():
+        estimator.set_params(n_jobs=n_jobs)
+    return estimator
+
+
+def fold_key(dataset_hash, name, params, fold, folds):
+    text = json.dumps([dataset_hash, name, params, fold, folds, RANDOM_STATE], sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:24]
+
+
+class FoldCache:
+    """One JSON file per finished (candidate, fold)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.directory, key + '.json')) as stream:
+                return json.load(stream)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        handle, temporary = tempfile.mkstemp(dir=self.directory, prefix='.fold-')
+        with os.fdopen(handle, 'w') as stream:
+            json.dump(result, stream)
+        os.replace(temporary, os.path.join(self.directory, key + '.json'))
+
+
+# Per-process training data, sent once through the pool initializer
+_data = {}
+
+
+def _init_worker(X, y, feature_columns):
+    _data.update(X=X, y=y, feature_columns=feature_columns)
+
+
+def evaluate_fold(name, params, train_index, test_index):
+    """Fit one candidate on one fold; scores plus the serving latency of the fitted model"""
+    X, y = _data['X'], _data['y']
+    scaler = StandardScaler().fit(X[train_index])
+    # The pool already uses every core
+    estimator = make_estimator(name, params, n_jobs=1)
+    started = time.perf_counter()
+    estimator.fit(scaler.transform(X[train_index]), y[train_index])
+    fit_seconds = time.perf_counter() - started
+
+    predicted = estimator.predict(scaler.transform(X[test_index]))
+    truth = y[test_index]
+    result = {
+        'accuracy': accuracy_score(truth, predicted),
+        'precision': precision_score(truth, predicted, zero_division=0),
+        'recall': recall_score(truth, predicted, zero_division=0),
+        'f1': f1_score(truth, predicted, zero_division=0),
+        'fit_seconds': fit_seconds,
+    }
+
+    # Latency through the same path the server uses (FlatForest where it applies)
+    rain_model = RainPredictionModel(backend='auto' if isinstance(estimator, RandomForestClassifier) else 'sklearn')
+    rain_model.model, rain_model.scaler = estimator, scaler
+    rain_model.feature_columns = list(_data['feature_columns'])
+    reading = dict(zip(rain_model.feature_columns, X[test_index[0]].tolist()))
+    rain_model.predict(reading)
+    latencies = []
+    for _ in range(LATENCY_CALLS):
+        started = time.perf_counter()
+        rain_model.predict(reading)
+        latencies.append(time.perf_counter() - started)
+    result['latency_us'] = float(np.median(latencies) * 1e6)
+    return {key: float(value) for key, value in result.items()}
+
+
+def summarize(name, params, folds):
+    """Mean and standard deviation of each metric over a candidate's folds"""
+    summary = {'id': candidate_id(name, params), 'estimator': name, 'params': params, 'folds': len(folds)}
+    for metric in METRICS:
+        values = [fold[metric] for fold in folds]
+        summary[metric] = round(float(np.mean(values)), 4)
+        summary[f'{metric}_std'] = round(float(np.std(values)), 4)
+    summary['fit_seconds'] = round(float(np.mean([fold['fit_seconds'] for fold in folds])), 4)
+    summary['latency_us'] = round(float(np.median([fold['latency_us'] for fold in folds])), 1)
+    return summary
+
+
+def _terminate(executor):
+    """Stop a pool's worker processes now; shutdown() alone lets running folds finish"""
+    if hasattr(executor, 'terminate_workers'):  # Python 3.14+
+        executor.terminate_workers()
+        return
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def run_search(X, y, feature_columns, dataset_hash, cache_dir, folds=DEFAULT_FOLDS,
+               budget=DEFAULT_BUDGET_SECONDS, workers=None, space=SEARCH_SPACE):
+    """
+    Evaluate every candidate with stratified k-fold CV until done or out of
+    budget. Returns (summaries of fully evaluated candidates, best first,
+    search stats). Folds still running when the budget runs out are
+    killed with their worker processes; the next run picks up after the
+    last cached fold.
+    """
+    started = time.perf_counter()
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.int64)
+    splits = list(StratifiedKFold(folds, shuffle=True, random_state=RANDOM_STATE).split(X, y))
+    cache = FoldCache(cache_dir)
+
+    results = {}
+    pending = []
+    for name, params in candidates(space):
+        for fold, (train_index, test_index) in enumerate(splits):
+            key = fold_key(dataset_hash, name, params, fold, folds)
+            cached = cache.get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending.append((key, name, params, train_index, test_index))
+    reused = len(results)
+
+    timed_out = False
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(X, y, list(feature_columns)))
+        try:
+            # Submitted candidate by candidate, so whole candidates finish first
+            futures = {executor.submit(evaluate_fold, name, params, train_index, test_index): key
+                       for key, name, params, train_index, test_index in pending}
+            remaining = set(futures)
+            while remaining:
+                left = budget - (time.perf_counter() - started)
+                if left <= 0:
+                    timed_out = True
+                    break
+                done, remaining = wait(remaining, timeout=left, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[futures[future]] = future.result()
+                    cache.put(futures[future], results[futures[future]])
+        finally:
+            if timed_out:
+                _terminate(executor)
+            else:
+                executor.shutdown(cancel_futures=True)
+
+    summaries = []
+    for name, params in candidates(space):
+        keys = [fold_key(dataset_hash, name, params, fold, folds) for fold in range(folds)]
+        if all(key in results for key in keys):
+            summaries.append(summarize(name, params, [results[key] for key in keys]))
+    summaries.sort(key=lambda s: (-s['f1'], -s['accuracy'], s['latency_us']))
+
+    stats = {
+        'candidates': sum(1 for _ in candidates(space)),
+        'evaluated': len(summaries),
+        'folds': folds,
+        'fold_results_reused': reused,
+        'budget_seconds': budget,
+        'timed_out': timed_out,
+        'elapsed_seconds': round(time.perf_counter() - started, 2),
+    }
+    return summaries, stats
+
+
+def print_report(summaries):
+    print(f"\n{'candidate':<100} {'acc':>6} {'prec':>6} {'recall':>6} {'f1':>6} {'fit s':>7} {'pred us':>8}")
+    for summary in summaries:
+        print(f"{summary['id']:<100} {summary['accuracy']:6.3f} {summary['precision']:6.3f} "
+              f"{summary['recall']:6.3f} {summary['f1']:6.3f} {summary['fit_seconds']:7.3f} "
+              f"{summary['latency_us']:8.1f}")
+
+
+def search_and_publish(data_path, model_path, folds=DEFAULT_FOLDS, budget=DEFAULT_BUDGET_SECONDS,
+                       workers=None, X=None, y=None, rows_seen=None, feature_set='base'):
+    """
+    Run the search on the CSV (or on given X, y, e.g. a streamed sample),
+    refit the best candidate with RainPredictionModel.fit and publish it
+    with the full report in its manifest
+    """
+    rain_model = RainPredictionModel(feature_set=feature_set)
+    if X is None:
+        print("Loading data...")
+        df = rain_model.load_and_prepare_data(data_path)
+        X, y = df[rain_model.feature_columns], df['RAIN']
+    dataset_hash = hashlib.sha256(pd.util.hash_pandas_object(pd.concat([X, y], axis=1)).values.tobytes()).hexdigest()
+
+    cache_dir = os.path.join(model_path, SEARCH_DIR, dataset_hash[:16])
+    print(f"Searching {sum(1 for _ in candidates())} candidates x {folds} folds "
+          f"on {workers or os.cpu_count()} processes (budget {budget:.0f}s, cache {cache_dir})...")
+    summaries, stats = run_search(X, y, rain_model.feature_columns, dataset_hash, cache_dir,
+                                  folds, budget, workers)
+    print_report(summaries)
+    if stats['timed_out']:
+        print(f"⚠ Budget reached: {stats['evaluated']}/{stats['candidates']} candidates evaluated; "
+              f"rerun to resume from the fold cache")
+    if not summaries:
+        raise RuntimeError('No candidate finished within the budget')
+
+    best = summaries[0]
+    print(f"\n✓ Best: {best['id']} (cv f1 {best['f1']:.4f})\n")
+    rain_model.fit(X, y, rows_seen=rows_seen, estimator=make_estimator(best['estimator'], best['params'], n_jobs=-1))
+    manifest = registry.publish(rain_model, data_path, model_path, extra={
+        'search': dict(stats, best=best['id'], report=summaries)
+    })
+    print(f"✓ Published model {manifest['version']} to {model_path}")
+    return manifest
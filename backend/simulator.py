@@ -0,0 +1,244 @@
+import time
+
+import numpy as np
+
+from strategy import TIRE_LIFE, estimate_lap_time, strategy_rng
+
+COMPOUNDS = ('soft', 'medium', 'hard', 'intermediate', 'wet')
+CONDITIONS = ('dry', 'damp', 'wet')
+
+DEFAULT_SCENARIOS = 10000
+MAX_SCENARIOS = 100000
+MAX_STOPS = 2
+TOP_PLANS = 5
+# Plan scoring holds laps x laps x compounds^2 values, so race and tire
+# age lengths are bounded. Shared with the optimal planner, which treats
+# tires older than MAX_TIRE_AGE as that age.
+MAX_RACE_LAPS = 100
+MAX_TIRE_AGE = 120
+
+# Time lost driving through the pit lane (in seconds)
+PIT_LOSS_SECONDS = 22.0
+# Time lost per lap of tire age, plus per lap driven beyond TIRE_LIFE (in seconds)
+TIRE_WEAR = {
+    'soft': 0.08,
+    'medium': 0.05,
+    'hard': 0.03,
+    'intermediate': 0.06,
+    'wet': 0.05
+}
+TIRE_CLIFF = 0.4
+
+# Rain timelines: rain_probability is the chance that rain starts within
+# RAIN_HORIZON_LAPS; showers last RAIN_MEAN_LAPS on average and leave the
+# track damp for DRYING_LAPS afterwards
+RAIN_HORIZON_LAPS = 15
+RAIN_MEAN_LAPS = 12
+DRYING_LAPS = 3
+
+
+def lap_time_table():
+    """Lap time per compound (rows) and track condition (columns), from estimate_lap_time"""
+    # rain_prob=0 keeps estimate_lap_time's random variance out of the table
+    return np.array([[estimate_lap_time(compound, 0.0, condition) for condition in CONDITIONS]
+                     for compound in COMPOUNDS])
+
+
+LAP_TIMES = lap_time_table()
+
+
+def wear_table(max_age):
+    """Cumulative wear per compound: column n is the time lost over tire ages 0..n-1"""
+    age = np.arange(max_age)
+    wear = np.array([TIRE_WEAR[compound] * age + TIRE_CLIFF * np.maximum(0, age - TIRE_LIFE[compound])
+                     for compound in COMPOUNDS])
+    return np.concatenate([np.zeros((len(COMPOUNDS), 1)), np.cumsum(wear, axis=1)], axis=1)
+
+
+def compound_index(tire):
+    """Index into COMPOUNDS for a tire name such as 'soft' or 'Full Wet'"""
+    name = str(tire).lower().replace('full ', '').strip()
+    if name not in COMPOUNDS:
+        raise ValueError(f'Unknown tire compound: {tire}')
+    return COMPOUNDS.index(name)
+
+
+class RainTimelines:
+    """
+    Sampled rain over the remaining laps: in each scenario it rains on lap
+    offsets [onset, end) (damp, or wet when heavy) and the track stays damp
+    until dry_end. Onsets at or beyond the last lap mean a dry race.
+    """
+
+    def __init__(self, rain_prob, laps, scenarios, rng):
+        self.laps = laps
+        self.scenarios = scenarios
+        rain_prob = min(max(float(rain_prob), 0.0), 1.0)
+        if rain_prob == 0.0:
+            self.onset = np.full(scenarios, laps)
+            self.heavy = np.zeros(scenarios, dtype=bool)
+        else:
+            hazard = 1.0 - (1.0 - rain_prob) ** (1.0 / RAIN_HORIZON_LAPS)
+            self.onset = np.minimum(rng.geometric(hazard, scenarios) - 1, laps)
+            # Likelier rain is also likelier to be heavy enough to need full wets
+            self.heavy = rng.random(scenarios) < rain_prob
+        self.end = np.minimum(self.onset + rng.geometric(1.0 / RAIN_MEAN_LAPS, scenarios), laps)
+        self.dry_end = np.minimum(self.end + DRYING_LAPS, laps)
+
+    @property
+    def rain_fraction(self):
+        return float(np.mean(self.onset < self.laps))
+
+    def frequency(self):
+        """Fraction of scenarios in each condition, per lap offset (laps x conditions)"""
+        def laps_covered(start, stop, weights=None):
+            change = np.bincount(start, weights, minlength=self.laps + 1) - \
+                np.bincount(stop, weights, minlength=self.laps + 1)
+            return np.cumsum(change[:self.laps])
+
+        wet = laps_covered(self.onset, self.end, self.heavy.astype(np.float64))
+        damp = laps_covered(self.onset, self.end) - wet + laps_covered(self.end, self.dry_end)
+        dry = self.scenarios - wet - damp
+        return np.column_stack([dry, damp, wet]) / self.scenarios
+
+    def condition_laps(self, start, stop):
+        """Laps in each condition between lap offsets [start, stop), per scenario"""
+        def overlap(lo, hi):
+            return np.clip(np.minimum(stop, hi) - np.maximum(start, lo), 0, None)
+
+        rain = overlap(self.onset, self.end)
+        wet = np.where(self.heavy, rain, 0)
+        damp = rain - wet + overlap(self.end, self.dry_end)
+        return np.column_stack([stop - start - damp - wet, damp, wet])
+
+
+class _Plan:
+    """A pit plan: stop offsets (laps from now) and the compound fitted at each"""
+
+    def __init__(self, expected, offsets, compounds):
+        self.expected = float(expected)
+        self.offsets = list(offsets)
+        self.compounds = list(compounds)
+
+
+def _best_plans(first, prefix, wear, laps, max_stops):
+    """Cheapest plan for every compound sequence of up to max_stops stops"""
+    n = len(COMPOUNDS)
+    starts = np.arange(laps)
+    # tail[k, s]: fresh compound k from lap offset s to the flag
+    tail = prefix[:, laps, None] - prefix[:, :laps] + wear[:, laps - starts]
+    plans = [_Plan(first[laps], [], [])]
+    if max_stops < 1:
+        return plans, 1
+
+    one_stop = first[:laps, None] + PIT_LOSS_SECONDS + tail.T
+    for k in range(n):
+        s = int(np.argmin(one_stop[:, k]))
+        plans.append(_Plan(one_stop[s, k], [s], [k]))
+    if max_stops < 2:
+        return plans, 1 + laps * n
+
+    # middle[k, s1, s2]: fresh compound k from offset s1 until the stop at s2
+    length = starts[None, :] - starts[:, None]
+    middle = prefix[:, None, :laps] - prefix[:, :laps, None] + wear[:, np.clip(length, 0, None)]
+    middle[:, length <= 0] = np.inf
+    two_stop = (first[:laps, None, None, None] + 2 * PIT_LOSS_SECONDS
+                + middle.transpose(1, 2, 0)[:, :, :, None] + tail.T[None, :, None, :])
+    flat = two_stop.reshape(laps * laps, n * n)
+    best = np.argmin(flat, axis=0)
+    for pair, index in enumerate(best):
+        cost = flat[index, pair]
+        if np.isfinite(cost):
+            s1, s2 = divmod(int(index), laps)
+            plans.append(_Plan(cost, [s1, s2], list(divmod(pair, n))))
+
+    candidates = 1 + laps * n + laps * (laps - 1) // 2 * n * n
+    return plans, candidates
+
+
+def _plan_times(plan, timelines, current, tire_age, wear):
+    """Race time of a plan in every scenario"""
+    bounds = [0] + plan.offsets + [timelines.laps]
+    compounds = [current] + plan.compounds
+    total = np.full(timelines.scenarios, PIT_LOSS_SECONDS * len(plan.offsets))
+    for i, k in enumerate(compounds):
+        age = tire_age if i == 0 else 0
+        total += timelines.condition_laps(bounds[i], bounds[i + 1]) @ LAP_TIMES[k]
+        total += wear[k, age + bounds[i + 1] - bounds[i]] - wear[k, age]
+    return total
+
+
+def simulate_strategy(rain_prob, current_lap, total_laps, current_tire, tire_age=0,
+                      scenarios=DEFAULT_SCENARIOS, max_stops=MAX_STOPS, seed=None):
+    """
+    Monte Carlo pit strategy: sample rain timelines for the remaining laps
+    and rank every plan of up to max_stops stops by expected race time.
+    A fixed plan's expected time is linear in the per-lap condition
+    frequencies, so all candidates are scored from one pass over the
+    scenarios; only the reported plans are replayed per scenario, from
+    the rain intervals rather than a scenarios x laps matrix.
+    """
+    started = time.perf_counter()
+    total_laps = int(total_laps)
+    if not 0 < total_laps <= MAX_RACE_LAPS:
+        raise ValueError(f'total_laps must be between 1 and {MAX_RACE_LAPS}')
+    if not 0 <= int(current_lap) < total_laps:
+        raise ValueError('current_lap must be before total_laps')
+    laps = total_laps - int(current_lap)
+    current = compound_index(current_tire)
+    tire_age = max(0, int(tire_age))
+    if tire_age > MAX_TIRE_AGE:
+        raise ValueError(f'tire_age must be at most {MAX_TIRE_AGE}')
+    scenarios = max(1, min(int(scenarios), MAX_SCENARIOS))
+    if seed is None:
+        # Same inputs, same scenarios: answers are reproducible and cacheable
+        rng = strategy_rng('simulate', float(rain_prob), laps, current, tire_age, scenarios, max_stops)
+    else:
+        rng = np.random.default_rng(seed)
+
+    timelines = RainTimelines(rain_prob, laps, scenarios, rng)
+
+    # prefix[k, n]: expected time of compound k over lap offsets 0..n-1, before wear
+    prefix = np.zeros((len(COMPOUNDS), laps + 1))
+    np.cumsum(LAP_TIMES @ timelines.frequency().T, axis=1, out=prefix[:, 1:])
+    wear = wear_table(laps + tire_age + 1)
+    # first[s]: the current tires from now until a stop at offset s
+    first = prefix[current] + wear[current, tire_age:tire_age + laps + 1] - wear[current, tire_age]
+
+    plans, candidates = _best_plans(first, prefix, wear, laps, max_stops)
+    plans.sort(key=lambda plan: plan.expected)
+    plans = plans[:TOP_PLANS]
+
+    times = np.array([_plan_times(plan, timelines, current, tire_age, wear) for plan in plans])
+    wins = np.bincount(np.argmin(times, axis=0), minlength=len(plans)) / scenarios
+
+    def describe(i, plan):
+        p10, p50, p90 = np.percentile(times[i], [10, 50, 90])
+        return {
+            'stops': [{'lap': int(current_lap) + offset, 'tire': COMPOUNDS[k]}
+                      for offset, k in zip(plan.offsets, plan.compounds)],
+            'expected_race_time': round(plan.expected, 3),
+            'p10_race_time': round(float(p10), 3),
+            'p50_race_time': round(float(p50), 3),
+            'p90_race_time': round(float(p90), 3),
+            'win_rate': round(float(wins[i]), 4)
+        }
+
+    best = plans[0]
+    if not best.offsets:
+        action = 'STAY OUT'
+    elif best.offsets[0] == 0:
+        action = 'PIT NOW'
+    else:
+        action = 'PIT LATER'
+
+    return {
+        'action': action,
+        'recommended': describe(0, best),
+        'alternatives': [describe(i, plan) for i, plan in enumerate(plans) if i > 0],
+        'laps_remaining': laps,
+        'scenarios': scenarios,
+        'rain_scenarios_percent': round(timelines.rain_fraction * 100, 2),
+        'candidates_evaluated': candidates,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
@@ -0,0 +1,141 @@
+import json
+import queue
+import threading
+
+# Readings replayed at most per store change (e.g. after a big append)
+MAX_BACKLOG = 100
+KEEPALIVE_SECONDS = 15
+
+
+class Subscription:
+    """One client's bounded queue of pre-encoded events"""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, event):
+        # A slow client loses its oldest events rather than stalling the fan-out
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=KEEPALIVE_SECONDS):
+        """Next event, or None when nothing arrived within timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class StreamEvent:
+    """A payload encoded once and shared by every subscriber"""
+
+    def __init__(self, event_id, payload):
+        self.id = event_id
+        self.json = json.dumps(payload, separators=(',', ':'))
+        self.sse = f"id: {event_id}\nevent: reading\ndata: {self.json}\n\n"
+
+
+class ReadingBroadcaster:
+    """
+    Fan-out of new weather readings to any number of subscribers.
+    A single background thread polls the dataset store; for each change it
+    builds events for the new readings once (one batched model call via
+    build_events) and hands the same encoded event to every subscriber.
+    """
+
+    def __init__(self, store, build_events, poll_interval=1.0, queue_size=64):
+        self.store = store
+        self.build_events = build_events
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.events_published = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_event = None
+        store.add_listener(self._on_change)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, subscription=None):
+        """Register a client; it first receives the latest reading"""
+        self.start()
+        if subscription is None:
+            subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._last_event is not None:
+                subscription.offer(self._last_event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def start(self):
+        """Start the polling thread once per process (lazily, so it survives forking)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='reading-broadcaster', daemon=True)
+            self._thread.start()
+
+    def _on_change(self, snapshot, first_new_row, reloaded):
+        # Called under the store lock: just record the range and wake the thread
+        if self._thread is None:
+            return
+        start = max(first_new_row, len(snapshot) - MAX_BACKLOG)
+        if reloaded:
+            start = max(0, len(snapshot) - 1)
+        with self._lock:
+            self._pending.append((snapshot, start, len(snapshot)))
+        self._wake.set()
+
+    def _run(self):
+        # Seed late joiners with the latest reading (a first load does this via _on_change)
+        if not self.store.refresh():
+            snapshot = self.store.snapshot()
+            if len(snapshot):
+                with self._lock:
+                    self._pending.append((snapshot, len(snapshot) - 1, len(snapshot)))
+        while True:
+            self._wake.clear()
+            try:
+                self.store.refresh()
+                with self._lock:
+                    pending, self._pending = self._pending, []
+                for snapshot, start, end in pending:
+                    if end > start:
+                        self.publish(self.build_events(snapshot, start, end))
+            except Exception as e:
+                print(f"⚠ Stream broadcaster error: {e}")
+            self._wake.wait(self.poll_interval)
+
+    def publish(self, payloads):
+        """Encode payloads once and deliver them to every subscriber"""
+        for event_id, payload in payloads:
+            event = StreamEvent(event_id, payload)
+            with self._lock:
+                self._last_event = event
+                subscribers = list(self._subscribers)
+            for subscription in subscribers:
+                try:
+                    subscription.offer(event)
+                except Exception as e:
+                    # e.g. an ASGI subscriber whose event loop has closed: drop it, keep the rest
+                    print(f"⚠ Dropping stream subscriber: {e}")
+                    self.unsubscribe(subscription)
+            self.events_published += 1
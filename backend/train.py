@@ -0,0 +1,93 @@
+import argparse
+import os
+
+import registry
+from chunked_training import DEFAULT_CHUNK_SIZE, sample_training_set
+from model import FEATURE_SETS, RainPredictionModel
+from model_pool import CIRCUIT_ID
+from search import DEFAULT_BUDGET_SECONDS, DEFAULT_FOLDS, search_and_publish
+
+DEFAULT_DATA_PATH = os.path.join('..', 'data', 'raindata.csv')
+DEFAULT_MODEL_PATH = 'model_data'
+
+
+def train_and_publish(data_path, model_path, sample_size=None, chunk_size=DEFAULT_CHUNK_SIZE, seed=0,
+                      search=False, folds=DEFAULT_FOLDS, budget=DEFAULT_BUDGET_SECONDS, workers=None,
+                      feature_set='base'):
+    """
+    Train a fresh model and publish it to the registry. With sample_size the
+    CSV is streamed in chunks and the model is fit on a uniform sample of
+    that many rows, so archives larger than memory can be used. With search
+    the model is the best candidate of a cross-validated search (search.py).
+    feature_set 'full' adds the rolling/change trend features.
+    """
+    rain_model = RainPredictionModel(feature_set=feature_set)
+    X = y = rows_seen = None
+    if sample_size:
+        print(f"Streaming {data_path} in chunks of {chunk_size} rows...")
+        X, y, rows_seen = sample_training_set(rain_model, data_path, sample_size, chunk_size, seed)
+    if search:
+        return search_and_publish(data_path, model_path, folds, budget, workers, X, y, rows_seen, feature_set)
+
+    if X is not None:
+        rain_model.fit(X, y, rows_seen=rows_seen)
+    else:
+        rain_model.train(data_path)
+    manifest = registry.publish(rain_model, data_path, model_path)
+    print(f"✓ Published model {manifest['version']} to {model_path}")
+    return manifest
+
+
+def list_models(model_path):
+    """Print every published version, marking LATEST"""
+    latest = registry.latest_version(model_path)
+    manifests = registry.list_versions(model_path)
+    if not manifests:
+        print(f"No published models in {model_path}")
+        return
+    for manifest in manifests:
+        marker = '*' if manifest['version'] == latest else ' '
+        metrics = manifest.get('metrics') or {}
+        print(f"{marker} {manifest['version']}  {manifest['created_at']}  "
+              f"{manifest['model_type']}  accuracy={metrics.get('accuracy', float('nan')):.4f}  "
+              f"dataset={manifest['dataset']['sha256'][:12]}")
+
+
+def circuit_id(value):
+    if not CIRCUIT_ID.match(value):
+        raise argparse.ArgumentTypeError(f'invalid circuit id {value!r} (lowercase letters, digits, - and _)')
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train and publish the rain prediction model')
+    parser.add_argument('--data', default=DEFAULT_DATA_PATH, help='semicolon separated weather CSV')
+    parser.add_argument('--model-path', default=DEFAULT_MODEL_PATH, help='model registry directory')
+    parser.add_argument('--circuit', type=circuit_id, help=f'publish to (or list) this circuit\'s registry, served at '
+                                          f'/api/predict?circuit=<id> (default: {registry.DEFAULT_CIRCUIT})')
+    parser.add_argument('--features', choices=sorted(FEATURE_SETS), default='base',
+                        help="'full' adds rolling/change trend features (served per session)")
+    parser.add_argument('--sample-size', type=int,
+                        help='stream the CSV and train on a uniform sample of this many rows')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='rows read per chunk when streaming (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='sampling seed when streaming')
+    parser.add_argument('--search', action='store_true',
+                        help='cross-validated search over RF and gradient boosting; publish the best')
+    parser.add_argument('--folds', type=int, default=DEFAULT_FOLDS, help='CV folds for --search')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS,
+                        help='wall-clock seconds for --search (default: %(default)s)')
+    parser.add_argument('--workers', type=int, help='search processes (default: CPU count)')
+    parser.add_argument('--list', action='store_true', help='list published versions and exit')
+    args = parser.parse_args(argv)
+
+    model_path = registry.circuit_path(args.model_path, args.circuit)
+    if args.list:
+        list_models(model_path)
+    else:
+        train_and_publish(args.data, model_path, args.sample_size, args.chunk_size, args.seed,
+                          args.search, args.folds, args.budget, args.workers, args.features)
+
+
+if __name__ == '__main__':
+    main()
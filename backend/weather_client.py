@@ -0,0 +1,168 @@
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class _InFlight:
+    """A fetch that concurrent callers wait on instead of starting their own"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class CachedWeatherClient:
+    """
+    Upstream weather fetch shared by every caller in the process.
+    - values are fresh for `ttl` seconds
+    - for `stale_ttl` seconds after that the old value is returned at once
+      while a single background refresh runs (stale-while-revalidate)
+    - concurrent misses coalesce onto one in-flight request
+    - failures are not retried for `error_ttl` seconds
+    - requests go through a pooled keep-alive session
+    `parse` turns the upstream JSON into the value to cache.
+    """
+
+    def __init__(self, url, params, parse, ttl=60.0, stale_ttl=600.0, error_ttl=15.0,
+                 timeout=5.0, pool_size=4, refresh_interval=None):
+        self.url = url
+        self.params = params
+        self.parse = parse
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.error_ttl = error_ttl
+        self.timeout = timeout
+        self.refresh_interval = refresh_interval
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0,
+                      'upstream_calls': 0, 'errors': 0}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._value = None
+        self._fetched_at = None
+        self._failed_at = None
+        self._inflight = None
+        self._revalidating = False
+        self._refresher = None
+
+    def get(self) -> Optional[dict]:
+        """Return the cached value, fetching or revalidating as needed"""
+        if self.refresh_interval and self._refresher is None:
+            self.start_refresher()
+
+        now = time.monotonic()
+        value, fetched_at = self._value, self._fetched_at
+        age = None if fetched_at is None else now - fetched_at
+
+        if age is not None and age < self.ttl:
+            self.stats['hits'] += 1
+            return value
+        if age is not None and age < self.ttl + self.stale_ttl:
+            self.stats['stale_hits'] += 1
+            self._revalidate()
+            return value
+        if self._failed_at is not None and now - self._failed_at < self.error_ttl:
+            return None
+
+        self.stats['misses'] += 1
+        return self._fetch_coalesced()
+
+    def _revalidate(self):
+        # Stale hits arriving together start one refresh thread between them
+        with self._lock:
+            if self._revalidating or self._inflight is not None:
+                return
+            self._revalidating = True
+        threading.Thread(target=self._revalidate_once, name='weather-revalidate', daemon=True).start()
+
+    def _revalidate_once(self):
+        try:
+            self._fetch_coalesced()
+        finally:
+            with self._lock:
+                self._revalidating = False
+
+    def _fetch_coalesced(self):
+        with self._lock:
+            inflight = self._inflight
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight = _InFlight()
+
+        if not leader:
+            self.stats['coalesced'] += 1
+            inflight.done.wait(self.timeout + 1.0)
+            return inflight.value
+
+        try:
+            inflight.value = self._fetch()
+        finally:
+            with self._lock:
+                self._inflight = None
+            inflight.done.set()
+        return inflight.value
+
+    def _fetch(self):
+        self.stats['upstream_calls'] += 1
+        try:
+            response = self.session.get(self.url, params=self.params, timeout=self.timeout)
+            if response.status_code != 200:
+                print(f"⚠ Weather API error: {response.status_code}")
+                return self._failed()
+            value = self.parse(response.json())
+        except Exception as e:
+            print(f"⚠ Error fetching live weather: {e}")
+            return self._failed()
+
+        self._value, self._fetched_at, self._failed_at = value, time.monotonic(), None
+        return value
+
+    def _failed(self):
+        self.stats['errors'] += 1
+        self._failed_at = time.monotonic()
+        # Keep serving the last good value while it is within the stale window
+        if self._fetched_at is not None and time.monotonic() - self._fetched_at < self.ttl + self.stale_ttl:
+            return self._value
+        return None
+
+    def start_refresher(self):
+        """Refresh every refresh_interval seconds so callers rarely see a miss"""
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name='weather-refresher',
+                                               daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            self._fetch_coalesced()
+            time.sleep(self.refresh_interval)
+
+    def cache_info(self):
+        age = None if self._fetched_at is None else round(time.monotonic() - self._fetched_at, 3)
+        return dict(self.stats, age_seconds=age, ttl=self.ttl, stale_ttl=self.stale_ttl)
+
+
+def parse_openweather(data, location):
+    """Map an OpenWeather /data/2.5/weather response to the API's weather dict"""
+    return {
+        'air_temp': float(data['main']['temp']),
+        'track_temp': float(data['main']['temp']) + 12.0,
+        'humidity': float(data['main']['humidity']),
+        'pressure': float(data['main']['pressure']),
+        'wind_speed': float(data['wind']['speed']) * 3.6,
+        'wind_direction': float(data['wind'].get('deg', 0)),
+        'rain': 1 if 'rain' in data else 0,
+        'weather_description': data['weather'][0]['description'],
+        'location': location,
+        'timestamp': datetime.now().isoformat()
+    }
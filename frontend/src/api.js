@@ -86,8 +86,11 @@ export const weatherAPI = {
     return response.data;
   },
 
-  getWeatherHistory: async (limit = 50) => {
-    const response = await api.get(`/api/weather/history?limit=${limit}`);
+  // options: { since, until, cursor, points, format: 'rows' | 'columns' }
+  getWeatherHistory: async (limit = 50, options = {}) => {
+    const response = await api.get('/api/weather/history', {
+      params: { limit, ...options },
+    });
     return response.data;
   },
 